@@ -0,0 +1,43 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .models import normalize_phone
+
+PHONE_RE = re.compile(r'^\+?[\d\s-]{7,20}$')
+
+
+class PhoneOrUsernameBackend(ModelBackend):
+    """
+    Log in with a username or a phone number.
+
+    A value that looks like a phone number is looked up on the indexed
+    ``phone_number`` column first, then as a username. A phone number shared
+    by several accounts is only tried as a username.
+    """
+
+    def get_user_by_identifier(self, identifier):
+        User = get_user_model()
+        if PHONE_RE.match(identifier):
+            matches = list(User._default_manager.filter(phone_number=normalize_phone(identifier))[:2])
+            if len(matches) == 1:
+                return matches[0]
+        try:
+            return User._default_manager.get_by_natural_key(identifier)
+        except User.DoesNotExist:
+            return None
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user = self.get_user_by_identifier(username.strip())
+        if user is None:
+            # Hash anyway, so unknown users take as long as wrong passwords
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,73 @@
+"""
+Role-based access for views.
+
+``@farmer_required`` and ``@consumer_required`` replace ``@login_required``
+plus the hand-written user type check. Access is decided from the user row
+(``request.user``, which the view loads anyway), so a changed user type
+takes effect in open sessions at once.
+``accounts.middleware.RoleMiddleware`` runs the same check in
+``process_view``, before the view and its other decorators; without the
+middleware the decorators check on their own.
+"""
+import functools
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseForbidden, JsonResponse
+from django.shortcuts import redirect
+
+DENIED_MESSAGES = {
+    'farmer': "Access denied. You are not registered as a farmer.",
+    'consumer': "Access denied. You are not registered as a consumer.",
+}
+
+
+def _wants_json(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'application/json' in request.headers.get(
+        'accept', '')
+
+
+def check_role(request, role):
+    """None when the request may go on to a view for ``role``, else the response denying it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+    if user.user_type == role:
+        return None
+    if _wants_json(request):
+        return JsonResponse({'error': DENIED_MESSAGES[role]}, status=403)
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseForbidden(DENIED_MESSAGES[role])
+    messages.error(request, DENIED_MESSAGES[role])
+    return redirect('home')
+
+
+def role_required(role):
+    """Let only logged-in users of ``role`` (a user type) reach the view."""
+    def decorator(view_func):
+        if inspect.iscoroutinefunction(view_func):
+            @functools.wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                if not getattr(request, '_role_checked', False):
+                    denied = await sync_to_async(check_role)(request, role)
+                    if denied is not None:
+                        return denied
+                return await view_func(request, *args, **kwargs)
+        else:
+            @functools.wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if not getattr(request, '_role_checked', False):
+                    denied = check_role(request, role)
+                    if denied is not None:
+                        return denied
+                return view_func(request, *args, **kwargs)
+        wrapper.required_role = role
+        return wrapper
+    return decorator
+
+
+farmer_required = role_required('farmer')
+consumer_required = role_required('consumer')
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import User
+from .models import User, normalize_phone
 
 class FarmerRegistrationForm(UserCreationForm):
     phone_number = forms.CharField(max_length=15, required=True)
@@ -8,6 +8,9 @@ class FarmerRegistrationForm(UserCreationForm):
     farm_size = forms.FloatField(required=False)
     user_type = forms.CharField(widget=forms.HiddenInput(), initial='farmer')
     
+    def clean_phone_number(self):
+        return normalize_phone(self.cleaned_data['phone_number'])
+    
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'phone_number', 'farm_location', 'farm_size', 'profile_picture', 'password1', 'password2', 'user_type']
@@ -28,6 +31,9 @@ class ConsumerRegistrationForm(UserCreationForm):
     health_preferences = forms.CharField(widget=forms.Textarea, required=False)
     user_type = forms.CharField(widget=forms.HiddenInput(), initial='consumer')
     
+    def clean_phone_number(self):
+        return normalize_phone(self.cleaned_data['phone_number'])
+    
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'phone_number', 'age', 'health_preferences', 'profile_picture', 'password1', 'password2', 'user_type']
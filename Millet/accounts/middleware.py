@@ -0,0 +1,23 @@
+from .decorators import check_role
+
+
+class RoleMiddleware:
+    """
+    Turn away requests for ``@farmer_required``/``@consumer_required`` views
+    from anonymous users or the other role before the view runs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        role = getattr(view_func, 'required_role', None)
+        if role is None:
+            return None
+        denied = check_role(request, role)
+        if denied is None:
+            request._role_checked = True
+        return denied
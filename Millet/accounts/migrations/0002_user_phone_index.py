@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:33
+
+import re
+
+from django.db import migrations, models
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    # Logins look phone numbers up exactly, without spaces or dashes
+    User = apps.get_model('accounts', 'User')
+    for pk, phone in list(User.objects.exclude(phone_number=None).values_list('pk', 'phone_number')):
+        normalized = re.sub(r'[\s-]', '', phone)
+        if normalized != phone:
+            User.objects.filter(pk=pk).update(phone_number=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['phone_number'], name='user_phone_idx'),
+        ),
+    ]
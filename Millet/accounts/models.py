@@ -1,7 +1,15 @@
+import re
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+
+def normalize_phone(value):
+    """Phone numbers are stored without spaces or dashes so logins can look them up exactly."""
+    return re.sub(r'[\s-]', '', value) if value else value
+
+
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
         ('farmer', 'Farmer'),
@@ -19,9 +27,17 @@ class User(AbstractUser):
     farm_location = models.CharField(max_length=255, blank=True, null=True)
     farm_size = models.FloatField(blank=True, null=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Logging in by phone number (accounts.backends)
+            models.Index(fields=['phone_number'], name='user_phone_idx'),
+        ]
+    
+    @property
     def is_farmer(self):
         return self.user_type == 'farmer'
     
+    @property
     def is_consumer(self):
         return self.user_type == 'consumer'
     
@@ -0,0 +1,37 @@
+"""
+Account registration.
+
+``register`` saves a new user and the rows every account needs from its
+first page (a consumer's cart, a farmer's stats row, the reward balance)
+in one transaction, then logs in the user object it already has: the
+password is hashed once, by the form. Work the new user does not wait for,
+the welcome email and resizing a profile picture, runs as background tasks
+after the transaction commits.
+"""
+from django.contrib.auth import login
+from django.db import transaction
+
+from consumer.models import Cart
+from core.models import RewardBalance
+from farmer.stats import ensure_stats
+from . import tasks
+
+
+def create_account(form):
+    """Save a valid registration form with the user's related rows. Returns the user."""
+    with transaction.atomic():
+        user = form.save()
+        if user.user_type == 'consumer':
+            Cart.objects.create(consumer=user)
+        elif user.user_type == 'farmer':
+            ensure_stats([user.pk])
+        RewardBalance.objects.create(user=user, user_type=user.user_type)
+        tasks.send_welcome_email.delay(user.pk)
+    return user
+
+
+def register(request, form):
+    """Create the account and log the new user in."""
+    user = create_account(form)
+    login(request, user)
+    return user
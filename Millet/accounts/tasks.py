@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from core.background import task
+from .models import User
+
+WELCOME_SUBJECT = 'Welcome to ShreeAnna Connect'
+WELCOME_BODY = {
+    'farmer': (
+        "Your farmer account is ready. List your millets from the dashboard to start selling, "
+        "and check the crop advisories and government schemes matched to your farm."
+    ),
+    'consumer': (
+        "Your account is ready. Browse millet products straight from the farmers who grow them, "
+        "and adopt a farmer to support their next harvest."
+    ),
+}
+
+
+@task(max_retries=3, rate_limit='10/s')
+def send_welcome_email(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    name = user.first_name or user.username
+    send_mail(
+        WELCOME_SUBJECT,
+        f"Namaste {name},\n\n{WELCOME_BODY.get(user.user_type, WELCOME_BODY['consumer'])}\n",
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
@@ -1,3 +1,227 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from consumer.models import Cart
+from core.models import RewardBalance
+from farmer.models import FarmerStats, Product
+from .hashers import TunablePBKDF2PasswordHasher
+from .throttle import login_throttle
+from .models import User
+
+ROLES = ('anonymous', 'farmer', 'consumer')
+# Who may use each URL: 'public', 'login' (any user), 'farmer', 'consumer' or 'staff'.
+# Every named URL of the project must be listed, so new views get checked too.
+ACCESS = {
+    'home': 'public',
+    'login': 'public',
+    'logout': 'public',
+    'register_farmer': 'public',
+    'register_consumer': 'public',
+    'image_variant': 'public',
+    'profile': 'login',
+    'product_suggest': 'consumer',
+    'farmer_dashboard': 'farmer',
+    'add_product': 'farmer',
+    'import_products': 'farmer',
+    'export_products': 'farmer',
+    'price_prediction': 'farmer',
+    'crop_advisory': 'farmer',
+    'farmer_rewards': 'farmer',
+    'consumer_dashboard': 'consumer',
+    'product_list': 'consumer',
+    'product_detail': 'consumer',
+    'cart': 'consumer',
+    'add_to_cart': 'consumer',
+    'add_many_to_cart': 'consumer',
+    'checkout': 'consumer',
+    'farmer_adoption': 'consumer',
+    'toggle_adoption': 'consumer',
+    'health_advisor': 'consumer',
+    'chatbot': 'consumer',
+    'chatbot_stream': 'consumer',
+    'instrumentation_stats': 'staff',
+    'metrics': 'staff',
+}
+POST_ONLY = {'import_products', 'add_many_to_cart', 'toggle_adoption', 'chatbot_stream'}
+# Views whose templates are still missing: they fail once past the access check
+MISSING_TEMPLATES = {'profile', 'health_advisor'}
+
+
+def project_url_names(resolver=None):
+    """Named URLs outside the admin and the API (whose access api.tests covers)."""
+    names = set()
+    for pattern in (resolver or get_resolver()).url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace not in ('admin', 'api'):
+                names |= project_url_names(pattern)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class RoleAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            'farmer': User.objects.create_user(username='grower', password='x', user_type='farmer'),
+            'consumer': User.objects.create_user(username='buyer', password='x', user_type='consumer'),
+        }
+        cls.product = Product.objects.create(
+            farmer=cls.users['farmer'], name='Ragi Flour', description='Stone ground', price=90,
+            stock_quantity=10, category='flour',
+        )
+
+    def setUp(self):
+        # Report failures as responses, so MISSING_TEMPLATES can be told apart
+        self.client.raise_request_exception = False
+
+    def url(self, name):
+        args = {
+            'product_detail': [self.product.pk],
+            'add_to_cart': [self.product.pk],
+            'toggle_adoption': [self.users['farmer'].pk],
+            'image_variant': ['card', 'jpeg', 'products/missing.jpg'],
+        }.get(name, [])
+        return reverse(name, args=args)
+
+    def fetch(self, name, role):
+        self.client.logout()
+        if role != 'anonymous':
+            self.client.force_login(self.users[role])
+        if name in POST_ONLY:
+            return self.client.post(self.url(name))
+        return self.client.get(self.url(name))
+
+    def test_every_url_name_has_an_access_rule(self):
+        self.assertEqual(project_url_names() - set(ACCESS), set())
+
+    def test_access_matrix(self):
+        login_url = settings.LOGIN_URL
+        for name, access in ACCESS.items():
+            for role in ROLES:
+                with self.subTest(url=name, role=role):
+                    response = self.fetch(name, role)
+                    location = response.get('Location', '')
+                    if access == 'public' or access == role or (access == 'login' and role != 'anonymous'):
+                        self.assertNotEqual(response.status_code, 403)
+                        if name in MISSING_TEMPLATES:
+                            self.assertEqual(response.status_code, 500)
+                        else:
+                            self.assertLess(response.status_code, 500)
+                        self.assertFalse(location.startswith(login_url))
+                        if access in ('farmer', 'consumer'):
+                            self.assertNotEqual(location, reverse('home'))
+                    elif access == 'staff':
+                        self.assertIn(response.status_code, (302, 403))
+                    elif role == 'anonymous':
+                        self.assertEqual(response.status_code, 302)
+                        self.assertTrue(location.startswith(login_url))
+                    elif name in POST_ONLY:
+                        self.assertEqual(response.status_code, 403)
+                    else:
+                        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_changed_user_type_takes_effect_in_open_sessions(self):
+        user = User.objects.create_user(username='switcher', password='x', user_type='farmer')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('farmer_dashboard')).status_code, 200)
+        User.objects.filter(pk=user.pk).update(user_type='consumer')
+        self.assertRedirects(self.client.get(reverse('farmer_dashboard')), reverse('home'),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('cart')).status_code, 200)
+
+    def test_user_type_properties(self):
+        self.assertTrue(self.users['farmer'].is_farmer)
+        self.assertFalse(self.users['farmer'].is_consumer)
+        self.assertTrue(self.users['consumer'].is_consumer)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='grower', password='millet-harvest', user_type='farmer', phone_number='98450 12345',
+        )
+
+    def setUp(self):
+        login_throttle.reset()
+
+    def login(self, username, password='millet-harvest'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password})
+
+    def test_username_or_phone_number(self):
+        User.objects.filter(pk=self.user.pk).update(phone_number='9845012345')
+        self.assertRedirects(self.login('grower'), reverse('farmer_dashboard'), fetch_redirect_response=False)
+        self.client.logout()
+        self.assertRedirects(self.login('98450-12345'), reverse('farmer_dashboard'), fetch_redirect_response=False)
+        self.client.logout()
+        self.assertEqual(self.login('98450-12345', 'wrong').status_code, 200)
+        # A number shared by two accounts identifies neither
+        User.objects.create_user(username='other', password='x', user_type='consumer', phone_number='9845012345')
+        self.assertEqual(self.login('9845012345').status_code, 200)
+
+    def test_hash_is_upgraded_on_login(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.user.set_password('millet-harvest')
+            self.user.save(update_fields=['password'])
+        self.assertIn('$2000$', User.objects.get(pk=self.user.pk).password)
+        self.login('grower')
+        self.assertIn('$1000$', User.objects.get(pk=self.user.pk).password)
+
+    @override_settings(LOGIN_THROTTLE={'user': (3, 60)})
+    def test_failed_logins_are_throttled(self):
+        for _ in range(3):
+            self.assertEqual(self.login('grower', 'wrong').status_code, 200)
+        response = self.login('grower')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+        # Other accounts from the same address are still below the per-IP limit
+        self.assertEqual(self.login('someone-else', 'wrong').status_code, 200)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, TASK_BACKEND='eager')
+class RegistrationTests(TestCase):
+    PASSWORD = 'Millet#Harvest2024'
+
+    def register(self, kind, **fields):
+        data = {
+            'username': f'new-{kind}', 'email': f'{kind}@example.com', 'first_name': 'Asha', 'last_name': 'Rao',
+            'phone_number': '98450 00001', 'password1': self.PASSWORD, 'password2': self.PASSWORD, 'user_type': kind,
+            **fields,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(f'register_{kind}'), data)
+
+    def test_consumer_registration(self):
+        with mock.patch.object(TunablePBKDF2PasswordHasher, 'encode', autospec=True,
+                               side_effect=TunablePBKDF2PasswordHasher.encode) as encode:
+            response = self.register('consumer', age=34, health_preferences='diabetes')
+        self.assertRedirects(response, reverse('consumer_dashboard'), fetch_redirect_response=False)
+        # Hashed by the form only; the new user is logged in without checking it again
+        self.assertEqual(encode.call_count, 1)
+        user = User.objects.get(username='new-consumer')
+        self.assertEqual(user.phone_number, '9845000001')
+        self.assertTrue(Cart.objects.filter(consumer=user).exists())
+        self.assertEqual(RewardBalance.objects.get(user=user).points, 0)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        self.assertEqual([message.to for message in mail.outbox], [['consumer@example.com']])
+
+    def test_farmer_registration(self):
+        response = self.register('farmer', farm_location='Dharwad, Karnataka', farm_size=2.5)
+        self.assertRedirects(response, reverse('farmer_dashboard'), fetch_redirect_response=False)
+        user = User.objects.get(username='new-farmer')
+        self.assertTrue(FarmerStats.objects.filter(farmer=user).exists())
+        self.assertFalse(Cart.objects.filter(consumer=user).exists())
+        self.assertIn('List your millets', mail.outbox[0].body)
+
+    def test_invalid_form_creates_nothing(self):
+        response = self.register('consumer', age=34, password2='different')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(username='new-consumer').exists())
+        self.assertEqual(mail.outbox, [])
@@ -0,0 +1,76 @@
+"""
+In-memory login throttling.
+
+Failed logins are counted per client IP and per identifier (username or
+phone number) in fixed windows. Once a key reaches its limit, further
+attempts are refused until its window ends, before any password is hashed.
+Counts live in this process only: each worker throttles on its own, which
+is enough to take the CPU cost out of a password-guessing burst without a
+shared store.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_LIMITS = {'ip': (20, 300), 'user': (5, 300)}
+# Expired windows are swept once this many keys are tracked
+SWEEP_AT = 10000
+
+
+class LoginThrottle:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def _limits(self):
+        return dict(DEFAULT_LIMITS, **getattr(settings, 'LOGIN_THROTTLE', {}))
+
+    def _keys(self, ip, identifier):
+        keys = []
+        if ip:
+            keys.append(('ip', ip))
+        if identifier:
+            keys.append(('user', identifier.strip().lower()))
+        return keys
+
+    def retry_after(self, ip, identifier):
+        """Seconds until another attempt is allowed, or 0 if it is allowed now."""
+        limits = self._limits()
+        now = time.monotonic()
+        wait = 0
+        with self._lock:
+            for key in self._keys(ip, identifier):
+                window = self._windows.get(key)
+                if window is not None and window[1] > now and window[0] >= limits[key[0]][0]:
+                    wait = max(wait, window[1] - now)
+        return int(wait) + 1 if wait else 0
+
+    def failed(self, ip, identifier):
+        limits = self._limits()
+        now = time.monotonic()
+        with self._lock:
+            if len(self._windows) >= SWEEP_AT:
+                self._windows = {key: window for key, window in self._windows.items() if window[1] > now}
+            for key in self._keys(ip, identifier):
+                count, ends = self._windows.get(key, (0, 0))
+                if ends <= now:
+                    count, ends = 0, now + limits[key[0]][1]
+                self._windows[key] = (count + 1, ends)
+
+    def succeeded(self, identifier):
+        # Only the account is cleared: one good login must not unlock guessing from that IP
+        with self._lock:
+            for key in self._keys(None, identifier):
+                self._windows.pop(key, None)
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+
+login_throttle = LoginThrottle()
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
@@ -1,11 +1,18 @@
+import logging
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from core.caching import cache_anonymous_page
 from .forms import FarmerRegistrationForm, ConsumerRegistrationForm, CustomAuthenticationForm
 from .models import User
-from consumer.models import Cart
+from .registration import register
+from .throttle import client_ip, login_throttle
+
+logger = logging.getLogger(__name__)
 
+@cache_anonymous_page()
 def home(request):
     return render(request, 'home.html')
 
@@ -13,15 +20,10 @@ def register_farmer(request):
     if request.method == 'POST':
         form = FarmerRegistrationForm(request.POST, request.FILES)
         if form.is_valid():
-            user = form.save()
-            # Authenticate the user after registration
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password1')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, 'Registration successful!')
-                return redirect('farmer_dashboard')
+            # One transaction; the password is hashed once and not checked again
+            register(request, form)
+            messages.success(request, 'Registration successful!')
+            return redirect('farmer_dashboard')
         else:
             for field, errors in form.errors.items():
                 for error in errors:
@@ -34,17 +36,10 @@ def register_consumer(request):
     if request.method == 'POST':
         form = ConsumerRegistrationForm(request.POST, request.FILES)
         if form.is_valid():
-            user = form.save()
-            # Create a cart for the consumer
-            Cart.objects.create(consumer=user)
-            # Authenticate the user after registration
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password1')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, 'Registration successful!')
-                return redirect('consumer_dashboard')
+            # One transaction; the password is hashed once and not checked again
+            register(request, form)
+            messages.success(request, 'Registration successful!')
+            return redirect('consumer_dashboard')
         else:
             for field, errors in form.errors.items():
                 for error in errors:
@@ -55,20 +50,27 @@ def register_consumer(request):
 
 def login_view(request):
     if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
+        username = request.POST.get('username', '').strip()
+        password = request.POST.get('password', '')
+        ip = client_ip(request)
         
-        # Print debug information
-        print(f"Login attempt: Username={username}")
+        # Refused before any password is hashed
+        retry_after = login_throttle.retry_after(ip, username)
+        if retry_after:
+            logger.warning("Throttled login for username %r from %s", username, ip)
+            messages.error(request, f'Too many failed attempts. Try again in {(retry_after + 59) // 60} minutes.')
+            response = render(request, 'accounts/login.html', status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
         
-        user = authenticate(username=username, password=password)
+        user = authenticate(request, username=username, password=password)
         
         if user is not None:
+            login_throttle.succeeded(username)
             login(request, user)
-            messages.success(request, f'Welcome back, {username}!')
+            messages.success(request, f'Welcome back, {user.get_full_name() or user.username}!')
             
-            # Print debug information
-            print(f"User authenticated: {user.username}, Type: {user.user_type}")
+            logger.info("User %s (%s) logged in", user.pk, user.user_type)
             
             # Redirect based on user type
             if user.user_type == 'farmer':
@@ -78,8 +80,9 @@ def login_view(request):
             else:
                 return redirect('home')
         else:
-            print(f"Authentication failed for username: {username}")
-            messages.error(request, 'Invalid username or password.')
+            login_throttle.failed(ip, username)
+            logger.warning("Failed login for username %r", username)
+            messages.error(request, 'Invalid username, phone number or password.')
     
     return render(request, 'accounts/login.html')
 
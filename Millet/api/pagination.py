@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class NewestFirstPagination(CursorPagination):
+    """Keyset pages, newest first, with ``?page_size=`` up to ``MAX_PAGE_SIZE``."""
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-id')
+
+
+def catalog_response(request, page, data):
+    """The same page shape for a ``consumer.catalog`` page, which keeps its own cursors."""
+    next_url = None
+    if page.has_next:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', page.next_cursor)
+    return Response({'next': next_url, 'previous': None, 'results': data})
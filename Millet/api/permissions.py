@@ -0,0 +1,19 @@
+from rest_framework.permissions import BasePermission
+
+
+class _RolePermission(BasePermission):
+    role = None
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.user_type == self.role)
+
+
+class IsFarmer(_RolePermission):
+    role = 'farmer'
+    message = "Only farmers can use this endpoint."
+
+
+class IsConsumer(_RolePermission):
+    role = 'consumer'
+    message = "Only consumers can use this endpoint."
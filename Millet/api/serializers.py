@@ -0,0 +1,151 @@
+from rest_framework import serializers
+
+from accounts.models import User
+from consumer.models import CartItem, FarmerAdoption, Order, OrderItem
+from core.images import variant_url
+from core.models import RewardBalance, RewardEntry
+from farmer.models import CropAdvisory, Product
+
+
+class SparseFieldsMixin:
+    """
+    Return only the fields named in ``?fields=a,b`` (top-level serializer
+    only; nested serializers keep all theirs). Unknown names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Nested serializers are built without a context, so only the top one trims
+        request = self.context.get('request')
+        if request is None:
+            return
+        wanted = request.query_params.get('fields')
+        if wanted:
+            keep = {name.strip() for name in wanted.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class TokenRequestSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150, help_text='Username or phone number')
+    password = serializers.CharField(style={'input_type': 'password'}, trim_whitespace=False)
+
+
+class UserSerializer(serializers.ModelSerializer):
+    name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'name']
+
+    def get_name(self, user):
+        return user.get_full_name() or user.username
+
+
+class FarmerSerializer(UserSerializer):
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['farm_location']
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    farmer = FarmerSerializer(read_only=True)
+    image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'description', 'price', 'stock_quantity', 'category', 'is_organic', 'is_available',
+            'image', 'thumbnail', 'farmer', 'created_at', 'updated_at',
+        ]
+
+    # Variant URLs come from the cache, without a query per product
+    def get_image(self, product):
+        return variant_url(product.image.name, 'detail') if product.image else None
+
+    def get_thumbnail(self, product):
+        return variant_url(product.image.name, 'thumbnail') if product.image else None
+
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'category', 'is_available']
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ['product', 'quantity', 'line_total', 'added_at']
+
+
+class CartAddSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'quantity', 'price']
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'status', 'total_amount', 'shipping_address', 'phone_number', 'items', 'created_at', 'updated_at',
+        ]
+
+
+class CheckoutSerializer(serializers.Serializer):
+    shipping_address = serializers.CharField()
+    phone_number = serializers.CharField(max_length=15)
+    idempotency_key = serializers.CharField(max_length=64, required=False, allow_blank=True)
+
+
+class AdoptionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    farmer = FarmerSerializer(read_only=True)
+
+    class Meta:
+        model = FarmerAdoption
+        fields = ['id', 'farmer', 'adoption_date']
+
+
+class AdopterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    consumer = UserSerializer(read_only=True)
+
+    class Meta:
+        model = FarmerAdoption
+        fields = ['id', 'consumer', 'adoption_date']
+
+
+class AdoptSerializer(serializers.Serializer):
+    farmer_id = serializers.IntegerField(min_value=1)
+
+
+class RewardEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RewardEntry
+        fields = ['id', 'kind', 'points', 'description', 'created_at']
+
+
+class LeaderboardSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = RewardBalance
+        fields = ['user', 'points']
+
+
+class CropAdvisorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CropAdvisory
+        fields = ['id', 'millet_type', 'region', 'soil_type', 'season', 'advisory_text', 'created_at']
@@ -0,0 +1,211 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.throttle import login_throttle
+
+from accounts.models import User
+from consumer import adoptions, services
+from consumer.models import Order
+from core import rewards
+from farmer.models import CropAdvisory, Product
+
+
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(
+            username='grower', password='x', user_type='farmer', first_name='Ravi', farm_location='Dharwad',
+        )
+        cls.consumer = User.objects.create_user(username='buyer', password='x', user_type='consumer')
+        cls.products = [
+            Product.objects.create(
+                farmer=cls.farmer, name=f'Millet {i}', description='Stone ground', price=50 + i,
+                stock_quantity=100, category='flour',
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.consumer)
+
+    def get(self, name, *args, user=None, **params):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(reverse(f'api:{name}', args=args), params)
+
+
+class ProductApiTests(ApiTestCase):
+    def test_list_is_paginated_with_a_cursor(self):
+        with self.assertNumQueries(2):
+            response = self.get('product-list', page_size=3, sort='price_asc')
+        body = response.json()
+        self.assertEqual([p['price'] for p in body['results']], ['50.00', '51.00', '52.00'])
+        self.assertEqual(body['results'][0]['farmer']['name'], 'Ravi')
+        following = self.client.get(body['next']).json()
+        self.assertEqual([p['price'] for p in following['results']], ['53.00', '54.00'])
+        self.assertIsNone(following['next'])
+
+    def test_sparse_fields(self):
+        body = self.get('product-list', fields='id,name').json()
+        self.assertEqual(set(body['results'][0]), {'id', 'name'})
+
+    def test_detail_answers_conditional_requests(self):
+        product = self.products[0]
+        response = self.get('product-detail', product.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        again = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+
+        # The farmer is part of the body, and of its ETag
+        User.objects.filter(pk=product.farmer_id).update(first_name='Ravindra')
+        changed = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        Product.objects.filter(pk=product.pk).update(price=99)
+        changed = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['price'], '99.00')
+        # Delisted products are gone from the API as from the catalog
+        Product.objects.filter(pk=product.pk).update(is_available=False)
+        self.assertEqual(self.get('product-detail', product.pk).status_code, 404)
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse('api:product-list'))
+        self.assertIn(response.status_code, (401, 403))
+
+
+class CartAndOrderApiTests(ApiTestCase):
+    def test_cart(self):
+        response = self.client.post(
+            reverse('api:cart'), {'product_id': self.products[1].pk, 'quantity': 2}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], '102.00')
+        services.add_to_cart(self.consumer, self.products[2], 1)
+        with self.assertNumQueries(2):
+            body = self.get('cart').json()
+        self.assertEqual(body['item_count'], 3)
+        self.assertEqual(len(body['items']), 2)
+
+    def test_bad_quantity(self):
+        response = self.client.post(
+            reverse('api:cart'), {'product_id': self.products[1].pk, 'quantity': 10 ** 6},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json())
+
+    @override_settings(TASK_BACKEND='eager')
+    def test_checkout_and_orders(self):
+        services.add_to_cart(self.consumer, self.products[0], 2)
+        data = {'shipping_address': '12 MG Road', 'phone_number': '9845012345'}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('api:order-list'), data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='order-1',
+            )
+        self.assertEqual(response.status_code, 201)
+        order = response.json()
+        self.assertEqual(order['total_amount'], '100.00')
+        self.assertEqual(order['items'][0]['product']['name'], 'Millet 0')
+        # The cart is empty now
+        empty = self.client.post(reverse('api:order-list'), data, content_type='application/json')
+        self.assertEqual(empty.status_code, 409)
+
+        with self.assertNumQueries(3):
+            body = self.get('order-list').json()
+        self.assertEqual([o['id'] for o in body['results']], [order['id']])
+        detail = self.get('order-detail', order['id'])
+        self.assertEqual(detail.json()['id'], order['id'])
+        self.assertIn('Last-Modified', detail)
+
+    def test_orders_are_the_consumers_own(self):
+        other = User.objects.create_user(username='other', password='x', user_type='consumer')
+        order = Order.objects.create(consumer=other, total_amount=10, shipping_address='x', phone_number='1')
+        self.assertEqual(self.get('order-detail', order.pk).status_code, 404)
+        self.assertEqual(self.get('order-list').json()['results'], [])
+
+    def test_consumer_only(self):
+        for name in ('cart', 'order-list'):
+            with self.subTest(name):
+                self.assertEqual(self.get(name, user=self.farmer).status_code, 403)
+
+
+class AdoptionRewardAdvisoryApiTests(ApiTestCase):
+    def test_adoptions(self):
+        url = reverse('api:adoption-list')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'farmer_id': self.farmer.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get('adoption-list').json()['results'][0]['farmer']['id'], self.farmer.pk)
+        self.assertEqual(self.get('adoption-list', user=self.farmer).json()['results'][0]['consumer']['id'],
+                         self.consumer.pk)
+        # Farmers cannot adopt
+        response = self.client.post(url, {'farmer_id': self.farmer.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.consumer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('api:adoption-detail', args=[self.farmer.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(adoptions.adopted_farmer_ids(self.consumer), [])
+
+    def test_rewards(self):
+        rewards.accrue(self.consumer, 40, 'First order')
+        body = self.get('rewards').json()
+        self.assertEqual(body['balance'], 40)
+        self.assertEqual(body['entries'][0]['points'], 40)
+        leaderboard = self.get('leaderboard').json()['results']
+        self.assertEqual(leaderboard[0]['user']['id'], self.consumer.pk)
+        self.assertEqual(self.get('leaderboard', user_type='staff').status_code, 400)
+
+    def test_advisories_for_farmers_only(self):
+        body = self.get('advisory-list', user=self.farmer).json()
+        self.assertTrue(body['results'])
+        self.assertEqual(CropAdvisory.objects.filter(farmer=self.farmer).count(), len(body['results']))
+        self.assertEqual(self.get('advisory-list', user=self.consumer).status_code, 403)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class TokenAuthTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        login_throttle.reset()
+        self.consumer.set_password('millet-harvest')
+        self.consumer.save(update_fields=['password'])
+        self.app = APIClient(enforce_csrf_checks=True)
+
+    def obtain(self, password='millet-harvest'):
+        return self.app.post(reverse('api:token'), {'username': 'buyer', 'password': password}, format='json')
+
+    def test_token_works_without_csrf(self):
+        self.assertEqual(self.obtain('wrong').status_code, 400)
+        response = self.obtain()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_type'], 'consumer')
+        self.assertEqual(self.obtain().json()['token'], response.json()['token'])
+
+        self.app.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        cart = self.app.post(reverse('api:cart'), {'product_id': self.products[0].pk}, format='json')
+        self.assertEqual(cart.status_code, 200)
+        self.assertEqual(cart.json()['item_count'], 1)
+        adopt = self.app.post(reverse('api:adoption-list'), {'farmer_id': self.farmer.pk}, format='json')
+        self.assertEqual(adopt.status_code, 201)
+        self.assertEqual(self.app.delete(reverse('api:adoption-detail', args=[self.farmer.pk])).status_code, 204)
+
+    def test_session_writes_still_need_csrf(self):
+        self.app.force_login(self.consumer)
+        response = self.app.post(reverse('api:cart'), {'product_id': self.products[0].pk}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(LOGIN_THROTTLE={'user': (2, 60)})
+    def test_failed_attempts_are_throttled(self):
+        self.obtain('wrong')
+        self.obtain('wrong')
+        response = self.obtain()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
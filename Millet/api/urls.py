@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('auth/token/', views.ObtainToken.as_view(), name='token'),
+    path('products/', views.ProductList.as_view(), name='product-list'),
+    path('products/<int:pk>/', views.ProductDetail.as_view(), name='product-detail'),
+    path('cart/', views.CartView.as_view(), name='cart'),
+    path('orders/', views.OrderList.as_view(), name='order-list'),
+    path('orders/<int:pk>/', views.OrderDetail.as_view(), name='order-detail'),
+    path('adoptions/', views.AdoptionList.as_view(), name='adoption-list'),
+    path('adoptions/<int:farmer_id>/', views.AdoptionDetail.as_view(), name='adoption-detail'),
+    path('rewards/', views.RewardsView.as_view(), name='rewards'),
+    path('rewards/leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
+    path('advisories/', views.AdvisoryList.as_view(), name='advisory-list'),
+]
@@ -0,0 +1,296 @@
+"""
+Version 1 of the JSON API (``/api/v1/``), for the mobile app.
+
+Clients sign in at ``auth/token/`` and send ``Authorization: Token <key>``;
+session cookies (and CSRF tokens) are only needed by the browsable API.
+
+Views reuse the same services as the HTML pages (catalog, cart, checkout,
+adoptions, rewards, advisories) so both stay consistent. Every successful
+GET carries an ETag of its body and answers ``If-None-Match`` with 304;
+views that can date their data cheaply also send Last-Modified and answer
+``If-Modified-Since`` before doing the work. Lists accept ``?fields=`` to
+trim each item to the named fields.
+"""
+import hashlib
+
+from django.contrib.auth import authenticate
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import generics, status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.models import User
+from accounts.throttle import client_ip, login_throttle
+from consumer import adoptions, services, tasks
+from consumer.catalog import PAGE_SIZE as CATALOG_PAGE_SIZE, get_cached_catalog_page
+from consumer.checkout import CheckoutError, place_order
+from consumer.forms import CatalogFilterForm
+from consumer.models import Order, OrderItem
+from core import rewards
+from farmer.advisory import get_advisories
+from farmer.models import Product
+from . import serializers
+from .pagination import MAX_PAGE_SIZE, NewestFirstPagination, catalog_response
+from .permissions import IsConsumer, IsFarmer
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+class ConditionalGetMixin:
+    """ETag and Last-Modified handling for GET and HEAD (see the module docstring)."""
+
+    def get_last_modified(self):
+        """When the data behind this response last changed, or None if unknown."""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.last_modified = None
+        if request.method in ('GET', 'HEAD'):
+            last_modified = self.get_last_modified()
+            self.last_modified = int(last_modified.timestamp()) if last_modified else None
+            # If-None-Match takes precedence and needs the body, so it is checked after rendering
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if self.last_modified and since and 'If-None-Match' not in request.headers and self.last_modified <= since:
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['Last-Modified'] = http_date(self.last_modified)
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or response.status_code != status.HTTP_200_OK:
+            return response
+        response.render()
+        etag = quote_etag(hashlib.md5(response.content, usedforsecurity=False).hexdigest())
+        response['ETag'] = etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified)
+        # Clients may keep a copy but must revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return get_conditional_response(request, etag=etag, last_modified=self.last_modified, response=response)
+
+
+def _page_size(request, default):
+    try:
+        return max(1, min(int(request.query_params.get('page_size', default)), MAX_PAGE_SIZE))
+    except ValueError:
+        return default
+
+
+# ---------------------------------------------------------------------- auth
+
+class ObtainToken(APIView):
+    """
+    POST ``{"username", "password"}`` (a username or phone number) for the
+    token the app sends as ``Authorization: Token <key>``. Failed attempts
+    count towards the same throttle as the login page.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        credentials = serializers.TokenRequestSerializer(data=request.data)
+        credentials.is_valid(raise_exception=True)
+        username = credentials.validated_data['username'].strip()
+        ip = client_ip(request)
+        retry_after = login_throttle.retry_after(ip, username)
+        if retry_after:
+            return Response(
+                {'detail': "Too many failed attempts."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(retry_after)},
+            )
+        user = authenticate(request._request, username=username, password=credentials.validated_data['password'])
+        if user is None:
+            login_throttle.failed(ip, username)
+            raise ValidationError({'detail': ["Invalid username, phone number or password."]})
+        login_throttle.succeeded(username)
+        token, _ = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key, 'user_type': user.user_type, 'user': serializers.UserSerializer(user).data})
+
+
+# ------------------------------------------------------------------ products
+
+class ProductList(ConditionalGetMixin, APIView):
+    """The catalog with the web filters (q, category, organic, min_price, max_price, farmer, sort)."""
+
+    def get(self, request):
+        form = CatalogFilterForm(request.query_params)
+        form.is_valid()
+        page = get_cached_catalog_page(form.cleaned_data, _page_size(request, CATALOG_PAGE_SIZE))
+        data = serializers.ProductSerializer(page.products, many=True, context={'request': request}).data
+        return catalog_response(request, page, data)
+
+
+class ProductDetail(ConditionalGetMixin, generics.RetrieveAPIView):
+    # No Last-Modified: the embedded farmer has no timestamp of its own, so
+    # only the ETag of the whole body can tell whether the product changed
+    queryset = Product.objects.filter(is_available=True).select_related('farmer')
+    serializer_class = serializers.ProductSerializer
+
+
+# ---------------------------------------------------------------------- cart
+
+class CartView(ConditionalGetMixin, APIView):
+    """GET the cart; POST ``{"product_id", "quantity"}`` to add to it."""
+    permission_classes = [IsConsumer]
+
+    def cart(self, request):
+        items = list(services.get_cart_items(request.user))
+        return {
+            'items': serializers.CartItemSerializer(items, many=True).data,
+            'item_count': sum(item.quantity for item in items),
+            'total': f'{items[0].cart_total if items else 0:.2f}',
+        }
+
+    def get(self, request):
+        return Response(self.cart(request))
+
+    def post(self, request):
+        add = serializers.CartAddSerializer(data=request.data)
+        add.is_valid(raise_exception=True)
+        product = get_object_or_404(
+            Product.objects.only('id', 'name', 'price'), pk=add.validated_data['product_id'], is_available=True,
+        )
+        try:
+            services.add_to_cart(request.user, product, add.validated_data['quantity'])
+        except ValueError as e:
+            raise ValidationError({'quantity': [str(e)]})
+        return Response(self.cart(request))
+
+
+# -------------------------------------------------------------------- orders
+
+def _orders():
+    items = OrderItem.objects.select_related('product').order_by('id')
+    return Order.objects.prefetch_related(Prefetch('items', queryset=items))
+
+
+class OrderList(ConditionalGetMixin, generics.ListAPIView):
+    """GET the consumer's orders, newest first; POST checks out the cart."""
+    permission_classes = [IsConsumer]
+    serializer_class = serializers.OrderSerializer
+    pagination_class = NewestFirstPagination
+
+    def get_queryset(self):
+        return _orders().filter(consumer=self.request.user)
+
+    def post(self, request):
+        checkout = serializers.CheckoutSerializer(data=request.data)
+        checkout.is_valid(raise_exception=True)
+        key = checkout.validated_data.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        try:
+            order = place_order(
+                request.user,
+                checkout.validated_data['shipping_address'],
+                checkout.validated_data['phone_number'],
+                idempotency_key=key,
+            )
+        except CheckoutError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        tasks.process_order.delay(order.pk)
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderDetail(ConditionalGetMixin, generics.RetrieveAPIView):
+    permission_classes = [IsConsumer]
+    serializer_class = serializers.OrderSerializer
+
+    def get_queryset(self):
+        return _orders().filter(consumer=self.request.user)
+
+    def get_last_modified(self):
+        return (
+            Order.objects.filter(pk=self.kwargs['pk'], consumer=self.request.user)
+            .values_list('updated_at', flat=True).first()
+        )
+
+
+# ----------------------------------------------------------------- adoptions
+
+class AdoptionList(ConditionalGetMixin, APIView):
+    """
+    GET a consumer's adopted farmers, or a farmer's adopters. Consumers POST
+    ``{"farmer_id"}`` to adopt.
+    """
+
+    def get(self, request):
+        context = {'request': request}
+        if request.user.user_type == 'farmer':
+            data = serializers.AdopterSerializer(adoptions.get_adopters(request.user), many=True, context=context).data
+        else:
+            data = serializers.AdoptionSerializer(
+                adoptions.get_adopted_farmers(request.user), many=True, context=context,
+            ).data
+        return Response({'results': data})
+
+    def post(self, request):
+        if not IsConsumer().has_permission(request, self):
+            self.permission_denied(request, IsConsumer.message)
+        adopt = serializers.AdoptSerializer(data=request.data)
+        adopt.is_valid(raise_exception=True)
+        farmer = get_object_or_404(User, pk=adopt.validated_data['farmer_id'], user_type='farmer')
+        created = adoptions.adopt(request.user, farmer)
+        return Response(
+            {'farmer': serializers.FarmerSerializer(farmer).data, 'created': created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class AdoptionDetail(APIView):
+    """DELETE ends the adoption of a farmer."""
+    permission_classes = [IsConsumer]
+
+    def delete(self, request, farmer_id):
+        farmer = get_object_or_404(User, pk=farmer_id, user_type='farmer')
+        if not adoptions.unadopt(request.user, farmer):
+            return Response({'detail': "You have not adopted this farmer."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ------------------------------------------------------------------- rewards
+
+class RewardsView(ConditionalGetMixin, APIView):
+    def get(self, request):
+        return Response({
+            'balance': rewards.get_balance(request.user),
+            'rank': rewards.get_rank(request.user),
+            'entries': serializers.RewardEntrySerializer(rewards.get_recent_entries(request.user), many=True).data,
+        })
+
+
+class LeaderboardView(ConditionalGetMixin, APIView):
+    """``?user_type=farmer|consumer``, defaulting to the caller's own."""
+
+    def get(self, request):
+        user_type = request.query_params.get('user_type', request.user.user_type)
+        if user_type not in ('farmer', 'consumer'):
+            raise ValidationError({'user_type': ["Must be 'farmer' or 'consumer'."]})
+        leaderboard = rewards.get_leaderboard(user_type, _page_size(request, rewards.LEADERBOARD_SIZE))
+        return Response({'results': serializers.LeaderboardSerializer(leaderboard, many=True).data})
+
+
+# ---------------------------------------------------------------- advisories
+
+class AdvisoryList(ConditionalGetMixin, APIView):
+    """This season's crop advisories for the farmer."""
+    permission_classes = [IsFarmer]
+
+    def get(self, request):
+        advisories = get_advisories(request.user)
+        data = serializers.CropAdvisorySerializer(advisories, many=True, context={'request': request}).data
+        return Response({'results': data})
@@ -0,0 +1,233 @@
+"""
+Farmer adoption graph.
+
+``FarmerAdoption`` rows are the edges (one per consumer and farmer; unadopting
+clears ``active``). Each user's active edges are cached as an adjacency
+list of ``(adoption_id, other_user_id, adoption_date)``, newest first: the
+farmers a consumer adopted and the consumers who adopted a farmer. Reading a
+list or its length touches only that user's k edges, from the cache or from
+the (user, active, -adoption_date) indexes.
+
+Cache keys carry a per-user version, as the consumer dashboard does. A write
+bumps the version of both endpoints immediately and again once it commits,
+so a reader that loaded the list while the write was still uncommitted
+caches it under a version nobody reads any more.
+
+Suggestions of farmers to adopt are built in batch (``build_suggestions``)
+from the regions a consumer ships to and the farmers they already buy from.
+"""
+import math
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from accounts.models import User
+from core.caching import bump_version, cache_version
+from core.regions import region_keys
+from .models import AdoptionSuggestion, FarmerAdoption, Order, OrderItem
+
+ADJACENCY_TIMEOUT = 24 * 60 * 60
+SUGGESTIONS = 6
+CONSUMER_CHUNK = 1000
+REGION_WEIGHT = 1.0
+PURCHASE_WEIGHT = 1.5
+POPULARITY_WEIGHT = 0.2
+
+VERSION_KEY = 'adoptions-version:{}'
+LIST_KEY = 'adoptions:{}:{}:{}'
+
+
+class AdoptionError(Exception):
+    pass
+
+
+def invalidate_adoptions(consumer_id, farmer_id):
+    """Drop the cached lists of both ends of an edge that changed."""
+    from .dashboard import invalidate_dashboard
+
+    def bump():
+        bump_version(VERSION_KEY.format(consumer_id))
+        bump_version(VERSION_KEY.format(farmer_id))
+        invalidate_dashboard(consumer_id)
+    bump()
+    transaction.on_commit(bump)
+
+
+def _edges(user_id, side):
+    """Cached adjacency list of ``user_id``: 'farmers' they adopted or 'adopters' of them."""
+    key = LIST_KEY.format(side, user_id, cache_version(VERSION_KEY.format(user_id)))
+    edges = cache.get(key)
+    if edges is None:
+        mine, other = ('consumer', 'farmer') if side == 'farmers' else ('farmer', 'consumer')
+        edges = list(
+            FarmerAdoption.objects.filter(**{mine: user_id, 'active': True})
+            .order_by('-adoption_date', '-id').values_list('id', f'{other}_id', 'adoption_date')
+        )
+        cache.set(key, edges, ADJACENCY_TIMEOUT)
+    return edges
+
+
+def _adoptions(edges, side, user_id, limit):
+    edges = edges[:limit] if limit is not None else edges
+    users = User.objects.in_bulk([other for _, other, _ in edges])
+    adoptions = []
+    for pk, other, adopted_at in edges:
+        if other not in users:
+            continue
+        adoption = FarmerAdoption(pk=pk, active=True, adoption_date=adopted_at)
+        if side == 'farmers':
+            adoption.consumer_id, adoption.farmer = user_id, users[other]
+        else:
+            adoption.farmer_id, adoption.consumer = user_id, users[other]
+        adoptions.append(adoption)
+    return adoptions
+
+
+def adopted_farmer_ids(consumer):
+    return [farmer_id for _, farmer_id, _ in _edges(consumer.pk, 'farmers')]
+
+
+def adopter_ids(farmer):
+    return [consumer_id for _, consumer_id, _ in _edges(farmer.pk, 'adopters')]
+
+
+def get_adopted_farmers(consumer, limit=None):
+    """The consumer's active adoptions, newest first, with ``farmer`` loaded."""
+    return _adoptions(_edges(consumer.pk, 'farmers'), 'farmers', consumer.pk, limit)
+
+
+def get_adopters(farmer, limit=None):
+    """Active adoptions of ``farmer``, newest first, with ``consumer`` loaded."""
+    return _adoptions(_edges(farmer.pk, 'adopters'), 'adopters', farmer.pk, limit)
+
+
+def adoption_counts(user):
+    if user.user_type == 'farmer':
+        return {'adopted': 0, 'adopters': len(_edges(user.pk, 'adopters'))}
+    return {'adopted': len(_edges(user.pk, 'farmers')), 'adopters': 0}
+
+
+def adopt(consumer, farmer):
+    """Adopt ``farmer``. Returns False if the consumer had already adopted them."""
+    if consumer.user_type != 'consumer' or farmer.user_type != 'farmer':
+        raise AdoptionError("Only consumers can adopt, and only farmers can be adopted.")
+    with transaction.atomic():
+        changed = FarmerAdoption.objects.filter(consumer=consumer, farmer=farmer, active=False).update(
+            active=True, adoption_date=timezone.now())
+        if not changed:
+            try:
+                with transaction.atomic():
+                    FarmerAdoption.objects.create(consumer=consumer, farmer=farmer)
+                changed = 1
+            except IntegrityError:
+                # Already adopted, possibly by a concurrent request
+                pass
+        if changed:
+            invalidate_adoptions(consumer.pk, farmer.pk)
+    return bool(changed)
+
+
+def unadopt(consumer, farmer):
+    """End an adoption. Returns False if there was no active one."""
+    with transaction.atomic():
+        changed = FarmerAdoption.objects.filter(consumer=consumer, farmer=farmer, active=True).update(active=False)
+        if changed:
+            invalidate_adoptions(consumer.pk, farmer.pk)
+    return bool(changed)
+
+
+# ---------------------------------------------------------------- suggestions
+
+def _farmer_regions():
+    farmers = User.objects.filter(user_type='farmer').values_list('pk', 'farm_location')
+    keys = {pk: region_keys(location) for pk, location in farmers}
+    by_key = defaultdict(set)
+    for pk, farm_keys in keys.items():
+        for key in farm_keys:
+            by_key[key].add(pk)
+    return keys, by_key
+
+
+def _shipping_regions(consumer_ids):
+    latest = {}
+    addresses = (
+        Order.objects.filter(consumer__in=consumer_ids)
+        .order_by('consumer', '-created_at', '-id').values_list('consumer', 'shipping_address')
+    )
+    for consumer_id, address in addresses:
+        latest.setdefault(consumer_id, region_keys(address.replace('\n', ',')))
+    return latest
+
+
+def build_suggestions(consumer_ids=None, k=SUGGESTIONS):
+    """
+    Rank farmers for each consumer (all consumers when None) and store the
+    top ``k``.
+
+    A farmer scores for sharing regions with the consumer's latest shipping
+    address (the share of the farm's region keys matched, so the same
+    district counts more than only the same state), for past purchases from
+    them, and a little for how many others adopted them. Farmers already
+    adopted are skipped. Returns the number of consumers processed.
+    """
+    if consumer_ids is None:
+        consumer_ids = User.objects.filter(user_type='consumer').order_by('pk').values_list('pk', flat=True)
+    consumer_ids = list(consumer_ids)
+    farm_keys, farmers_by_key = _farmer_regions()
+    adopters = dict(
+        FarmerAdoption.objects.filter(active=True).values('farmer')
+        .annotate(n=Count('id')).values_list('farmer', 'n')
+    )
+    most_adopted = max(adopters.values(), default=0)
+
+    for offset in range(0, len(consumer_ids), CONSUMER_CHUNK):
+        chunk = consumer_ids[offset:offset + CONSUMER_CHUNK]
+        regions = _shipping_regions(chunk)
+        bought = defaultdict(dict)
+        for consumer_id, farmer_id, units in (
+                OrderItem.objects.filter(order__consumer__in=chunk).exclude(order__status='cancelled')
+                .values('order__consumer', 'product__farmer').annotate(units=Sum('quantity'))
+                .values_list('order__consumer', 'product__farmer', 'units')):
+            bought[consumer_id][farmer_id] = units
+        adopted = defaultdict(set)
+        for consumer_id, farmer_id in FarmerAdoption.objects.filter(consumer__in=chunk, active=True).values_list(
+                'consumer', 'farmer'):
+            adopted[consumer_id].add(farmer_id)
+
+        rows = []
+        for consumer_id in chunk:
+            keys = regions.get(consumer_id, set())
+            purchases = bought[consumer_id]
+            candidates = set(purchases)
+            for key in keys:
+                candidates |= farmers_by_key.get(key, set())
+            most_bought = max(purchases.values(), default=0)
+            scores = []
+            for farmer_id in candidates - adopted[consumer_id]:
+                if farmer_id not in farm_keys:
+                    continue
+                shared = len(farm_keys[farmer_id] & keys) / len(farm_keys[farmer_id]) if farm_keys[farmer_id] else 0.0
+                score = REGION_WEIGHT * shared
+                if purchases.get(farmer_id):
+                    score += PURCHASE_WEIGHT * math.log1p(purchases[farmer_id]) / math.log1p(most_bought)
+                if most_adopted:
+                    score += POPULARITY_WEIGHT * adopters.get(farmer_id, 0) / most_adopted
+                scores.append((-score, farmer_id))
+            for rank, (score, farmer_id) in enumerate(sorted(scores)[:k], start=1):
+                rows.append(AdoptionSuggestion(consumer_id=consumer_id, farmer_id=farmer_id, score=-score, rank=rank))
+        with transaction.atomic():
+            AdoptionSuggestion.objects.filter(consumer__in=chunk).delete()
+            AdoptionSuggestion.objects.bulk_create(rows, batch_size=1000)
+    return len(consumer_ids)
+
+
+def get_suggestions(consumer, limit=SUGGESTIONS):
+    """Stored suggestions, minus farmers adopted since they were built."""
+    adopted = set(adopted_farmer_ids(consumer))
+    suggestions = (
+        AdoptionSuggestion.objects.filter(consumer=consumer).select_related('farmer').order_by('rank')[:limit]
+    )
+    return [suggestion.farmer for suggestion in suggestions if suggestion.farmer_id not in adopted]
@@ -0,0 +1,186 @@
+import base64
+import binascii
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from core.caching import catalog_version, get_or_compute
+from farmer.models import Product
+from farmer.search import search_products
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+CATALOG_CACHE_TIMEOUT = 300
+CATALOG_PAGE_KEY = 'catalog-page:{}:{}'
+
+# sort name -> (column, descending); the id column breaks ties so the
+# ordering is total and a cursor always points at exactly one row.
+SORT_ORDERS = {
+    'newest': ('created_at', True),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+}
+DEFAULT_SORT = 'newest'
+# Search results without an explicit sort
+RELEVANCE = 'relevance'
+# How many ranked ids to pull from the search index before applying filters
+SEARCH_CANDIDATES = 500
+
+
+class CatalogPage:
+    def __init__(self, products, sort, next_cursor=None):
+        self.products = products
+        self.sort = sort
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+
+def encode_cursor(sort, product):
+    column, _ = SORT_ORDERS[sort]
+    value = getattr(product, column)
+    value = value.isoformat() if column == 'created_at' else str(value)
+    raw = json.dumps([sort, value, product.pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Return the (value, pk) a cursor points at, or None if it is unusable."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    # A cursor taken under another sort order points into a different sequence
+    if cursor_sort != sort or not isinstance(pk, int):
+        return None
+    column, _ = SORT_ORDERS[sort]
+    if column == 'created_at':
+        value = parse_datetime(value) if isinstance(value, str) else None
+    else:
+        try:
+            value = Decimal(value)
+        except (InvalidOperation, TypeError):
+            value = None
+    if value is None:
+        return None
+    return value, pk
+
+
+def filter_products(filters):
+    products = Product.objects.filter(is_available=True)
+    if filters.get('category'):
+        products = products.filter(category=filters['category'])
+    if filters.get('organic'):
+        products = products.filter(is_organic=True)
+    if filters.get('min_price') is not None:
+        products = products.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        products = products.filter(price__lte=filters['max_price'])
+    if filters.get('farmer'):
+        products = products.filter(farmer_id=filters['farmer'])
+    return products
+
+
+def get_catalog_page(filters, page_size=PAGE_SIZE):
+    """
+    Fetch one page of the catalog using keyset pagination.
+
+    ``filters`` is the cleaned data of a ``CatalogFilterForm``. Rows are
+    located by seeking past the cursor on an indexed column instead of an
+    OFFSET, so page N costs the same as page 1.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    products = filter_products(filters)
+    if filters.get('q'):
+        if not filters.get('sort'):
+            return search_catalog(filters, page_size)
+        # An explicit sort pages the matches by keyset like the plain catalog
+        products = products.filter(pk__in=search_products(filters['q'], limit=SEARCH_CANDIDATES))
+    sort = filters.get('sort') or DEFAULT_SORT
+    column, descending = SORT_ORDERS[sort]
+
+    position = decode_cursor(filters.get('cursor'), sort)
+    if position is not None:
+        value, pk = position
+        if descending:
+            # The redundant lte bound lets the database range-scan the index
+            products = products.filter(
+                Q(**{f'{column}__lte': value}),
+                Q(**{f'{column}__lt': value}) | Q(**{column: value, 'id__lt': pk}),
+            )
+        else:
+            products = products.filter(
+                Q(**{f'{column}__gte': value}),
+                Q(**{f'{column}__gt': value}) | Q(**{column: value, 'id__gt': pk}),
+            )
+
+    prefix = '-' if descending else ''
+    products = products.select_related('farmer').order_by(f'{prefix}{column}', f'{prefix}id')
+
+    # One extra row tells us whether another page exists without a COUNT
+    rows = list(products[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(sort, rows[-1])
+    return CatalogPage(rows, sort, next_cursor)
+
+
+def get_cached_catalog_page(filters, page_size=PAGE_SIZE):
+    """``get_catalog_page``, cached until the catalog changes (see core.caching)."""
+    params = sorted((name, str(value)) for name, value in filters.items() if value not in (None, '', False))
+    digest = hashlib.md5(repr((page_size, params)).encode(), usedforsecurity=False).hexdigest()
+    key = CATALOG_PAGE_KEY.format(catalog_version(), digest)
+    return get_or_compute(key, lambda: get_catalog_page(filters, page_size), CATALOG_CACHE_TIMEOUT)
+
+
+def encode_rank_cursor(offset):
+    raw = json.dumps([RELEVANCE, offset], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """Return the offset into the ranked matches a cursor points at (0 if unusable)."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, offset = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return 0
+    if cursor_sort != RELEVANCE or not isinstance(offset, int) or offset < 0:
+        return 0
+    return offset
+
+
+def search_catalog(filters, page_size=PAGE_SIZE):
+    """
+    One page of the products matching ``filters['q']``, best match first.
+
+    The filters are applied to the ranked ids alone; only the rows of the
+    requested page are loaded. Cursors hold an offset into the ranking.
+    """
+    ids = search_products(filters['q'], limit=SEARCH_CANDIDATES)
+    if not ids:
+        return CatalogPage([], RELEVANCE)
+    matching = set(filter_products(filters).filter(pk__in=ids).values_list('pk', flat=True))
+    ranked = [pk for pk in ids if pk in matching]
+    offset = decode_rank_cursor(filters.get('cursor'))
+    page_ids = ranked[offset:offset + page_size]
+    rows = Product.objects.select_related('farmer').in_bulk(page_ids)
+    next_cursor = encode_rank_cursor(offset + page_size) if len(ranked) > offset + page_size else None
+    return CatalogPage([rows[pk] for pk in page_ids if pk in rows], RELEVANCE, next_cursor)
@@ -0,0 +1,346 @@
+"""
+Chatbot backend: answer engines, per-user conversation windows and batched
+message persistence.
+
+The streaming endpoint (``consumer.views.chatbot_stream``) is an async view;
+served through ``shreeanna_connect.asgi`` a reply goes out token by token
+while other sessions keep running on the same event loop.
+
+* ``ConversationWindows`` keeps the last ``WINDOW_SIZE`` messages of each
+  active user in memory (LRU over ``MAX_SESSIONS`` users), so a turn reads
+  the database only when a user's window is first needed.
+* ``MessageWriter`` buffers new ``ChatMessage`` rows from all sessions and
+  writes them off the request path with one ``bulk_create`` per flush
+  instead of two INSERTs per turn.
+* The answer engine is pluggable through ``settings.CHATBOT_ENGINE``;
+  ``LocalAnswerEngine`` retrieves answers offline from government schemes,
+  advisory rules and products (through the product search index), which
+  also makes it usable for load tests.
+"""
+import abc
+import asyncio
+import atexit
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import ChatMessage, GovernmentScheme
+from farmer.models import AdvisoryRule, Product
+from farmer.search import BM25_B, BM25_K1, search_products, tokenize
+
+WINDOW_SIZE = 20
+MAX_SESSIONS = 5000
+MAX_MESSAGE_LENGTH = 1000
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH = 200
+# The local engine re-reads schemes and advisory rules at most this often (seconds)
+DOCUMENT_TTL = 300
+# Products fetched from the search index per question term
+PRODUCT_CANDIDATES = 5
+MAX_QUERY_TERMS = 8
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'any', 'are', 'can', 'do', 'does', 'for', 'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of',
+    'on', 'or', 'please', 'the', 'there', 'to', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you',
+}
+GREETINGS = {'hi', 'hello', 'hey', 'namaste', 'vanakkam', 'namaskar'}
+TOKEN_SPLIT_RE = re.compile(r'\S+\s*')
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------- conversation windows
+
+class ConversationWindows:
+    """Recent messages per user, as deques of (is_user_message, text)."""
+
+    def __init__(self, size=WINDOW_SIZE, max_sessions=MAX_SESSIONS):
+        self.size = size
+        self.max_sessions = max_sessions
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        # No flush may land between the two reads, or its messages would show twice
+        with writer.flushing:
+            rows = list(
+                ChatMessage.objects.filter(user_id=user_id)
+                .order_by('-created_at', '-id')
+                .values_list('is_user_message', 'message')[:self.size]
+            )
+            rows.reverse()
+            # Messages still waiting in the writer are newer than anything stored
+            rows.extend((message.is_user_message, message.message) for message in writer.pending(user_id))
+        return deque(rows, maxlen=self.size)
+
+    def get(self, user_id):
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is not None:
+                self._windows.move_to_end(user_id)
+                return window
+        window = self._load(user_id)
+        with self._lock:
+            window = self._windows.setdefault(user_id, window)
+            self._windows.move_to_end(user_id)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+        return window
+
+    async def aget(self, user_id):
+        with self._lock:
+            window = self._windows.get(user_id)
+        if window is not None:
+            return self.get(user_id)
+        return await sync_to_async(self.get)(user_id)
+
+    def append(self, user_id, question, answer):
+        window = self._windows.get(user_id)
+        if window is not None:
+            window.append((True, question))
+            window.append((False, answer))
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+# ------------------------------------------------------------- batched writes
+
+class MessageWriter:
+    """
+    Buffers chat messages from every session and writes them in batches.
+
+    A daemon thread flushes the buffer every ``CHATBOT_FLUSH_INTERVAL``
+    seconds, or sooner once ``FLUSH_BATCH`` messages are waiting. A thread
+    rather than an event-loop task, so it also works when the async view is
+    served over WSGI, whose per-request loops do not outlive the response.
+    With the interval set to None nothing is written until ``flush`` is called.
+
+    Messages leave the buffer only once they are stored, so ``pending`` keeps
+    returning them while a write is in flight, and a failed write is retried
+    by the next flush.
+    """
+
+    def __init__(self, batch=FLUSH_BATCH):
+        self.batch = batch
+        self._buffer = []
+        self._lock = threading.Lock()
+        # Held for a whole flush; one flush at a time
+        self.flushing = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, question, answer):
+        now = timezone.now()
+        with self._lock:
+            self._buffer.append(ChatMessage(user_id=user_id, message=question, is_user_message=True, created_at=now))
+            self._buffer.append(ChatMessage(user_id=user_id, message=answer, is_user_message=False, created_at=now))
+            full = len(self._buffer) >= self.batch
+        interval = getattr(settings, 'CHATBOT_FLUSH_INTERVAL', FLUSH_INTERVAL)
+        if interval is not None:
+            self._start(interval)
+            if full:
+                self._wake.set()
+
+    def pending(self, user_id):
+        with self._lock:
+            return [message for message in self._buffer if message.user_id == user_id]
+
+    def flush(self):
+        with self.flushing:
+            with self._lock:
+                batch = list(self._buffer)
+            if batch:
+                ChatMessage.objects.bulk_create(batch, batch_size=self.batch)
+                with self._lock:
+                    # add() only appends, so the written messages are still the head
+                    del self._buffer[:len(batch)]
+            return len(batch)
+
+    def _start(self, interval):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(interval,), name='chat-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self, interval):
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                if self.flush():
+                    close_old_connections()
+            except Exception:
+                logger.exception('Failed to write chat messages')
+
+
+windows = ConversationWindows()
+writer = MessageWriter()
+
+
+# ------------------------------------------------------------- answer engines
+
+class AnswerEngine(abc.ABC):
+    """Interface for chatbot engines."""
+
+    @abc.abstractmethod
+    def stream(self, question, history, user_id):
+        """An async iterator over the pieces of the reply."""
+
+
+def _terms(text):
+    return [token for token in tokenize(text) if token not in STOP_WORDS]
+
+
+def _term_counts(text):
+    counts = defaultdict(int)
+    for term in _terms(text):
+        counts[term] += 1
+    return counts
+
+
+class LocalAnswerEngine(AnswerEngine):
+    """
+    Retrieval over schemes, advisory rules and products with BM25.
+
+    Schemes and advisory rules are few and are indexed in memory. Products
+    are not: each question takes a handful of candidates per term from the
+    product search index (``farmer.search``) and scores them alongside.
+
+    Short follow-up questions ("and for ragi?") are expanded with the
+    previous user message from the conversation window.
+    """
+
+    def __init__(self, ttl=DOCUMENT_TTL):
+        self.ttl = ttl
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.answers = []
+        self.postings = defaultdict(dict)
+        self.lengths = []
+
+    def _documents(self):
+        for scheme in GovernmentScheme.objects.only('title', 'description', 'eligibility', 'application_url'):
+            answer = f'{scheme.title}: {scheme.description} Eligibility: {scheme.eligibility}'
+            if scheme.application_url:
+                answer += f' Apply at {scheme.application_url}'
+            yield f'{scheme.title} {scheme.title} scheme {scheme.description} {scheme.eligibility}', answer
+        for rule in AdvisoryRule.objects.filter(is_active=True).only('millet_type', 'season', 'soil_type', 'advice'):
+            context = ' '.join(filter(None, [rule.millet_type, rule.season, rule.soil_type]))
+            yield f'{context} farming crop advice {rule.advice}', rule.advice
+
+    def _product_documents(self, terms):
+        ids = {}
+        for term in list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]:
+            ids.update(dict.fromkeys(search_products(term, limit=PRODUCT_CANDIDATES)))
+        if not ids:
+            return
+        products = Product.objects.filter(pk__in=ids, is_available=True).select_related('farmer').only(
+            'name', 'description', 'price', 'farmer__first_name', 'farmer__username').order_by('pk')
+        for product in products:
+            seller = product.farmer.first_name or product.farmer.username
+            yield (f'{product.name} {product.name} buy price {product.description}',
+                   f'{product.name} is available from {seller} at ₹{product.price}. {product.description}')
+
+    def load(self):
+        answers, postings, lengths = [], defaultdict(dict), []
+        for text, answer in self._documents():
+            counts = _term_counts(text)
+            for term, count in counts.items():
+                postings[term][len(answers)] = count
+            lengths.append(sum(counts.values()))
+            answers.append(answer)
+        with self._lock:
+            self.answers, self.postings, self.lengths = answers, postings, lengths
+            self._loaded_at = time.monotonic()
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def search(self, terms, limit=1):
+        with self._lock:
+            answers, postings, lengths = self.answers, self.postings, self.lengths
+        # Product candidates join the corpus for this question only
+        candidates = [(_term_counts(text), answer) for text, answer in self._product_documents(terms)]
+        if candidates:
+            answers = answers + [answer for _, answer in candidates]
+            lengths = lengths + [sum(counts.values()) for counts, _ in candidates]
+        if not answers:
+            return []
+        average = sum(lengths) / len(lengths) or 1.0
+        offset = len(answers) - len(candidates)
+        scores = defaultdict(float)
+        for term in set(terms):
+            docs = dict(postings.get(term, ()))
+            for doc, (counts, _) in enumerate(candidates, start=offset):
+                if term in counts:
+                    docs[doc] = counts[term]
+            if not docs:
+                continue
+            idf = math.log(1 + (len(answers) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / average)
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [answers[doc] for doc, _ in ranked]
+
+    def answer(self, question, history):
+        terms = _terms(question)
+        if not terms and GREETINGS & set(tokenize(question)):
+            return 'Namaste! Ask me about millets, prices, crop advice or government schemes.'
+        if len(terms) < 3:
+            previous = [text for is_user, text in history if is_user]
+            if previous:
+                terms += _terms(previous[-1])
+        results = self.search(terms)
+        if not results:
+            return "Sorry, I couldn't find anything about that. Try asking about a millet, a product or a scheme."
+        return results[0]
+
+    async def stream(self, question, history, user_id):
+        if self._stale():
+            await sync_to_async(self.load)()
+        answer = await sync_to_async(self.answer)(question, history)
+        for token in TOKEN_SPLIT_RE.findall(answer):
+            yield token
+            # Let other sessions run between tokens
+            await asyncio.sleep(0)
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = import_string(getattr(settings, 'CHATBOT_ENGINE', 'consumer.chat.LocalAnswerEngine'))()
+    return _engine
+
+
+async def reply(user_id, question):
+    """
+    Stream the reply to ``question`` and record the turn.
+
+    The window and the writer are updated once the full answer is known, so
+    a client that disconnects mid-reply leaves no half-written turn.
+    """
+    window = await windows.aget(user_id)
+    history = list(window)
+    parts = []
+    async for token in get_engine().stream(question, history, user_id):
+        parts.append(token)
+        yield token
+    answer = ''.join(parts).strip()
+    windows.append(user_id, question, answer)
+    writer.add(user_id, question, answer)
@@ -0,0 +1,117 @@
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Now
+
+from core.caching import invalidate_catalog
+from farmer.models import Product
+from farmer.stats import record_order_sales
+from .models import Cart, CartItem, Order, OrderItem
+from .services import cart_changed, recalculate_cart_totals
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f"Not enough stock left for: {names}.")
+
+
+class _StockShortfall(Exception):
+    def __init__(self, items):
+        self.items = items
+
+
+def place_order(user, shipping_address, phone_number, idempotency_key=None):
+    """
+    Turn the user's cart into an order.
+
+    Stock is reserved with one guarded ``UPDATE`` that only decrements rows
+    whose ``stock_quantity`` still covers the requested quantity; if any line
+    cannot be covered the whole transaction rolls back, so stock can never go
+    negative and no row locks are taken. Retrying with the same
+    ``idempotency_key`` returns the order created by the first attempt.
+    """
+    if idempotency_key:
+        existing = Order.objects.filter(consumer=user, idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing
+    try:
+        with transaction.atomic():
+            order = _place_order(user, shipping_address, phone_number, idempotency_key)
+        cart_changed.send(sender=Cart, user_id=user.pk)
+        return order
+    except _StockShortfall as shortfall:
+        # Checked after the rollback so partially reserved rows read correctly
+        raise _out_of_stock(shortfall.items) from None
+    except IntegrityError:
+        # A concurrent retry with the same key won the race to insert
+        if idempotency_key:
+            existing = Order.objects.filter(consumer=user, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing
+        raise
+
+
+def _place_order(user, shipping_address, phone_number, idempotency_key):
+    items = list(CartItem.objects.filter(cart__consumer=user).select_related('product').order_by('product_id'))
+    if not items:
+        raise CheckoutError("Your cart is empty.")
+
+    reserved = Product.objects.filter(
+        reduce(or_, [
+            Q(pk=item.product_id, is_available=True, stock_quantity__gte=item.quantity)
+            for item in items
+        ])
+    ).update(
+        stock_quantity=F('stock_quantity') - Case(
+            *[When(pk=item.product_id, then=Value(item.quantity)) for item in items],
+            output_field=IntegerField(),
+        ),
+        # update() skips auto_now; Last-Modified and cached fragments rely on it
+        updated_at=Now(),
+    )
+    # The stock shown in the catalog changed, and update() sends no signals
+    transaction.on_commit(invalidate_catalog)
+    if reserved != len(items):
+        # Leaving the atomic block by raising undoes the partial reservation
+        raise _StockShortfall(items)
+
+    order = Order.objects.create(
+        consumer=user,
+        total_amount=sum(item.product.price * item.quantity for item in items),
+        shipping_address=shipping_address,
+        phone_number=phone_number,
+        idempotency_key=idempotency_key or None,
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=item.product_id, quantity=item.quantity, price=item.product.price)
+        for item in items
+    ])
+    record_order_sales((item.product.farmer_id, item.quantity, item.product.price * item.quantity) for item in items)
+
+    # Only the quantities that were ordered; units added meanwhile stay in the cart
+    ordered = [item.pk for item in items]
+    CartItem.objects.filter(pk__in=ordered).update(
+        quantity=Greatest(F('quantity') - Case(
+            *[When(pk=item.pk, then=Value(item.quantity)) for item in items],
+            output_field=IntegerField(),
+        ), Value(0)),
+    )
+    CartItem.objects.filter(pk__in=ordered, quantity__lte=0).delete()
+    recalculate_cart_totals(Cart.objects.filter(consumer=user))
+    return order
+
+
+def _out_of_stock(items):
+    wanted = {item.product_id: item.quantity for item in items}
+    products = Product.objects.filter(pk__in=wanted).only('id', 'name', 'stock_quantity', 'is_available')
+    short = [product for product in products
+             if not product.is_available or product.stock_quantity < wanted[product.pk]]
+    return OutOfStockError(short or [item.product for item in items])
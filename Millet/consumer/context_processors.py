@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Cart
+
+
+def cart_summary(request):
+    """
+    Expose the cached cart totals for the navbar badge.
+
+    Evaluated lazily, so pages that never render the badge cost nothing, and
+    it reads the denormalized counters on ``Cart`` instead of counting items.
+    """
+    user = getattr(request, 'user', None)
+
+    def summary():
+        if user is None or not user.is_authenticated or user.user_type != 'consumer':
+            return None
+        return Cart.objects.filter(consumer=user).only('item_count', 'subtotal').first()
+
+    return {'cart_summary': SimpleLazyObject(summary)}
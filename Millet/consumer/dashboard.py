@@ -0,0 +1,80 @@
+"""
+Consumer dashboard context, built in a fixed number of queries and cached per user.
+
+Cache keys carry a per-user version number. Anything that changes what the
+dashboard shows bumps the version (see consumer.signals), which orphans the
+old entry instead of having to find and delete it.
+"""
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from accounts.models import User
+from core.caching import bump_version, cache_version
+from core.models import RewardBalance
+from .models import Cart, FarmerAdoption, Order
+from .recommendations import get_recommended_products
+
+DASHBOARD_CACHE_TIMEOUT = 300
+RECENT_ORDERS = 5
+ADOPTED_FARMERS = 6
+RECOMMENDED_PRODUCTS = 4
+
+VERSION_KEY = 'consumer-dashboard-version:{}'
+CONTEXT_KEY = 'consumer-dashboard:{}:{}'
+
+
+def _scalar(queryset, aggregate):
+    """Correlated subquery returning one aggregate over ``queryset``."""
+    return Coalesce(
+        Subquery(queryset.order_by().annotate(value=aggregate).values('value')[:1], output_field=IntegerField()),
+        0,
+    )
+
+
+def invalidate_dashboard(user_id):
+    bump_version(VERSION_KEY.format(user_id))
+
+
+def build_dashboard_context(user):
+    """
+    Fetch everything the consumer dashboard shows in four queries: one for
+    all the counters (correlated subqueries on the user row), then recent
+    orders, adopted farmers and recommendations.
+    """
+    counters = User.objects.filter(pk=user.pk).annotate(
+        cart_items_count=_scalar(Cart.objects.filter(consumer=OuterRef('pk')).values('consumer'), Sum('item_count')),
+        orders_count=_scalar(Order.objects.filter(consumer=OuterRef('pk')).values('consumer'), Count('id')),
+        adopted_farmers_count=_scalar(
+            FarmerAdoption.objects.filter(consumer=OuterRef('pk'), active=True).values('consumer'), Count('id')
+        ),
+        reward_points=Coalesce(Subquery(RewardBalance.objects.filter(user=OuterRef('pk')).values('points')[:1]), 0),
+    ).values('cart_items_count', 'orders_count', 'adopted_farmers_count', 'reward_points').get()
+
+    recent_orders = list(
+        Order.objects.filter(consumer=user)
+        .annotate(items_count=Count('items'))
+        .order_by('-created_at', '-id')[:RECENT_ORDERS]
+    )
+    adopted_farmers = list(
+        FarmerAdoption.objects.filter(consumer=user, active=True)
+        .select_related('farmer')
+        .order_by('-adoption_date')[:ADOPTED_FARMERS]
+    )
+    recommended_products = get_recommended_products(user, RECOMMENDED_PRODUCTS)
+
+    return {
+        **counters,
+        'recent_orders': recent_orders,
+        'adopted_farmers': adopted_farmers,
+        'recommended_products': recommended_products,
+    }
+
+
+def get_dashboard_context(user):
+    key = CONTEXT_KEY.format(user.pk, cache_version(VERSION_KEY.format(user.pk)))
+    context = cache.get(key)
+    if context is None:
+        context = build_dashboard_context(user)
+        cache.set(key, context, DASHBOARD_CACHE_TIMEOUT)
+    return context
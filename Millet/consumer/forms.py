@@ -0,0 +1,32 @@
+from django import forms
+from farmer.models import Product
+
+class CatalogFilterForm(forms.Form):
+    SORT_CHOICES = (
+        ('newest', 'Newest first'),
+        ('price_asc', 'Price: low to high'),
+        ('price_desc', 'Price: high to low'),
+    )
+
+    q = forms.CharField(max_length=100, required=False, strip=True)
+    category = forms.ChoiceField(choices=(('', 'All categories'),) + Product.CATEGORY_CHOICES, required=False)
+    organic = forms.BooleanField(required=False)
+    min_price = forms.DecimalField(min_value=0, max_digits=10, decimal_places=2, required=False)
+    max_price = forms.DecimalField(min_value=0, max_digits=10, decimal_places=2, required=False)
+    farmer = forms.IntegerField(min_value=1, required=False)
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+    cursor = forms.CharField(max_length=200, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        min_price = cleaned_data.get('min_price')
+        max_price = cleaned_data.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise forms.ValidationError("Minimum price cannot be greater than maximum price.")
+        return cleaned_data
+
+class CheckoutForm(forms.Form):
+    shipping_address = forms.CharField(widget=forms.Textarea(attrs={'rows': 3}))
+    phone_number = forms.CharField(max_length=15)
+    # Generated when the page is rendered so a double submit maps to one order
+    idempotency_key = forms.CharField(max_length=64, widget=forms.HiddenInput())
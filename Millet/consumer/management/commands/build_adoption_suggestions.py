@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from consumer.adoptions import build_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Rank farmers for every consumer to adopt (run nightly).'
+
+    def handle(self, *args, **options):
+        count = build_suggestions()
+        self.stdout.write(self.style.SUCCESS(f'Built adoption suggestions for {count} consumers.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from consumer.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute product neighbours and every consumer\'s recommendations (run nightly).'
+
+    def handle(self, *args, **options):
+        count = rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt recommendations for {count} consumers.'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumer', '0004_order_idempotency_key'),
+        ('farmer', '0004_farmer_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumerRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('consumer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='farmer.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('consumer', 'rank'), name='unique_consumer_recommendation_rank')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='farmer.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='farmer.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-score'], name='neighbour_product_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'neighbour'), name='unique_product_neighbour')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_adoptions(apps, schema_editor):
+    # Adopting twice used to add a second row; keep the active, most recent one
+    FarmerAdoption = apps.get_model('consumer', 'FarmerAdoption')
+    duplicates = (
+        FarmerAdoption.objects.values('consumer_id', 'farmer_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        pair = FarmerAdoption.objects.filter(consumer_id=row['consumer_id'], farmer_id=row['farmer_id'])
+        keep = pair.order_by('-active', '-adoption_date', '-id').first()
+        pair.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumer', '0005_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdoptionSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='farmeradoption',
+            index=models.Index(fields=['consumer', 'active', '-adoption_date'], name='adoption_consumer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmeradoption',
+            index=models.Index(fields=['farmer', 'active', '-adoption_date'], name='adoption_farmer_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_adoptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='farmeradoption',
+            constraint=models.UniqueConstraint(fields=('consumer', 'farmer'), name='unique_consumer_farmer'),
+        ),
+        migrations.AddField(
+            model_name='adoptionsuggestion',
+            name='consumer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='farmer_suggestions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='adoptionsuggestion',
+            name='farmer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='adoptionsuggestion',
+            constraint=models.UniqueConstraint(fields=('consumer', 'rank'), name='unique_consumer_suggestion_rank'),
+        ),
+    ]
@@ -4,6 +4,10 @@ from farmer.models import Product
 
 class Cart(models.Model):
     consumer = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Denormalized totals kept in sync by consumer.services so badges and
+    # dashboards never have to aggregate cart items
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -16,11 +20,20 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
     @property
     def total_price(self):
+        # Use the line total annotated by the cart query when it is available
+        line_total = getattr(self, 'line_total', None)
+        if line_total is not None:
+            return line_total
         return self.product.price * self.quantity
 
 class Order(models.Model):
@@ -38,9 +51,16 @@ class Order(models.Model):
     phone_number = models.CharField(max_length=15)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_id = models.CharField(max_length=100, blank=True, null=True)
+    # Client-supplied token so a retried checkout returns the original order
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consumer', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.consumer.username}"
 
@@ -63,6 +83,16 @@ class FarmerAdoption(models.Model):
     adoption_date = models.DateTimeField(auto_now_add=True)
     active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Unadopting clears ``active``; adopting again reuses the row
+            models.UniqueConstraint(fields=['consumer', 'farmer'], name='unique_consumer_farmer'),
+        ]
+        indexes = [
+            models.Index(fields=['consumer', 'active', '-adoption_date'], name='adoption_consumer_idx'),
+            models.Index(fields=['farmer', 'active', '-adoption_date'], name='adoption_farmer_idx'),
+        ]
+
     def __str__(self):
         return f"{self.consumer.username} adopted {self.farmer.username}"
 
@@ -74,3 +104,51 @@ class ConsumerReward(models.Model):
 
     def __str__(self):
         return f"{self.consumer.username}: {self.points} points"
+
+class ProductNeighbour(models.Model):
+    """Top-K co-purchase neighbours of a product, written by consumer.recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'neighbour'], name='unique_product_neighbour'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-score'], name='neighbour_product_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbour_id} ({self.score:.3f})"
+
+class ConsumerRecommendation(models.Model):
+    """Precomputed, ranked product recommendations for one consumer."""
+    # Rows without a consumer hold the popularity fallback shown to everyone
+    consumer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations', blank=True, null=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consumer', 'rank'], name='unique_consumer_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} for {self.consumer_id}: {self.product_id}"
+
+class AdoptionSuggestion(models.Model):
+    """A farmer suggested for a consumer to adopt, ranked by consumer.adoptions."""
+    consumer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='farmer_suggestions')
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consumer', 'rank'], name='unique_consumer_suggestion_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} for {self.consumer_id}: {self.farmer_id}"
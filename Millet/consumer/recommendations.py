@@ -0,0 +1,388 @@
+"""
+Product recommendations from co-purchase history and health preferences.
+
+Building is offline: ``rebuild_recommendations`` runs the full job (nightly)
+and ``update_for_order`` refreshes only what one new order touches. Both use
+NumPy/SciPy sparse matrices, imported lazily so that serving - a single
+indexed read of ``ConsumerRecommendation`` - does not depend on them.
+
+Scoring for a consumer blends:
+
+* item-item cosine similarity of products bought (or carted) together,
+  summed over the consumer's history;
+* affinity for the product categories the consumer already buys;
+* overlap between ``User.health_preferences`` and the product's text,
+  using the search analyzer so regional millet names are understood.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from accounts.models import User
+from farmer.models import Product
+from farmer.search import tokenize
+from .models import CartItem, ConsumerRecommendation, OrderItem, ProductNeighbour
+
+TOP_K_NEIGHBOURS = 20
+TOP_K_RECOMMENDATIONS = 12
+POPULAR_POOL = 200
+CONSUMER_CHUNK = 1000
+# The popularity pool is computed by the nightly build and reused by the
+# per-order updates until the next one; two days covers a missed run
+POPULARITY_KEY = 'recommendations:popularity'
+POPULARITY_TIMEOUT = 2 * 24 * 3600
+
+# Carts show interest but count for less than completed orders
+CART_WEIGHT = 0.5
+CO_PURCHASE_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.3
+HEALTH_WEIGHT = 0.5
+POPULARITY_WEIGHT = 0.1
+
+# Health goals people write in their profile -> terms found in matching
+# products (millet keys come from the search analyzer's alias folding)
+HEALTH_TERMS = {
+    'diabetes': ['finger', 'foxtail', 'kodo', 'little', 'barnyard', 'fibre', 'fiber', 'glycemic'],
+    'diabetic': ['finger', 'foxtail', 'kodo', 'little', 'barnyard', 'fibre', 'fiber', 'glycemic'],
+    'sugar': ['finger', 'foxtail', 'kodo', 'little', 'glycemic'],
+    'weight': ['barnyard', 'little', 'kodo', 'fibre', 'fiber'],
+    'protein': ['protein', 'pearl', 'proso', 'foxtail'],
+    'calcium': ['calcium', 'finger'],
+    'bone': ['calcium', 'finger'],
+    'iron': ['iron', 'pearl', 'barnyard'],
+    'anemia': ['iron', 'pearl', 'barnyard'],
+    'heart': ['magnesium', 'pearl', 'foxtail', 'sorghum'],
+    'gluten': ['gluten', 'millet'],
+    'digestion': ['fibre', 'fiber', 'kodo', 'little'],
+}
+
+
+def health_goals(preferences):
+    """
+    One set of matching product terms per goal named in ``preferences``.
+    Only the goals in ``HEALTH_TERMS`` count; any other word is ignored.
+    """
+    goals = {}
+    for token in tokenize(preferences):
+        if token in HEALTH_TERMS:
+            goals[token] = {token, *HEALTH_TERMS[token]}
+    return list(goals.values())
+
+
+def health_score(goals, tokens):
+    """Fraction of the consumer's goals that a product's text addresses."""
+    return sum(1 for terms in goals if terms & tokens) / len(goals)
+
+
+# ---------------------------------------------------------------- serving
+
+def get_recommended_products(user, limit=4):
+    """
+    Ranked recommendations for ``user`` in one indexed query.
+
+    The consumer's own rows come first; the shared popularity rows fill any
+    gap for consumers the last build has not seen yet.
+    """
+    rows = (
+        ConsumerRecommendation.objects.filter(Q(consumer=user) | Q(consumer__isnull=True), product__is_available=True)
+        .select_related('product__farmer')
+        .order_by(F('consumer').asc(nulls_last=True), 'rank')[:limit * 2]
+    )
+    products, seen = [], set()
+    for row in rows:
+        if row.product_id not in seen:
+            seen.add(row.product_id)
+            products.append(row.product)
+    return products[:limit]
+
+
+# ----------------------------------------------------------- item-item model
+
+def _basket_items(product_ids=None):
+    """(basket, product, weight) for orders and carts, optionally only baskets touching ``product_ids``."""
+    order_items = OrderItem.objects.all()
+    cart_items = CartItem.objects.all()
+    if product_ids is not None:
+        order_items = order_items.filter(order__in=OrderItem.objects.filter(product__in=product_ids).values('order'))
+        cart_items = cart_items.filter(cart__in=CartItem.objects.filter(product__in=product_ids).values('cart'))
+    for order_id, product_id in order_items.values_list('order_id', 'product_id').iterator(chunk_size=5000):
+        yield ('order', order_id), product_id, 1.0
+    for cart_id, product_id in cart_items.values_list('cart_id', 'product_id').iterator(chunk_size=5000):
+        yield ('cart', cart_id), product_id, CART_WEIGHT
+
+
+def _basket_counts(product_ids):
+    """Weighted number of baskets containing each product, across all history."""
+    counts = defaultdict(float)
+    orders = OrderItem.objects.filter(product__in=product_ids).values('product').annotate(n=Count('order', distinct=True))
+    for row in orders:
+        counts[row['product']] += row['n']
+    carts = CartItem.objects.filter(product__in=product_ids).values('product').annotate(n=Count('cart', distinct=True))
+    for row in carts:
+        counts[row['product']] += CART_WEIGHT * row['n']
+    return counts
+
+
+def compute_neighbours(product_ids=None, k=TOP_K_NEIGHBOURS):
+    """
+    Top-``k`` cosine neighbours for ``product_ids`` (every product when None).
+
+    Baskets form a sparse basket x product matrix B; the co-occurrence rows
+    for the targets are ``B[:, targets].T @ W @ B`` with W the basket weights.
+    Only baskets that contain a target are loaded, so refreshing the
+    products of one order reads a small slice of history.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    basket_index, product_index = {}, {}
+    rows, cols, basket_weights = [], [], []
+    for basket, product_id, weight in _basket_items(product_ids):
+        if basket not in basket_index:
+            basket_index[basket] = len(basket_index)
+            basket_weights.append(weight)
+        rows.append(basket_index[basket])
+        cols.append(product_index.setdefault(product_id, len(product_index)))
+    if not rows:
+        return {}
+
+    products = np.empty(len(product_index), dtype=np.int64)
+    for product_id, column in product_index.items():
+        products[column] = product_id
+    baskets = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(basket_index), len(product_index))
+    )
+    baskets.data[:] = 1.0  # a product listed twice in one basket still counts once
+    weights = np.asarray(basket_weights)
+
+    if product_ids is None:
+        targets = np.arange(len(product_index))
+        counts = baskets.T @ weights
+    else:
+        targets = np.array([product_index[pk] for pk in product_ids if pk in product_index], dtype=np.int64)
+        global_counts = _basket_counts(products.tolist())
+        counts = np.array([global_counts.get(int(pk), 0.0) for pk in products])
+    if not len(targets):
+        return {}
+
+    cooccurrence = (baskets[:, targets].T @ sparse.diags(weights) @ baskets).tocsr()
+    norms = np.sqrt(np.maximum(counts, 1e-9))
+
+    neighbours = {}
+    for row, target in enumerate(targets):
+        start, end = cooccurrence.indptr[row], cooccurrence.indptr[row + 1]
+        columns = cooccurrence.indices[start:end]
+        scores = cooccurrence.data[start:end] / (norms[target] * norms[columns])
+        keep = columns != target
+        columns, scores = columns[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+            columns, scores = columns[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        neighbours[int(products[target])] = [(int(products[c]), float(s)) for c, s in zip(columns[order], scores[order])]
+    return neighbours
+
+
+def save_neighbours(neighbours, replace_all=False):
+    with transaction.atomic():
+        existing = ProductNeighbour.objects.all() if replace_all else ProductNeighbour.objects.filter(product__in=neighbours)
+        existing.delete()
+        ProductNeighbour.objects.bulk_create(
+            [
+                ProductNeighbour(product_id=product_id, neighbour_id=neighbour_id, score=score)
+                for product_id, rows in neighbours.items()
+                for neighbour_id, score in rows
+            ],
+            batch_size=5000,
+        )
+
+
+# --------------------------------------------------------- per-consumer recs
+
+def _popularity():
+    """Units sold per available product, most popular first."""
+    rows = (
+        OrderItem.objects.filter(product__is_available=True)
+        .values('product')
+        .annotate(units=Sum('quantity'))
+        .order_by('-units', 'product')[:POPULAR_POOL]
+    )
+    popular = {row['product']: float(row['units']) for row in rows}
+    if len(popular) < POPULAR_POOL:
+        # Fresh catalogs have little history: pad with the newest products
+        newest = Product.objects.filter(is_available=True).exclude(pk__in=popular).order_by('-created_at', '-id')
+        for pk in newest.values_list('pk', flat=True)[:POPULAR_POOL - len(popular)]:
+            popular[pk] = 0.0
+    return popular
+
+
+def _cached_popularity():
+    popular = cache.get(POPULARITY_KEY)
+    if popular is None:
+        popular = _popularity()
+        cache.set(POPULARITY_KEY, popular, POPULARITY_TIMEOUT)
+    return popular
+
+
+def _histories(consumer_ids):
+    history = defaultdict(lambda: defaultdict(float))
+    in_cart = defaultdict(set)
+    orders = (
+        OrderItem.objects.filter(order__consumer__in=consumer_ids)
+        .values('order__consumer', 'product')
+        .annotate(units=Sum('quantity'))
+    )
+    for row in orders:
+        history[row['order__consumer']][row['product']] += row['units']
+    for consumer_id, product_id, quantity in CartItem.objects.filter(cart__consumer__in=consumer_ids).values_list(
+            'cart__consumer', 'product', 'quantity'):
+        history[consumer_id][product_id] += CART_WEIGHT * quantity
+        in_cart[consumer_id].add(product_id)
+    return history, in_cart
+
+
+def _rank(scores, k):
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:k]
+
+
+def build_consumer_recommendations(consumer_ids=None, k=TOP_K_RECOMMENDATIONS):
+    """
+    Recompute and store recommendations for ``consumer_ids`` (all when None).
+
+    A full build also refreshes the shared popularity rows and the cached
+    popularity pool; a partial one reuses that pool and looks up categories
+    only for the products it scores, so its cost does not grow with the
+    order history or the catalog. Consumers are processed in chunks; within
+    a chunk the collaborative scores for every consumer come from one sparse
+    product ``history @ similarity``.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    full = consumer_ids is None
+    consumers = User.objects.filter(user_type='consumer')
+    if not full:
+        consumers = consumers.filter(pk__in=consumer_ids)
+    consumers = list(consumers.values_list('pk', 'health_preferences'))
+
+    if full:
+        popular = _popularity()
+        cache.set(POPULARITY_KEY, popular, POPULARITY_TIMEOUT)
+        categories = dict(Product.objects.filter(is_available=True).values_list('pk', 'category'))
+        looked_up = None
+    else:
+        popular = _cached_popularity()
+        categories, looked_up = {}, set()
+    top_units = max(popular.values(), default=0.0) or 1.0
+    token_cache = {}
+
+    def product_categories(product_ids):
+        """Categories of the available products among ``product_ids``."""
+        if looked_up is not None:
+            missing = [pk for pk in product_ids if pk not in looked_up]
+            categories.update(
+                Product.objects.filter(pk__in=missing, is_available=True).values_list('pk', 'category')
+            )
+            looked_up.update(missing)
+        return categories
+
+    def product_tokens(product_ids):
+        missing = [pk for pk in product_ids if pk not in token_cache]
+        for pk, name, description in Product.objects.filter(pk__in=missing).values_list('pk', 'name', 'description'):
+            token_cache[pk] = set(tokenize(f'{name} {description}'))
+        return token_cache
+
+    for offset in range(0, len(consumers), CONSUMER_CHUNK):
+        chunk = consumers[offset:offset + CONSUMER_CHUNK]
+        history, in_cart = _histories([pk for pk, _ in chunk])
+        seen = {pk for items in history.values() for pk in items}
+
+        # Similarity matrix restricted to the rows this chunk needs
+        index = {}
+        rows, cols, data = [], [], []
+        for product_id, neighbour_id, score in ProductNeighbour.objects.filter(product__in=seen).values_list(
+                'product', 'neighbour', 'score').iterator(chunk_size=5000):
+            rows.append(index.setdefault(product_id, len(index)))
+            cols.append(index.setdefault(neighbour_id, len(index)))
+            data.append(score)
+        for product_id in seen:
+            index.setdefault(product_id, len(index))
+        ids = np.empty(len(index), dtype=np.int64)
+        for product_id, column in index.items():
+            ids[column] = product_id
+        similarity = sparse.csr_matrix((data, (rows, cols)), shape=(len(index), len(index)))
+
+        h_rows, h_cols, h_data = [], [], []
+        for row, (consumer_id, _) in enumerate(chunk):
+            for product_id, weight in history.get(consumer_id, {}).items():
+                h_rows.append(row)
+                h_cols.append(index[product_id])
+                h_data.append(weight)
+        histories = sparse.csr_matrix((h_data, (h_rows, h_cols)), shape=(len(chunk), len(index)))
+        collaborative = (histories @ similarity).tocsr()
+        product_categories(set(ids.tolist()) | set(popular))
+
+        recommendations = []
+        for row, (consumer_id, preferences) in enumerate(chunk):
+            start, end = collaborative.indptr[row], collaborative.indptr[row + 1]
+            cf = dict(zip(ids[collaborative.indices[start:end]].tolist(), collaborative.data[start:end].tolist()))
+            top_cf = max(cf.values(), default=0.0) or 1.0
+
+            affinity = defaultdict(float)
+            user_history = history.get(consumer_id, {})
+            for product_id, weight in user_history.items():
+                if product_id in categories:
+                    affinity[categories[product_id]] += weight
+            total_affinity = sum(affinity.values()) or 1.0
+
+            goals = health_goals(preferences)
+            candidates = [pk for pk in set(cf) | set(popular) if pk in categories and pk not in in_cart[consumer_id]]
+            tokens = product_tokens(candidates) if goals else {}
+
+            scores = {}
+            for pk in candidates:
+                score = CO_PURCHASE_WEIGHT * cf.get(pk, 0.0) / top_cf
+                score += CATEGORY_WEIGHT * affinity.get(categories[pk], 0.0) / total_affinity
+                score += POPULARITY_WEIGHT * popular.get(pk, 0.0) / top_units
+                if goals:
+                    score += HEALTH_WEIGHT * health_score(goals, tokens[pk])
+                scores[pk] = score
+            for rank, (pk, score) in enumerate(_rank(scores, k), start=1):
+                recommendations.append(ConsumerRecommendation(consumer_id=consumer_id, product_id=pk, score=score, rank=rank))
+
+        with transaction.atomic():
+            ConsumerRecommendation.objects.filter(consumer__in=[pk for pk, _ in chunk]).delete()
+            ConsumerRecommendation.objects.bulk_create(recommendations, batch_size=5000)
+
+    if full:
+        fallback = _rank({pk: units / top_units for pk, units in popular.items()}, k)
+        with transaction.atomic():
+            ConsumerRecommendation.objects.filter(consumer__isnull=True).delete()
+            ConsumerRecommendation.objects.bulk_create([
+                ConsumerRecommendation(consumer=None, product_id=pk, score=score, rank=rank)
+                for rank, (pk, score) in enumerate(fallback, start=1)
+            ])
+    return len(consumers)
+
+
+# ------------------------------------------------------------- entry points
+
+def rebuild_recommendations():
+    """Nightly job: recompute all neighbours, then every consumer's list."""
+    save_neighbours(compute_neighbours(), replace_all=True)
+    return build_consumer_recommendations()
+
+
+def update_for_order(order):
+    """Refresh the neighbours of the ordered products and the buyer's list."""
+    from .dashboard import invalidate_dashboard
+
+    product_ids = list(order.items.values_list('product_id', flat=True))
+    if not product_ids:
+        return
+    save_neighbours(compute_neighbours(product_ids))
+    build_consumer_recommendations([order.consumer_id])
+    invalidate_dashboard(order.consumer_id)
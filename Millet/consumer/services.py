@@ -0,0 +1,121 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from farmer.models import Product
+from .models import Cart, CartItem
+
+MAX_QUANTITY_PER_ADD = 100
+
+# Sent with ``user_id`` after a user's cart contents or totals change. Cart
+# writes use queryset updates, which bypass the model save signals.
+cart_changed = Signal()
+
+
+def _check_quantity(quantity):
+    if not isinstance(quantity, int) or not 1 <= quantity <= MAX_QUANTITY_PER_ADD:
+        raise ValueError(f"Quantity must be between 1 and {MAX_QUANTITY_PER_ADD}.")
+
+
+def get_cart(user):
+    cart, created = Cart.objects.get_or_create(consumer=user)
+    return cart
+
+
+def add_to_cart(user, product, quantity=1):
+    """
+    Add ``quantity`` units of ``product`` to the user's cart.
+
+    The common case (product already in the cart) is a single
+    ``UPDATE ... SET quantity = quantity + n`` plus the matching bump of the
+    cart's cached totals. Concurrent adds never lose increments because the
+    database does the arithmetic, and the unique (cart, product) constraint
+    turns a racing first insert into an update.
+    """
+    _check_quantity(quantity)
+    with transaction.atomic():
+        updated = CartItem.objects.filter(cart__consumer=user, product_id=product.pk).update(
+            quantity=F('quantity') + quantity
+        )
+        if not updated:
+            cart = get_cart(user)
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, product_id=product.pk, quantity=quantity)
+            except IntegrityError:
+                # Another request created the row between our update and insert
+                CartItem.objects.filter(cart=cart, product_id=product.pk).update(quantity=F('quantity') + quantity)
+        Cart.objects.filter(consumer=user).update(
+            item_count=F('item_count') + quantity,
+            subtotal=F('subtotal') + product.price * quantity,
+        )
+    cart_changed.send(sender=Cart, user_id=user.pk)
+
+
+def add_many_to_cart(user, quantities):
+    """
+    Add several products at once in one transaction.
+
+    ``quantities`` maps product id to quantity. Unknown or unavailable
+    products are skipped and their ids returned so the caller can report them.
+    Missing rows are inserted empty and every row is then incremented with a
+    single ``CASE`` update, so the cost does not grow with the number of lines.
+    """
+    for quantity in quantities.values():
+        _check_quantity(quantity)
+    available = set(Product.objects.filter(pk__in=quantities, is_available=True).values_list('pk', flat=True))
+    rejected = sorted(set(quantities) - available)
+    if not available:
+        return rejected
+
+    with transaction.atomic():
+        cart = get_cart(user)
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=product_id, quantity=0) for product_id in available],
+            ignore_conflicts=True,
+        )
+        CartItem.objects.filter(cart=cart, product_id__in=available).update(
+            quantity=F('quantity') + Case(
+                *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in available],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        recalculate_cart_totals(Cart.objects.filter(pk=cart.pk))
+    cart_changed.send(sender=Cart, user_id=user.pk)
+    return rejected
+
+
+def recalculate_cart_totals(carts):
+    """Recompute the cached totals of every cart in ``carts`` with one UPDATE."""
+    items = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+    line_total = Sum(F('product__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    carts.update(
+        item_count=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+        subtotal=Coalesce(
+            Subquery(items.annotate(total=line_total).values('total')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def get_cart_items(user):
+    """
+    Cart lines for rendering, in one query.
+
+    Each row carries its product (``select_related``), its ``line_total`` and
+    the whole cart's ``cart_total`` computed by a window ``SUM`` so the view
+    needs neither a second aggregate query nor per-item product lookups.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return (
+        CartItem.objects.filter(cart__consumer=user)
+        .select_related('product')
+        .annotate(
+            line_total=F('product__price') * F('quantity'),
+            cart_total=Window(Sum(F('product__price') * F('quantity'), output_field=money)),
+        )
+        .order_by('added_at', 'id')
+    )
@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import rewards
+from farmer.models import Product
+from .adoptions import invalidate_adoptions
+from .dashboard import invalidate_dashboard
+from .models import Cart, ConsumerReward, FarmerAdoption, Order
+from .services import cart_changed, recalculate_cart_totals
+
+
+@receiver(post_save, sender=Product)
+def refresh_cart_totals_on_price_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw or (update_fields is not None and 'price' not in update_fields):
+        return
+    recalculate_cart_totals(Cart.objects.filter(items__product=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts_of_deleted_product(sender, instance, **kwargs):
+    # Cart items are cascaded away before post_delete, so note the carts now
+    instance._affected_carts = list(Cart.objects.filter(items__product=instance).values_list('pk', 'consumer_id'))
+
+
+@receiver(post_delete, sender=Product)
+def refresh_cart_totals_on_delete(sender, instance, **kwargs):
+    carts = getattr(instance, '_affected_carts', None)
+    if carts:
+        recalculate_cart_totals(Cart.objects.filter(pk__in=[cart_id for cart_id, _ in carts]))
+        for _, consumer_id in carts:
+            cart_changed.send(sender=Cart, user_id=consumer_id)
+
+
+@receiver(cart_changed)
+def invalidate_dashboard_on_cart_change(sender, user_id, **kwargs):
+    invalidate_dashboard(user_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=FarmerAdoption)
+@receiver(post_delete, sender=FarmerAdoption)
+def invalidate_dashboard_on_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_dashboard(instance.consumer_id)
+
+
+@receiver(post_save, sender=FarmerAdoption)
+@receiver(post_delete, sender=FarmerAdoption)
+def refresh_adoption_lists(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_adoptions(instance.consumer_id, instance.farmer_id)
+
+
+@receiver(post_save, sender=ConsumerReward)
+def accrue_consumer_reward(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.points:
+        rewards.accrue(instance.consumer, instance.points, instance.description, key=f'consumer-reward:{instance.pk}')
+
+
+@receiver(rewards.balance_changed)
+def invalidate_dashboard_on_balance_change(sender, user_id, **kwargs):
+    invalidate_dashboard(user_id)
@@ -0,0 +1,22 @@
+from core.background import task
+
+from . import adoptions, recommendations
+from .models import Order
+
+
+@task(max_retries=2)
+def process_order(order_id):
+    """Follow-up work after checkout that the buyer does not need to wait for."""
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        recommendations.update_for_order(order)
+
+
+@task(queue='bulk')
+def rebuild_recommendations():
+    return recommendations.rebuild_recommendations()
+
+
+@task(queue='bulk')
+def build_adoption_suggestions(consumer_ids=None):
+    return adoptions.build_suggestions(consumer_ids)
@@ -1,3 +1,670 @@
-from django.test import TestCase
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from core.models import ChatMessage, GovernmentScheme
+from farmer.models import Product
+from farmer.search import get_search_backend
+from .adoptions import (
+    AdoptionError, adopt, adopted_farmer_ids, adoption_counts, build_suggestions, get_adopted_farmers, get_adopters,
+    get_suggestions, unadopt,
+)
+from .catalog import get_catalog_page, encode_cursor
+from .checkout import CheckoutError, OutOfStockError, place_order
+from .dashboard import build_dashboard_context
+from .models import Cart, CartItem, ConsumerRecommendation, ConsumerReward, FarmerAdoption, Order, OrderItem
+from .recommendations import (
+    compute_neighbours, get_recommended_products, health_goals, rebuild_recommendations, update_for_order,
+)
+from .tasks import process_order
+from . import chat, services
+
+
+class CatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.other_farmer = User.objects.create_user(username='farmer2', password='pass12345', user_type='farmer')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        products = []
+        for i in range(25):
+            products.append(Product(
+                farmer=cls.farmer if i % 2 else cls.other_farmer,
+                name=f'Millet {i}',
+                description='Test product',
+                # Repeated prices exercise the id tie-breaker in the cursor
+                price=Decimal(10 + i % 5),
+                stock_quantity=10,
+                category='grain' if i % 3 else 'flour',
+                is_organic=i % 4 == 0,
+            ))
+        Product.objects.bulk_create(products)
+        Product.objects.create(farmer=cls.farmer, name='Hidden', description='x', price=5,
+                               category='grain', is_available=False)
+
+    def walk(self, filters, page_size=7):
+        seen = []
+        filters = dict(filters)
+        while True:
+            page = get_catalog_page(filters, page_size=page_size)
+            seen.extend(page.products)
+            if not page.has_next:
+                return seen
+            filters['cursor'] = page.next_cursor
+
+    def test_keyset_pages_cover_catalog_exactly_once(self):
+        for sort in ('newest', 'price_asc', 'price_desc'):
+            seen = self.walk({'sort': sort})
+            self.assertEqual(len(seen), 25)
+            self.assertEqual(len({p.pk for p in seen}), 25)
+        prices = [p.price for p in self.walk({'sort': 'price_asc'})]
+        self.assertEqual(prices, sorted(prices))
+
+    def test_filters(self):
+        seen = self.walk({'category': 'flour', 'organic': True, 'min_price': Decimal('11'),
+                          'farmer': self.other_farmer.pk})
+        expected = Product.objects.filter(is_available=True, category='flour', is_organic=True,
+                                          price__gte=11, farmer=self.other_farmer)
+        self.assertEqual({p.pk for p in seen}, set(expected.values_list('pk', flat=True)))
+
+    def test_search_results_are_paged(self):
+        get_search_backend().rebuild()
+        seen = self.walk({'q': 'millet'})
+        self.assertEqual(len({p.pk for p in seen}), 25)
+        first = get_catalog_page({'q': 'millet'}, page_size=7)
+        self.assertEqual(first.sort, 'relevance')
+        self.assertEqual(len(first.products), 7)
+        # An explicit sort is honoured, with keyset cursors
+        prices = [p.price for p in self.walk({'q': 'millet', 'sort': 'price_asc'})]
+        self.assertEqual(len(prices), 25)
+        self.assertEqual(prices, sorted(prices))
+
+    def test_cursor_from_other_sort_restarts(self):
+        first = get_catalog_page({'sort': 'newest'}, page_size=5)
+        page = get_catalog_page({'sort': 'price_asc', 'cursor': first.next_cursor}, page_size=5)
+        self.assertEqual(page.products, get_catalog_page({'sort': 'price_asc'}, page_size=5).products)
+        garbage = get_catalog_page({'cursor': 'not-a-cursor'}, page_size=5)
+        self.assertEqual(garbage.products, first.products)
+
+    def test_page_query_count_is_constant(self):
+        page = get_catalog_page({'sort': 'price_desc'}, page_size=5)
+        cursor = encode_cursor('price_desc', page.products[-1])
+        with self.assertNumQueries(1):
+            deep = get_catalog_page({'sort': 'price_desc', 'cursor': cursor}, page_size=5)
+            [p.farmer.username for p in deep]
+
+    def test_product_list_view(self):
+        self.client.force_login(self.consumer)
+        response = self.client.get(reverse('product_list'), {'sort': 'price_asc', 'max_price': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 24)
+        self.assertIn('cursor=', response.context['next_query'])
+
+
+class PageCachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        cls.product = Product.objects.create(farmer=cls.farmer, name='Ragi Flour', description='Stone ground',
+                                             price=90, stock_quantity=10, category='flour')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.consumer)
+        # Pages are tagged with the CSRF secret, which the first page sets
+        self.client.get(reverse('home'))
+        self.client.get(reverse('product_list'))
+
+    def test_unchanged_product_page_is_not_rendered_again(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        first = self.client.get(url)
+        self.assertContains(first, 'Ragi Flour')
+        self.assertIn('no-cache', first['Cache-Control'])
+        # The user, then one query for updated_at and the cart badge
+        with self.assertNumQueries(2):
+            unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertTemplateNotUsed(unchanged, 'consumer/product_detail.html')
+
+        services.add_to_cart(self.consumer, self.product)
+        badge = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(badge.status_code, 200)
+        self.product.name = 'Ragi Flour (1 kg)'
+        self.product.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=badge['ETag'])
+        self.assertContains(renamed, 'Ragi Flour (1 kg)')
+
+    def test_catalog_follows_product_changes(self):
+        url = reverse('product_list')
+        first = self.client.get(url)
+        self.assertContains(first, 'Ragi Flour')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(farmer=self.farmer, name='Bajra Cookies', description='x', price=60,
+                                   stock_quantity=5, category='snacks')
+            self.product.name = 'Ragi Flakes'
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertContains(response, 'Bajra Cookies')
+        self.assertContains(response, 'Ragi Flakes')
+
+    def test_checkout_refreshes_the_stock_shown(self):
+        url = reverse('product_list')
+        self.assertContains(self.client.get(url), '10 in stock')
+        services.add_to_cart(self.consumer, self.product, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.consumer, 'Address', '12345')
+        self.assertContains(self.client.get(url), '7 in stock')
+
+
+class CartServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        cls.cart = Cart.objects.create(consumer=cls.consumer)
+        cls.ragi = Product.objects.create(farmer=cls.farmer, name='Ragi', description='x', price=50, category='grain')
+        cls.jowar = Product.objects.create(farmer=cls.farmer, name='Jowar', description='x', price=40, category='grain')
+        cls.hidden = Product.objects.create(farmer=cls.farmer, name='Old', description='x', price=10,
+                                            category='grain', is_available=False)
+
+    def test_existing_item_is_one_update(self):
+        services.add_to_cart(self.consumer, self.ragi)
+        with self.assertNumQueries(4):
+            # SAVEPOINT, item increment, cart totals bump, RELEASE
+            services.add_to_cart(self.consumer, self.ragi, 3)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.ragi).quantity, 4)
+
+    def test_rejects_bad_quantity(self):
+        for quantity in (0, -1, services.MAX_QUANTITY_PER_ADD + 1):
+            with self.assertRaises(ValueError):
+                services.add_to_cart(self.consumer, self.ragi, quantity)
+
+    def test_add_many(self):
+        services.add_to_cart(self.consumer, self.ragi, 2)
+        rejected = services.add_many_to_cart(self.consumer, {self.ragi.pk: 3, self.jowar.pk: 1, self.hidden.pk: 1})
+        self.assertEqual(rejected, [self.hidden.pk])
+        quantities = dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.ragi.pk: 5, self.jowar.pk: 1})
+
+    def test_add_many_endpoint(self):
+        self.client.force_login(self.consumer)
+        response = self.client.post(
+            reverse('add_many_to_cart'),
+            json.dumps({'items': [{'product_id': self.jowar.pk, 'quantity': 2}, {'product_id': 999999}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'added': 1, 'rejected': [999999]})
+        response = self.client.post(reverse('add_many_to_cart'), '{"items": 1}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def assertTotals(self, item_count, subtotal):
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (item_count, Decimal(subtotal)))
+
+    def test_cached_totals_follow_mutations(self):
+        services.add_to_cart(self.consumer, self.ragi, 2)
+        self.assertTotals(2, '100')
+        services.add_many_to_cart(self.consumer, {self.ragi.pk: 1, self.jowar.pk: 2})
+        self.assertTotals(5, '230')
+        self.ragi.price = 60
+        self.ragi.save()
+        self.assertTotals(5, '260')
+        self.jowar.delete()
+        self.assertTotals(3, '180')
+
+    def test_cart_view_is_one_query_for_items(self):
+        services.add_many_to_cart(self.consumer, {self.ragi.pk: 2, self.jowar.pk: 3})
+        with self.assertNumQueries(1):
+            items = list(services.get_cart_items(self.consumer))
+            self.assertEqual([item.total_price for item in items], [Decimal('100'), Decimal('120')])
+            self.assertEqual(items[0].cart_total, Decimal('220'))
+        self.client.force_login(self.consumer)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], Decimal('220'))
+        self.assertContains(response, '₹220')
+
+
+class ConcurrentWritersTestCase(TransactionTestCase):
+    """Runs with the opt-in SQLite options, on the test database only."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Thread connections are opened from this same settings dict
+        cls._options = dict(connection.settings_dict['OPTIONS'])
+        connection.settings_dict['OPTIONS'].update(settings.SQLITE_CONCURRENT_OPTIONS)
+        connection.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        connection.settings_dict['OPTIONS'] = cls._options
+        connection.close()
+        super().tearDownClass()
+
+
+class CartConcurrencyTests(ConcurrentWritersTestCase):
+    def test_concurrent_adds_lose_no_increments(self):
+        farmer = User.objects.create_user(username='farmer1', password='x', user_type='farmer')
+        consumer = User.objects.create_user(username='consumer1', password='x', user_type='consumer')
+        products = [Product.objects.create(farmer=farmer, name=f'P{i}', description='x', price=10, category='grain')
+                    for i in range(3)]
+
+        def hammer(i):
+            try:
+                services.add_to_cart(consumer, products[i % 3])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(hammer, range(90)))
+
+        quantities = CartItem.objects.filter(cart__consumer=consumer).values_list('quantity', flat=True)
+        self.assertEqual(sorted(quantities), [30, 30, 30])
+        cart = Cart.objects.get(consumer=consumer)
+        self.assertEqual((cart.item_count, cart.subtotal), (90, Decimal('900')))
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        Cart.objects.create(consumer=cls.consumer)
+        cls.ragi = Product.objects.create(farmer=cls.farmer, name='Ragi', description='x', price=50,
+                                          stock_quantity=5, category='grain')
+        cls.jowar = Product.objects.create(farmer=cls.farmer, name='Jowar', description='x', price=40,
+                                           stock_quantity=1, category='grain')
+
+    def test_places_order_and_snapshots_prices(self):
+        services.add_many_to_cart(self.consumer, {self.ragi.pk: 2, self.jowar.pk: 1})
+        order = place_order(self.consumer, 'Village road', '99999', idempotency_key='abc')
+        self.assertEqual(order.total_amount, Decimal('140'))
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity', 'price')),
+                         [(self.ragi.pk, 2, Decimal('50')), (self.jowar.pk, 1, Decimal('40'))])
+        self.ragi.refresh_from_db()
+        self.assertEqual(self.ragi.stock_quantity, 3)
+        cart = Cart.objects.get(consumer=self.consumer)
+        self.assertEqual((cart.item_count, cart.items.count()), (0, 0))
+        # A retry with the same key does not create a second order
+        self.assertEqual(place_order(self.consumer, 'Village road', '99999', idempotency_key='abc'), order)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_out_of_stock_rolls_back_everything(self):
+        services.add_many_to_cart(self.consumer, {self.ragi.pk: 2, self.jowar.pk: 2})
+        with self.assertRaises(OutOfStockError) as raised:
+            place_order(self.consumer, 'Village road', '99999')
+        self.assertEqual(raised.exception.products, [self.jowar])
+        self.ragi.refresh_from_db()
+        self.assertEqual(self.ragi.stock_quantity, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart__consumer=self.consumer).count(), 2)
+
+    def test_units_added_during_checkout_stay_in_cart(self):
+        services.add_many_to_cart(self.consumer, {self.ragi.pk: 2, self.jowar.pk: 1})
+
+        def add_during_checkout(*args):
+            services.add_to_cart(self.consumer, self.ragi)
+
+        with mock.patch('consumer.checkout.record_order_sales', side_effect=add_during_checkout):
+            order = place_order(self.consumer, 'Village road', '99999')
+        self.assertEqual(order.items.get(product=self.ragi).quantity, 2)
+        self.assertEqual(list(CartItem.objects.filter(cart__consumer=self.consumer)
+                              .values_list('product_id', 'quantity')), [(self.ragi.pk, 1)])
+        cart = Cart.objects.get(consumer=self.consumer)
+        self.assertEqual((cart.item_count, cart.subtotal), (1, Decimal('50')))
+
+    def test_empty_cart(self):
+        with self.assertRaises(CheckoutError):
+            place_order(self.consumer, 'Village road', '99999')
+
+    def test_checkout_view(self):
+        services.add_to_cart(self.consumer, self.ragi)
+        self.client.force_login(self.consumer)
+        response = self.client.get(reverse('checkout'))
+        key = response.context['form'].initial['idempotency_key']
+        data = {'shipping_address': 'Village road', 'phone_number': '99999', 'idempotency_key': key}
+        self.assertRedirects(self.client.post(reverse('checkout'), data), reverse('consumer_dashboard'),
+                             fetch_redirect_response=False)
+        self.client.post(reverse('checkout'), data)
+        self.assertEqual(Order.objects.filter(consumer=self.consumer).count(), 1)
+
+
+class CheckoutLoadTests(ConcurrentWritersTestCase):
+    def test_concurrent_checkouts_never_oversell(self):
+        farmer = User.objects.create_user(username='farmer1', password='x', user_type='farmer')
+        millet = Product.objects.create(farmer=farmer, name='Kodo', description='x', price=25,
+                                        stock_quantity=300, category='grain')
+        User.objects.bulk_create([User(username=f'c{i}', user_type='consumer') for i in range(1000)])
+        consumers = list(User.objects.filter(user_type='consumer'))
+        carts = Cart.objects.bulk_create([Cart(consumer=consumer) for consumer in consumers])
+        # Each consumer wants 1 or 2 units: total demand far exceeds stock
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=millet, quantity=1 + i % 2)
+                                      for i, cart in enumerate(carts)])
+
+        def attempt(consumer):
+            try:
+                place_order(consumer, 'Address', '12345', idempotency_key=f'key-{consumer.pk}')
+                return True
+            except OutOfStockError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(attempt, consumers))
+
+        millet.refresh_from_db()
+        sold = sum(OrderItem.objects.values_list('quantity', flat=True))
+        self.assertEqual(sold + millet.stock_quantity, 300)
+        self.assertEqual(Order.objects.count(), results.count(True))
+        self.assertEqual(OrderItem.objects.count(), Order.objects.count())
+        self.assertLessEqual(millet.stock_quantity, 1)
+        total = sum(Order.objects.values_list('total_amount', flat=True))
+        self.assertEqual(total, sold * Decimal('25'))
+
+
+class ConsumerDashboardTests(TestCase):
+    # Session and user lookup, the four context queries and the navbar cart badge
+    MAX_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmers = [User.objects.create_user(username=f'farmer{i}', password='pass12345', user_type='farmer')
+                       for i in range(3)]
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        Cart.objects.create(consumer=cls.consumer)
+        cls.products = [Product.objects.create(farmer=farmer, name=f'Millet {i}', description='x', price=30,
+                                               stock_quantity=50, category='grain')
+                        for i, farmer in enumerate(cls.farmers)]
+        for farmer in cls.farmers:
+            FarmerAdoption.objects.create(consumer=cls.consumer, farmer=farmer)
+        ConsumerReward.objects.create(consumer=cls.consumer, points=10, description='Signup')
+        ConsumerReward.objects.create(consumer=cls.consumer, points=15, description='First order')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.consumer)
+
+    def test_context_values(self):
+        for product in self.products:
+            services.add_to_cart(self.consumer, product)
+            place_order(self.consumer, 'Address', '12345')
+        services.add_to_cart(self.consumer, self.products[0], 2)
+        with self.assertNumQueries(4):
+            context = build_dashboard_context(self.consumer)
+        self.assertEqual(
+            (context['cart_items_count'], context['orders_count'], context['adopted_farmers_count'],
+             context['reward_points']),
+            (2, 3, 3, 25),
+        )
+        self.assertEqual([order.items_count for order in context['recent_orders']], [1, 1, 1])
+
+    def test_query_count_is_bounded_and_cached(self):
+        for product in self.products:
+            services.add_to_cart(self.consumer, product)
+            place_order(self.consumer, 'Address', '12345')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('consumer_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.MAX_QUERIES)
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(reverse('consumer_dashboard'))
+        self.assertLess(len(cached), len(queries))
+
+    def test_changes_invalidate_cache(self):
+        self.assertEqual(self.client.get(reverse('consumer_dashboard')).context['cart_items_count'], 0)
+        services.add_to_cart(self.consumer, self.products[0], 3)
+        self.assertEqual(self.client.get(reverse('consumer_dashboard')).context['cart_items_count'], 3)
+        ConsumerReward.objects.create(consumer=self.consumer, points=5, description='Review')
+        self.assertEqual(self.client.get(reverse('consumer_dashboard')).context['reward_points'], 30)
+        FarmerAdoption.objects.filter(consumer=self.consumer).first().delete()
+        self.assertEqual(self.client.get(reverse('consumer_dashboard')).context['adopted_farmers_count'], 2)
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        product = lambda name, description='', category='grain': Product.objects.create(
+            farmer=cls.farmer, name=name, description=description, price=20, stock_quantity=1000, category=category)
+        cls.ragi = product('Ragi Flour', 'Rich in calcium', 'flour')
+        cls.laddu = product('Ragi Laddu', 'Sweet snack', 'snack')
+        cls.jowar = product('Jowar Grain')
+        cls.kodo = product('Kodo Millet', 'High fibre, good for diabetes')
+        cls.buyers = [User.objects.create_user(username=f'buyer{i}', password='x', user_type='consumer') for i in range(4)]
+        cls.dieter = User.objects.create_user(username='dieter', password='x', user_type='consumer',
+                                                health_preferences='Weight loss')
+        cls.newcomer = User.objects.create_user(username='newcomer', password='x', user_type='consumer')
+        # Ragi flour and ragi laddu are always bought together
+        for buyer in cls.buyers:
+            cls.buy(buyer, {cls.ragi.pk: 1, cls.laddu.pk: 1})
+        cls.buy(cls.buyers[0], {cls.jowar.pk: 3})
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def buy(user, quantities):
+        services.add_many_to_cart(user, quantities)
+        return place_order(user, 'Address', '12345')
+
+    def test_health_goals_come_from_the_known_vocabulary(self):
+        goals = health_goals('I want weight loss and more calcium, please')
+        self.assertEqual(len(goals), 2)
+        self.assertIn('barnyard', goals[0])
+        self.assertIn('finger', goals[1])
+        self.assertEqual(health_goals('Organic food please'), [])
+
+    def test_neighbours_come_from_co_purchases(self):
+        neighbours = compute_neighbours()
+        self.assertEqual(neighbours[self.ragi.pk][0][0], self.laddu.pk)
+        self.assertAlmostEqual(neighbours[self.ragi.pk][0][1], 1.0)
+        self.assertNotIn(self.kodo.pk, dict(neighbours[self.ragi.pk]))
+
+    def test_rebuild_and_serve(self):
+        rebuild_recommendations()
+        shopper = User.objects.create_user(username='shopper', password='x', user_type='consumer')
+        self.buy(shopper, {self.ragi.pk: 1})
+        rebuild_recommendations()
+        self.assertEqual(get_recommended_products(shopper, 1), [self.laddu])
+        # Health preferences pull in products described for that need
+        self.assertEqual(get_recommended_products(self.dieter, 1), [self.kodo])
+        # Consumers unknown to the last build get the popularity fallback
+        late = User.objects.create_user(username='late', password='x', user_type='consumer')
+        self.assertEqual(len(get_recommended_products(late, 4)), 4)
+        with self.assertNumQueries(1):
+            get_recommended_products(shopper, 4)
+
+    def test_incremental_update_after_order(self):
+        rebuild_recommendations()
+        order = self.buy(self.newcomer, {self.kodo.pk: 1, self.jowar.pk: 1})
+        # Checkout queues this after its transaction commits
+        with self.settings(TASK_BACKEND='eager'), self.captureOnCommitCallbacks(execute=True):
+            process_order.delay(order.pk)
+        self.assertIn(self.kodo.pk, dict(compute_neighbours([self.jowar.pk])[self.jowar.pk]))
+        self.assertEqual(
+            list(ConsumerRecommendation.objects.filter(consumer=self.newcomer).order_by('rank').values_list('rank', flat=True)),
+            list(range(1, 5)),
+        )
+
+    def test_incremental_update_does_not_scan_history_or_catalog(self):
+        rebuild_recommendations()
+        order = self.buy(self.newcomer, {self.kodo.pk: 1})
+        with mock.patch('consumer.recommendations._popularity') as popularity, \
+                CaptureQueriesContext(connection) as queries:
+            update_for_order(order)
+        popularity.assert_not_called()
+        category_lookups = [q['sql'] for q in queries if '"farmer_product"."category"' in q['sql']]
+        self.assertTrue(category_lookups)
+        self.assertTrue(all(' IN (' in sql for sql in category_lookups))
+        self.assertTrue(ConsumerRecommendation.objects.filter(consumer=self.newcomer).exists())
+
+
+class AdoptionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = lambda name, location: User.objects.create_user(
+            username=name, password='pass12345', user_type='farmer', farm_location=location)
+        cls.mandya = farmer('mandya', 'Mandya, Karnataka')
+        cls.tumkur = farmer('tumkur', 'Tumkur, Karnataka')
+        cls.jaipur = farmer('jaipur', 'Jaipur, Rajasthan')
+        cls.consumer = User.objects.create_user(username='supporter', password='pass12345', user_type='consumer')
+        cls.other = User.objects.create_user(username='neighbour', password='pass12345', user_type='consumer')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_adopt_and_unadopt(self):
+        self.assertTrue(adopt(self.consumer, self.mandya))
+        self.assertFalse(adopt(self.consumer, self.mandya))
+        self.assertTrue(adopt(self.consumer, self.jaipur))
+        self.assertTrue(adopt(self.other, self.mandya))
+        self.assertEqual(adopted_farmer_ids(self.consumer), [self.jaipur.pk, self.mandya.pk])
+        self.assertEqual({a.consumer for a in get_adopters(self.mandya)}, {self.consumer, self.other})
+        self.assertEqual(adoption_counts(self.mandya), {'adopted': 0, 'adopters': 2})
+
+        self.assertTrue(unadopt(self.consumer, self.jaipur))
+        self.assertFalse(unadopt(self.consumer, self.jaipur))
+        self.assertEqual(adopted_farmer_ids(self.consumer), [self.mandya.pk])
+        # Adopting again reuses the row
+        self.assertTrue(adopt(self.consumer, self.jaipur))
+        self.assertEqual(FarmerAdoption.objects.filter(consumer=self.consumer, farmer=self.jaipur).count(), 1)
+        self.assertEqual(adoption_counts(self.consumer)['adopted'], 2)
+        with self.assertRaises(AdoptionError):
+            adopt(self.mandya, self.tumkur)
+
+    def test_lists_are_served_from_cache(self):
+        adopt(self.consumer, self.mandya)
+        adopt(self.consumer, self.tumkur)
+        adopted_farmer_ids(self.consumer)
+        with self.assertNumQueries(0):
+            self.assertEqual(adoption_counts(self.consumer)['adopted'], 2)
+        # Only the k farmers themselves are loaded
+        with self.assertNumQueries(1):
+            adoptions = get_adopted_farmers(self.consumer, limit=1)
+        self.assertEqual([a.farmer for a in adoptions], [self.tumkur])
+
+    def test_suggestions_rank_region_and_purchases(self):
+        order = Order.objects.create(consumer=self.consumer, total_amount=100, phone_number='12345',
+                                     shipping_address='12 Temple Road\nMandya, Karnataka')
+        product = Product.objects.create(farmer=self.jaipur, name='Bajra', description='Pearl millet', price=50,
+                                         stock_quantity=10, category='grain')
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=50)
+
+        self.assertEqual(build_suggestions(), 2)
+        self.assertEqual(get_suggestions(self.consumer), [self.jaipur, self.mandya, self.tumkur])
+        adopt(self.consumer, self.jaipur)
+        self.assertEqual(get_suggestions(self.consumer), [self.mandya, self.tumkur])
+        self.assertEqual(get_suggestions(self.other), [])
+
+    def test_adoption_views(self):
+        self.client.force_login(self.consumer)
+        response = self.client.post(reverse('toggle_adoption', args=[self.tumkur.pk]), {'action': 'adopt'})
+        self.assertRedirects(response, reverse('farmer_adoption'))
+        response = self.client.get(reverse('farmer_adoption'))
+        self.assertEqual([a.farmer for a in response.context['adoptions']], [self.tumkur])
+        self.client.post(reverse('toggle_adoption', args=[self.tumkur.pk]), {'action': 'unadopt'})
+        self.assertEqual(adopted_farmer_ids(self.consumer), [])
+        self.assertEqual(self.client.post(reverse('toggle_adoption', args=[self.consumer.pk])).status_code, 404)
+
+
+@override_settings(CHATBOT_FLUSH_INTERVAL=None)
+class ChatbotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        GovernmentScheme.objects.create(title='PM-KISAN', description='Income support of Rs 6000 a year.',
+                                        eligibility='All landholding farmer families.')
+        Product.objects.create(farmer=farmer, name='Ragi Flour', description='Stone ground finger millet',
+                               price=80, category='flour')
+
+    def setUp(self):
+        chat.windows.clear()
+        chat._engine = None
+
+    def tearDown(self):
+        chat.writer.flush()
+
+    def test_local_engine_retrieves_answers(self):
+        engine = chat.LocalAnswerEngine()
+        engine.load()
+        self.assertIn('Income support', engine.answer('Tell me about the PM-KISAN scheme', []))
+        self.assertIn('₹80', engine.answer('price of nachni flour', []))
+        # A short follow-up borrows the previous question from the window
+        self.assertIn('Eligibility', engine.answer('eligibility?', [(True, 'pm-kisan scheme'), (False, '...')]))
+
+    def test_products_come_from_the_search_index(self):
+        engine = chat.LocalAnswerEngine()
+        engine.load()
+        self.assertFalse([answer for answer in engine.answers if 'is available from' in answer])
+        # Listed after the load: found without reloading the engine
+        Product.objects.create(farmer=User.objects.get(username='farmer1'), name='Kodo Rice',
+                               description='Polished kodo millet', price=60, category='grain')
+        self.assertIn('₹60', engine.answer('kodo rice price', []))
+
+    def test_failed_write_keeps_messages_pending(self):
+        chat.writer.add(self.consumer.pk, 'question', 'answer')
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                chat.writer.flush()
+        self.assertEqual(len(chat.writer.pending(self.consumer.pk)), 2)
+        self.assertEqual(chat.writer.flush(), 2)
+        self.assertEqual(chat.writer.pending(self.consumer.pk), [])
+
+    async def test_stream_endpoint(self):
+        await self.async_client.aforce_login(self.consumer)
+        response = await self.async_client.post(reverse('chatbot_stream'), {'message': 'ragi flour price'})
+        self.assertEqual(response.status_code, 200)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 1)
+        self.assertIn('Ragi Flour is available', b''.join(chunks).decode())
+
+        # Nothing is written until the writer flushes, then both messages at once
+        self.assertEqual(await ChatMessage.objects.acount(), 0)
+        self.assertEqual(await sync_to_async(chat.writer.flush)(), 2)
+        self.assertEqual(await ChatMessage.objects.filter(user=self.consumer).acount(), 2)
+
+    async def test_concurrent_sessions(self):
+        users = await sync_to_async(User.objects.bulk_create)([
+            User(username=f'chat{i}', user_type='consumer') for i in range(300)
+        ])
+
+        async def session(user):
+            for question in ('pm-kisan scheme', 'who is eligible?'):
+                answer = ''.join([token async for token in chat.reply(user.pk, question)])
+            return answer
+
+        answers = await asyncio.gather(*[session(user) for user in users])
+        self.assertTrue(all('Eligibility' in answer for answer in answers))
+        # Both turns are in the in-memory window before anything is written
+        self.assertEqual(len(chat.windows.get(users[0].pk)), 4)
+        await sync_to_async(self.assert_flushed_in_batches)(1200)
+
+    def assert_flushed_in_batches(self, count):
+        with self.assertNumQueries(count // chat.FLUSH_BATCH):
+            chat.writer.flush()
+        self.assertEqual(ChatMessage.objects.count(), count)
+
+    def test_window_is_bounded_and_loaded_once(self):
+        ChatMessage.objects.bulk_create([
+            ChatMessage(user=self.consumer, message=f'message {i}') for i in range(chat.WINDOW_SIZE + 5)
+        ])
+        with self.assertNumQueries(1):
+            window = chat.windows.get(self.consumer.pk)
+            chat.windows.get(self.consumer.pk)
+        self.assertEqual(len(window), chat.WINDOW_SIZE)
+        self.assertEqual(window[-1], (True, f'message {chat.WINDOW_SIZE + 4}'))
@@ -4,11 +4,15 @@ from . import views
 urlpatterns = [
     path('dashboard/', views.dashboard, name='consumer_dashboard'),
     path('products/', views.product_list, name='product_list'),
+    path('products/suggest/', views.product_suggest, name='product_suggest'),
     path('products/<int:product_id>/', views.product_detail, name='product_detail'),
     path('cart/', views.cart, name='cart'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
+    path('cart/add-many/', views.add_many_to_cart, name='add_many_to_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('farmer-adoption/', views.farmer_adoption, name='farmer_adoption'),
+    path('farmer-adoption/<int:farmer_id>/', views.toggle_adoption, name='toggle_adoption'),
     path('health-advisor/', views.health_advisor, name='health_advisor'),
     path('chatbot/', views.chatbot, name='chatbot'),
+    path('chatbot/stream/', views.chatbot_stream, name='chatbot_stream'),
 ]
\ No newline at end of file
@@ -1,127 +1,223 @@
+import json
+import uuid
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from .models import Cart, CartItem, Order, OrderItem, FarmerAdoption, ConsumerReward
+from .forms import CatalogFilterForm, CheckoutForm
+from .catalog import get_cached_catalog_page
+from . import adoptions, chat, services, tasks
+from .checkout import CheckoutError, place_order
+from .dashboard import get_dashboard_context
+from farmer.search import get_search_backend
 from farmer.models import Product
+from accounts.decorators import consumer_required
 from accounts.models import User
-from django.db.models import Sum, Count
+from core.caching import catalog_version, page_etag
+from django.db.models import Sum, Count, Subquery
 
-@login_required
+@consumer_required
 def dashboard(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    # Get consumer's cart
-    cart, created = Cart.objects.get_or_create(consumer=request.user)
-    cart_items_count = CartItem.objects.filter(cart=cart).count()
-    
-    # Placeholder data for demonstration
-    context = {
-        'cart_items_count': cart_items_count,
-        'orders_count': 0,  # Will be implemented when orders are created
-        'adopted_farmers_count': 0,  # Will be implemented when farmer adoptions are created
-        'reward_points': 0,  # Will be implemented when rewards are created
-        'recommended_products': Product.objects.all()[:4],  # Simple recommendation for now
-        'recent_orders': [],  # Will be implemented when orders are created
-        'adopted_farmers': [],  # Will be implemented when farmer adoptions are created
-    }
+    # Counters, recent orders, adoptions and recommendations in a few queries,
+    # cached per user until something they show changes
+    context = get_dashboard_context(request.user)
     
     return render(request, 'consumer/dashboard.html', context)
 
-@login_required
+def _cart_badge(user):
+    # The navbar shows the cart's item count, so pages vary with it
+    return Cart.objects.filter(consumer=user).values('item_count')
+
+def _catalog_etag(request):
+    cart_items = _cart_badge(request.user).values_list('item_count', flat=True).first()
+    return page_etag(request, 'catalog', catalog_version(), request.GET.urlencode(), cart_items)
+
+def _product_etag(request, product_id):
+    row = (
+        Product.objects.filter(pk=product_id)
+        .annotate(cart_items=Subquery(_cart_badge(request.user)[:1]))
+        .values_list('updated_at', 'cart_items').first()
+    )
+    # Unknown products get no tag and fall through to the 404
+    return page_etag(request, 'product', product_id, *row) if row else None
+
+@consumer_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_catalog_etag)
 def product_list(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    products = Product.objects.filter(is_available=True)
-    return render(request, 'consumer/product_list.html', {'products': products})
+    form = CatalogFilterForm(request.GET)
+    form.is_valid()
+    # Invalid fields are simply dropped from the filters rather than failing the page
+    page = get_cached_catalog_page(form.cleaned_data)
+    
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_query = params.urlencode()
+    next_query = None
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    
+    return render(request, 'consumer/product_list.html', {
+        'form': form,
+        'products': page.products,
+        'page': page,
+        'first_query': first_query,
+        'next_query': next_query,
+        'is_first_page': not form.cleaned_data.get('cursor'),
+    })
+
+@consumer_required
+def product_suggest(request):
+    # Typeahead endpoint: small JSON payload straight from the search index
+    query = request.GET.get('q', '')[:100]
+    suggestions = get_search_backend().suggest(query, limit=8) if query.strip() else []
+    return JsonResponse({
+        'query': query,
+        'results': [{'id': pk, 'name': name} for pk, name in suggestions],
+    })
 
-@login_required
+@consumer_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_product_etag)
 def product_detail(request, product_id):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.select_related('farmer'), id=product_id)
     return render(request, 'consumer/product_detail.html', {'product': product})
 
-@login_required
+@consumer_required
 def cart(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    cart, created = Cart.objects.get_or_create(consumer=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
-    
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    # One query: items, their products, line totals and the cart total
+    cart_items = list(services.get_cart_items(request.user))
+    total = cart_items[0].cart_total if cart_items else 0
     
     return render(request, 'consumer/cart.html', {
         'cart_items': cart_items,
         'total': total
     })
 
-@login_required
+@consumer_required
 def add_to_cart(request, product_id):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    product = get_object_or_404(Product, id=product_id)
-    cart, created = Cart.objects.get_or_create(consumer=request.user)
-    
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    product = get_object_or_404(Product.objects.only('id', 'name', 'price'), id=product_id, is_available=True)
+    services.add_to_cart(request.user, product)
     
     messages.success(request, f"{product.name} added to your cart.")
     return redirect('product_list')
 
-@login_required
+@consumer_required
+@require_POST
+def add_many_to_cart(request):
+    # Accepts either a JSON body {"items": [{"product_id": 1, "quantity": 2}, ...]}
+    # or form fields product=<id> with optional quantity_<id>=<n>
+    is_json = request.content_type == 'application/json'
+    try:
+        if is_json:
+            items = json.loads(request.body)['items']
+            quantities = {int(item['product_id']): int(item.get('quantity', 1)) for item in items}
+        else:
+            quantities = {
+                int(product_id): int(request.POST.get(f'quantity_{product_id}', 1))
+                for product_id in request.POST.getlist('product')
+            }
+        rejected = services.add_many_to_cart(request.user, quantities)
+    except (ValueError, KeyError, TypeError) as e:
+        if is_json:
+            return JsonResponse({'error': str(e) or 'Invalid cart items.'}, status=400)
+        messages.error(request, "Could not add those items to your cart.")
+        return redirect('cart')
+    
+    added = len(quantities) - len(rejected)
+    if is_json:
+        return JsonResponse({'added': added, 'rejected': rejected})
+    if added:
+        messages.success(request, f"{added} products added to your cart.")
+    if rejected:
+        messages.error(request, f"{len(rejected)} products are no longer available.")
+    return redirect('cart')
+
+@consumer_required
 def checkout(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    return render(request, 'consumer/checkout.html')
+    if request.method == 'POST':
+        form = CheckoutForm(request.POST)
+        if form.is_valid():
+            try:
+                order = place_order(
+                    request.user,
+                    form.cleaned_data['shipping_address'],
+                    form.cleaned_data['phone_number'],
+                    idempotency_key=form.cleaned_data['idempotency_key'],
+                )
+            except CheckoutError as e:
+                messages.error(request, str(e))
+                return redirect('cart')
+            tasks.process_order.delay(order.pk)
+            messages.success(request, f"Order #{order.id} placed successfully!")
+            return redirect('consumer_dashboard')
+    else:
+        form = CheckoutForm(initial={
+            'phone_number': request.user.phone_number,
+            'idempotency_key': uuid.uuid4().hex,
+        })
+    
+    cart_items = list(services.get_cart_items(request.user))
+    if not cart_items:
+        messages.error(request, "Your cart is empty.")
+        return redirect('cart')
+    
+    return render(request, 'consumer/checkout.html', {
+        'form': form,
+        'cart_items': cart_items,
+        'total': cart_items[0].cart_total,
+    })
 
-@login_required
+@consumer_required
 def health_advisor(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
     return render(request, 'consumer/health_advisor.html')
 
-@login_required
+@consumer_required
 def farmer_adoption(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    return render(request, 'consumer/farmer_adoption.html')
+    suggestions = adoptions.get_suggestions(request.user)
+    if not suggestions and not request.user.farmer_suggestions.exists():
+        # Never built for this consumer yet; the nightly job covers the rest
+        tasks.build_adoption_suggestions.delay([request.user.pk])
+    return render(request, 'consumer/farmer_adoption.html', {
+        'adoptions': adoptions.get_adopted_farmers(request.user),
+        'suggestions': suggestions,
+    })
 
-@login_required
+@consumer_required
+@require_POST
+def toggle_adoption(request, farmer_id):
+    farmer = get_object_or_404(User, pk=farmer_id, user_type='farmer')
+    name = farmer.get_full_name() or farmer.username
+    if request.POST.get('action') == 'unadopt':
+        if adoptions.unadopt(request.user, farmer):
+            messages.success(request, f"You are no longer supporting {name}.")
+    elif adoptions.adopt(request.user, farmer):
+        messages.success(request, f"You have adopted {name}. Thank you for supporting local farming!")
+    else:
+        messages.info(request, f"You have already adopted {name}.")
+    return redirect('farmer_adoption')
+
+@consumer_required
 def chatbot(request):
-    # Ensure user is a consumer
-    if not request.user.is_consumer:
-        messages.error(request, "Access denied. You are not registered as a consumer.")
-        return redirect('home')
-    
-    return render(request, 'consumer/chatbot.html')
+    # Also warms the user's conversation window for the streaming endpoint
+    history = chat.windows.get(request.user.pk)
+    return render(request, 'consumer/chatbot.html', {'history': list(history)})
+
+@consumer_required
+@require_POST
+async def chatbot_stream(request):
+    user = await request.auser()
+    
+    message = request.POST.get('message', '').strip()[:chat.MAX_MESSAGE_LENGTH]
+    if not message:
+        return HttpResponseBadRequest("Message is required.")
+    
+    # The reply is sent token by token as the engine produces it
+    response = StreamingHttpResponse(chat.reply(user.pk, message), content_type='text/plain; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
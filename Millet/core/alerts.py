@@ -0,0 +1,116 @@
+"""
+Weather alert ingestion and fan-out.
+
+Regions are normalized ("Mandya , KARNATAKA" -> "mandya, karnataka", see
+core.regions) and each farmer's farm_location is expanded once into the
+region keys it belongs to (``mandya``, ``karnataka`` and ``mandya,
+karnataka``) in ``FarmerRegion``. A new alert is delivered by reading the
+farmers under its key from that map and bulk inserting their ``FarmerAlert``
+inbox rows, and dashboards read only their own unexpired inbox rows.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from .models import FarmerAlert, FarmerRegion, WeatherAlert
+from .regions import normalize_region, region_keys
+
+DEFAULT_ALERT_TTL = datetime.timedelta(hours=48)
+DASHBOARD_ALERTS = 5
+FARMER_CHUNK = 5000
+
+
+def prepare_alert(alert):
+    alert.region_key = normalize_region(alert.region)
+    if alert.expires_at is None:
+        alert.expires_at = alert.created_at + DEFAULT_ALERT_TTL
+
+
+def fan_out(alert):
+    """Deliver ``alert`` to every farmer in its region. Returns the number of deliveries."""
+    farmer_ids = (
+        FarmerRegion.objects.filter(region_key=alert.region_key)
+        .exclude(farmer_id__in=FarmerAlert.objects.filter(alert=alert).values('farmer_id'))
+        .values_list('farmer_id', flat=True)
+    )
+    deliveries = [
+        FarmerAlert(farmer_id=farmer_id, alert=alert, created_at=alert.created_at, expires_at=alert.expires_at)
+        for farmer_id in farmer_ids
+    ]
+    # A concurrent delivery of the same alert may still win the race
+    FarmerAlert.objects.bulk_create(deliveries, batch_size=FARMER_CHUNK, ignore_conflicts=True)
+    return len(deliveries)
+
+
+def ingest_alerts(records):
+    """
+    Store and deliver a batch of alerts.
+
+    ``records`` yields dicts with ``region``, ``alert_type``, ``description``
+    and optionally ``severity`` and ``expires_at``. Returns the created
+    alerts and the total number of inbox deliveries.
+    """
+    alerts = []
+    for record in records:
+        alert = WeatherAlert(
+            region=record['region'],
+            alert_type=record['alert_type'],
+            description=record['description'],
+            severity=record.get('severity') or 'low',
+            expires_at=record.get('expires_at'),
+        )
+        prepare_alert(alert)
+        alerts.append(alert)
+    with transaction.atomic():
+        # bulk_create skips the post_save fan-out; each alert is delivered here
+        WeatherAlert.objects.bulk_create(alerts)
+        delivered = sum(fan_out(alert) for alert in alerts)
+    return alerts, delivered
+
+
+def refresh_farmer_regions(farmer_ids):
+    """
+    Recompute the region keys of the given farmers and deliver them any
+    active alerts for their new regions.
+    """
+    farmers = list(User.objects.filter(pk__in=farmer_ids, user_type='farmer').values_list('pk', 'farm_location'))
+    rows = [FarmerRegion(region_key=key, farmer_id=pk) for pk, location in farmers for key in region_keys(location)]
+    with transaction.atomic():
+        FarmerRegion.objects.filter(farmer__in=farmer_ids).delete()
+        FarmerRegion.objects.bulk_create(rows, batch_size=FARMER_CHUNK)
+        farmers_by_key = defaultdict(list)
+        for row in rows:
+            farmers_by_key[row.region_key].append(row.farmer_id)
+        active = WeatherAlert.objects.filter(region_key__in=farmers_by_key, expires_at__gt=timezone.now())
+        deliveries = [
+            FarmerAlert(farmer_id=farmer_id, alert=alert, created_at=alert.created_at, expires_at=alert.expires_at)
+            for alert in active
+            for farmer_id in farmers_by_key[alert.region_key]
+        ]
+        FarmerAlert.objects.bulk_create(deliveries, ignore_conflicts=True)
+
+
+def rebuild_farmer_regions():
+    """Rebuild the region map for every farmer, in chunks."""
+    farmer_ids = list(User.objects.filter(user_type='farmer').order_by('pk').values_list('pk', flat=True))
+    FarmerRegion.objects.exclude(farmer__in=User.objects.filter(user_type='farmer')).delete()
+    for offset in range(0, len(farmer_ids), FARMER_CHUNK):
+        refresh_farmer_regions(farmer_ids[offset:offset + FARMER_CHUNK])
+    return len(farmer_ids)
+
+
+def get_active_alerts(farmer, limit=DASHBOARD_ALERTS):
+    """The farmer's unexpired alerts, newest first, from their inbox index."""
+    return list(
+        WeatherAlert.objects.filter(deliveries__farmer=farmer, deliveries__expires_at__gt=timezone.now())
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def purge_expired_alerts():
+    """Delete expired inbox rows. Returns how many were removed."""
+    deleted, _ = FarmerAlert.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
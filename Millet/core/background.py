@@ -0,0 +1,191 @@
+"""
+Background tasks.
+
+Slow work is declared with ``@task`` in each app's ``tasks.py`` and queued
+with ``.delay()``. A job is handed over only once the current transaction
+commits, so a worker never looks for rows it cannot see yet and a request
+that rolls back queues nothing. Arguments must be JSON-serialisable (ids,
+not model instances) so the same call works with every backend.
+
+``settings.TASK_BACKEND`` picks where jobs run:
+
+* ``'celery'`` - sent through the Celery app in shreeanna_connect.celery,
+  configured by the ``CELERY_*`` settings. Start one worker per queue, e.g.
+  ``celery -A shreeanna_connect worker -Q images -c 2``.
+* ``'local'`` - a thread pool per queue inside the web process, for running
+  without Redis. Queued jobs are lost if the process exits first.
+* ``'eager'`` - inline, at commit (tests and one-off scripts).
+
+Each task has a queue, a number of retries with exponential backoff and an
+optional rate limit (``'10/s'``, ``'30/m'``); ``settings.TASK_OPTIONS``
+overrides them per task name and ``settings.TASK_QUEUES`` sets how many
+jobs of each queue the local backend runs at once.
+"""
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+DEFAULT_OPTIONS = {'queue': 'default', 'max_retries': 0, 'retry_backoff': 5, 'rate_limit': None}
+DEFAULT_CONCURRENCY = 2
+MAX_BACKOFF = 600
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+logger = logging.getLogger(__name__)
+
+
+def rate_interval(rate_limit):
+    """Seconds between job starts for a Celery-style rate ("10/s", "30/m", or per second)."""
+    if not rate_limit:
+        return 0
+    count, _, unit = str(rate_limit).partition('/')
+    count = float(count)
+    return RATE_UNITS[unit or 's'] / count if count > 0 else 0
+
+
+class Task:
+    """A function that can also be queued with ``delay``. Calling it runs it directly."""
+
+    def __init__(self, function, name, options):
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.name = name
+        self._options = options
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    @property
+    def options(self):
+        options = dict(DEFAULT_OPTIONS, **self._options)
+        options.update(getattr(settings, 'TASK_OPTIONS', {}).get(self.name, {}))
+        return options
+
+    def delay(self, *args, **kwargs):
+        """Queue a run once the current transaction commits (at once outside one)."""
+        transaction.on_commit(lambda: self.apply_async(args, kwargs))
+
+    def apply_async(self, args=(), kwargs=None):
+        return get_backend().submit(self, tuple(args), kwargs or {})
+
+
+def task(name=None, **options):
+    """
+    Declare a background task::
+
+        @task(queue='images', max_retries=3)
+        def generate_image_variants(source): ...
+    """
+    def decorator(function):
+        registered = Task(function, name or f'{function.__module__}.{function.__name__}', options)
+        backend = get_backend()
+        if hasattr(backend, 'register'):
+            # Celery workers find tasks by name when they import tasks.py
+            backend.register(registered)
+        return registered
+    return decorator
+
+
+class EagerBackend:
+    def submit(self, task, args, kwargs):
+        return task(*args, **kwargs)
+
+
+class LocalBackend:
+    """Thread pools per queue in this process, with retries and rate limits."""
+
+    def __init__(self):
+        self._executors = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, queue):
+        with self._lock:
+            executor = self._executors.get(queue)
+            if executor is None:
+                workers = getattr(settings, 'TASK_QUEUES', {}).get(queue, DEFAULT_CONCURRENCY)
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'task-{queue}')
+                self._executors[queue] = executor
+            return executor
+
+    def submit(self, task, args, kwargs, attempt=0):
+        return self._executor(task.options['queue']).submit(self._run, task, args, kwargs, attempt)
+
+    def _throttle(self, task, interval):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(task.name, now))
+            self._next_start[task.name] = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+    def _run(self, task, args, kwargs, attempt):
+        options = task.options
+        interval = rate_interval(options['rate_limit'])
+        if interval:
+            self._throttle(task, interval)
+        try:
+            return task(*args, **kwargs)
+        except Exception:
+            if attempt >= options['max_retries']:
+                logger.exception('Task %s failed', task.name)
+                return None
+            delay = min(MAX_BACKOFF, options['retry_backoff'] * 2 ** attempt)
+            logger.warning('Task %s failed, retrying in %ss', task.name, delay, exc_info=True)
+            # Wait on a timer rather than in the pool, so the worker stays free
+            timer = threading.Timer(delay, self.submit, (task, args, kwargs, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return None
+        finally:
+            close_old_connections()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+class CeleryBackend:
+    def __init__(self):
+        from shreeanna_connect.celery import app
+
+        self.app = app
+        self._tasks = {}
+
+    def register(self, task):
+        options = task.options
+        self._tasks[task.name] = self.app.task(
+            task.function,
+            name=task.name,
+            queue=options['queue'],
+            rate_limit=options['rate_limit'],
+            autoretry_for=(Exception,) if options['max_retries'] else (),
+            max_retries=options['max_retries'],
+            retry_backoff=options['retry_backoff'],
+            retry_backoff_max=MAX_BACKOFF,
+        )
+
+    def submit(self, task, args, kwargs):
+        if task.name not in self._tasks:
+            self.register(task)
+        return self._tasks[task.name].apply_async(args, kwargs, queue=task.options['queue'])
+
+
+BACKENDS = {'eager': EagerBackend, 'local': LocalBackend, 'celery': CeleryBackend}
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    # Keyed by name so tests can switch TASK_BACKEND with override_settings
+    name = getattr(settings, 'TASK_BACKEND', 'local')
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
@@ -0,0 +1,357 @@
+"""
+Benchmarks of the hot views.
+
+``generate_data`` fills the database with a seeded synthetic marketplace
+(farmers, products, consumers with carts, orders, adoptions, reward entries
+and chat history) through ``bulk_create``, then rebuilds the derived tables
+(cart totals, farmer stats, reward balances, search index, recommendations)
+the way the management commands do. The same seed and sizes give the same
+rows.
+
+``run_benchmarks`` drives the Django test client through each scenario in
+``SCENARIOS`` and reports throughput, p50/p95 latency, queries per request
+and the peak memory allocated while handling a request. Background tasks run
+eagerly, so work a request queues (e.g. processing an order) is part of its
+cost. Results are plain dicts meant to be saved as JSON and passed to
+``compare`` against an earlier run.
+
+Run them with ``manage.py benchmark``, which uses a throwaway test database.
+"""
+import datetime
+import gc
+import platform
+import random
+import time
+import tracemalloc
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from consumer import services
+from consumer.adoptions import build_suggestions
+from consumer.models import Cart, CartItem, FarmerAdoption, Order, OrderItem
+from consumer.recommendations import rebuild_recommendations
+from farmer.models import Product
+from farmer.search import get_search_backend
+from farmer.stats import rebuild_farmer_stats
+from .instrumentation import QueryRecorder
+from .models import ChatMessage, RewardEntry
+from .rewards import rebuild_balances
+
+DEFAULT_SIZES = {
+    'farmers': 50,
+    'products_per_farmer': 10,
+    'consumers': 200,
+    'cart_items': 4,
+    'orders_per_consumer': 3,
+    'adoptions_per_consumer': 2,
+    'rewards_per_user': 5,
+    'messages_per_consumer': 10,
+}
+DEFAULT_SEED = 42
+PASSWORD = 'benchmark'
+DEFAULT_REQUESTS = 50
+WARMUP_REQUESTS = 5
+MEMORY_REQUESTS = 10
+BATCH_SIZE = 1000
+# A run is a regression when a metric grows by more than this share
+REGRESSION_THRESHOLD = 0.2
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'mean_queries', 'peak_memory_kb')
+
+DISTRICTS = [
+    ('Dharwad', 'Karnataka'), ('Tumkur', 'Karnataka'), ('Anantapur', 'Andhra Pradesh'),
+    ('Jodhpur', 'Rajasthan'), ('Nashik', 'Maharashtra'), ('Madurai', 'Tamil Nadu'),
+    ('Almora', 'Uttarakhand'), ('Koraput', 'Odisha'),
+]
+MILLETS = ['Ragi', 'Jowar', 'Bajra', 'Foxtail', 'Kodo', 'Little', 'Barnyard', 'Proso']
+FORMS = {
+    'grain': ['Whole Grain', 'Rice'],
+    'flour': ['Flour', 'Atta'],
+    'snack': ['Cookies', 'Chips', 'Laddu'],
+    'ready_to_eat': ['Dosa Mix', 'Upma Mix', 'Flakes'],
+    'other': ['Malt', 'Noodles'],
+}
+QUESTIONS = [
+    'Is ragi good for diabetes?', 'How do I cook foxtail millet?', 'Which millet has the most protein?',
+    'Can children eat bajra?', 'How long does jowar flour keep?',
+]
+
+Scenario = namedtuple('Scenario', 'name role method prepare logged_in', defaults=(True,))
+
+
+def generate_data(seed=DEFAULT_SEED, **sizes):
+    """Create a synthetic data set. Returns the number of rows created per model."""
+    sizes = dict(DEFAULT_SIZES, **sizes)
+    rng = random.Random(seed)
+    now = timezone.now()
+    # Hashing is deliberately slow; every synthetic user shares one hash
+    password = make_password(PASSWORD)
+
+    farmers = User.objects.bulk_create([
+        User(
+            username=f'bench-farmer-{i}', password=password, user_type='farmer',
+            first_name='Farmer', last_name=str(i), phone_number=f'9{i:09d}',
+            farm_location='{}, {}'.format(*rng.choice(DISTRICTS)), farm_size=round(rng.uniform(0.5, 20), 1),
+        )
+        for i in range(sizes['farmers'])
+    ], batch_size=BATCH_SIZE)
+    consumers = User.objects.bulk_create([
+        User(
+            username=f'bench-consumer-{i}', password=password, user_type='consumer',
+            first_name='Consumer', last_name=str(i), phone_number=f'8{i:09d}', age=rng.randint(18, 75),
+            health_preferences=rng.choice(['diabetes', 'weight loss', 'high protein', 'gluten free', '']),
+        )
+        for i in range(sizes['consumers'])
+    ], batch_size=BATCH_SIZE)
+
+    products = []
+    for farmer in farmers:
+        for _ in range(sizes['products_per_farmer']):
+            category = rng.choice(list(FORMS))
+            millet = rng.choice(MILLETS)
+            products.append(Product(
+                farmer=farmer, name=f'{millet} {rng.choice(FORMS[category])}',
+                description=f'{millet} from {farmer.farm_location}, grown without irrigation.',
+                price=Decimal(rng.randrange(4000, 60000)) / 100, stock_quantity=rng.randint(0, 500),
+                category=category, is_organic=rng.random() < 0.4, is_available=rng.random() < 0.95,
+            ))
+    products = Product.objects.bulk_create(products, batch_size=BATCH_SIZE)
+    available = [product for product in products if product.is_available]
+
+    carts = Cart.objects.bulk_create([Cart(consumer=consumer) for consumer in consumers], batch_size=BATCH_SIZE)
+    cart_items = [
+        CartItem(cart=cart, product=product, quantity=rng.randint(1, 5))
+        for cart in carts
+        for product in rng.sample(available, min(len(available), rng.randint(0, sizes['cart_items'])))
+    ]
+    CartItem.objects.bulk_create(cart_items, batch_size=BATCH_SIZE)
+    services.recalculate_cart_totals(Cart.objects.all())
+
+    orders, lines = [], []
+    for consumer in consumers:
+        district, state = rng.choice(DISTRICTS)
+        for _ in range(rng.randint(0, sizes['orders_per_consumer'])):
+            items = [(product, rng.randint(1, 4)) for product in rng.sample(available, min(len(available), rng.randint(1, 4)))]
+            orders.append(Order(
+                consumer=consumer, shipping_address=f'{rng.randint(1, 200)} Main Road\n{district}, {state}',
+                phone_number=consumer.phone_number, status=rng.choice(Order.STATUS_CHOICES)[0],
+                total_amount=sum(product.price * quantity for product, quantity in items),
+            ))
+            lines.append(items)
+    orders = Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+    order_items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+        for order, items in zip(orders, lines)
+        for product, quantity in items
+    ], batch_size=BATCH_SIZE)
+
+    adoptions = FarmerAdoption.objects.bulk_create([
+        FarmerAdoption(consumer=consumer, farmer=farmer)
+        for consumer in consumers
+        for farmer in rng.sample(farmers, min(len(farmers), rng.randint(0, sizes['adoptions_per_consumer'])))
+    ], batch_size=BATCH_SIZE)
+
+    entries = RewardEntry.objects.bulk_create([
+        RewardEntry(user=user, kind='accrual', points=rng.randint(5, 100), description='Synthetic reward',
+                    idempotency_key=f'bench:{user.pk}:{n}')
+        for user in farmers + consumers
+        for n in range(rng.randint(0, sizes['rewards_per_user']))
+    ], batch_size=BATCH_SIZE)
+
+    messages = []
+    for consumer in consumers:
+        for n in range(rng.randint(0, sizes['messages_per_consumer'] // 2)):
+            at = now - datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 30))
+            messages.append(ChatMessage(user=consumer, message=rng.choice(QUESTIONS), created_at=at))
+            messages.append(ChatMessage(user=consumer, message='Synthetic answer.', is_user_message=False,
+                                        created_at=at + datetime.timedelta(seconds=2)))
+    ChatMessage.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+    # bulk_create skips signals, so derived tables are rebuilt in one pass each
+    rebuild_farmer_stats()
+    rebuild_balances()
+    get_search_backend().rebuild()
+    rebuild_recommendations()
+    build_suggestions()
+    cache.clear()
+    return {
+        'farmers': len(farmers), 'consumers': len(consumers), 'products': len(products),
+        'cart_items': len(cart_items), 'orders': len(orders), 'order_items': len(order_items),
+        'adoptions': len(adoptions), 'reward_entries': len(entries), 'chat_messages': len(messages),
+    }
+
+
+def _fill_cart(user, rng):
+    products = list(Product.objects.filter(is_available=True, stock_quantity__gt=0).values_list('pk', flat=True)[:200])
+    services.add_many_to_cart(user, {pk: 1 for pk in rng.sample(products, min(len(products), 3))})
+
+
+def _product_list(user, rng):
+    query = rng.choice([{}, {'q': 'ragi'}, {'category': 'flour'}, {'sort': 'price_asc'}])
+    return reverse('product_list'), query
+
+
+def _product_detail(user, rng):
+    product = rng.choice(list(Product.objects.values_list('pk', flat=True)[:200]))
+    return reverse('product_detail', args=[product]), None
+
+
+def _add_to_cart(user, rng):
+    product = rng.choice(list(Product.objects.filter(is_available=True).values_list('pk', flat=True)[:200]))
+    return reverse('add_to_cart', args=[product]), None
+
+
+def _login(user, rng):
+    # Half by username, half through the phone number index
+    identifier = user.username if rng.random() < 0.5 else user.phone_number
+    return reverse('login'), {'username': identifier, 'password': PASSWORD}
+
+
+def _register(user, rng):
+    suffix = uuid.uuid4().hex[:10]
+    return reverse('register_consumer'), {
+        'username': f'bench-new-{suffix}', 'email': f'{suffix}@example.com', 'first_name': 'New',
+        'last_name': 'Consumer', 'phone_number': f'7{rng.randrange(10 ** 9):09d}', 'age': 30,
+        'health_preferences': 'diabetes', 'password1': 'Millet#Harvest2024', 'password2': 'Millet#Harvest2024',
+        'user_type': 'consumer',
+    }
+
+
+def _checkout(user, rng):
+    # Restock, so repeated orders measure the happy path rather than a shortfall
+    Product.objects.filter(stock_quantity__lt=50).update(stock_quantity=500)
+    _fill_cart(user, rng)
+    return reverse('checkout'), {
+        'shipping_address': '12 Main Road\nDharwad, Karnataka', 'phone_number': '9000000000',
+        'idempotency_key': uuid.uuid4().hex,
+    }
+
+
+SCENARIOS = [
+    Scenario('product_list', 'consumer', 'get', _product_list),
+    Scenario('product_detail', 'consumer', 'get', _product_detail),
+    Scenario('home', 'consumer', 'get', lambda user, rng: (reverse('home'), None), logged_in=False),
+    Scenario('cart', 'consumer', 'get', lambda user, rng: (reverse('cart'), None)),
+    Scenario('add_to_cart', 'consumer', 'get', _add_to_cart),
+    Scenario('consumer_dashboard', 'consumer', 'get', lambda user, rng: (reverse('consumer_dashboard'), None)),
+    Scenario('farmer_dashboard', 'farmer', 'get', lambda user, rng: (reverse('farmer_dashboard'), None)),
+    Scenario('checkout', 'consumer', 'post', _checkout),
+    Scenario('login', 'consumer', 'post', _login, logged_in=False),
+    Scenario('register_consumer', 'consumer', 'post', _register, logged_in=False),
+]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def _request(client, scenario, user, rng):
+    url, data = scenario.prepare(user, rng)
+    recorder = QueryRecorder()
+    start = time.perf_counter()
+    with connections['default'].execute_wrapper(recorder):
+        response = getattr(client, scenario.method)(url, data)
+    seconds = time.perf_counter() - start
+    if response.status_code >= 400:
+        raise RuntimeError(f'{scenario.name}: {url} answered {response.status_code}')
+    return seconds, recorder.count
+
+
+def run_scenario(scenario, requests=DEFAULT_REQUESTS, seed=DEFAULT_SEED):
+    """Time ``requests`` requests of one scenario, as a different user each time."""
+    rng = random.Random(seed)
+    users = list(User.objects.filter(user_type=scenario.role, username__startswith='bench-').order_by('pk'))
+    if not users:
+        raise RuntimeError(f'{scenario.name}: no synthetic {scenario.role}s, run generate_data first')
+    client = Client()
+    cache.clear()
+
+    def next_user(n):
+        user = users[n % len(users)]
+        if scenario.logged_in:
+            client.force_login(user)
+        else:
+            client.logout()
+        return user
+
+    for n in range(WARMUP_REQUESTS):
+        _request(client, scenario, next_user(n), rng)
+
+    latencies, queries = [], []
+    for n in range(requests):
+        seconds, count = _request(client, scenario, next_user(n), rng)
+        latencies.append(seconds)
+        queries.append(count)
+
+    # Tracing allocations slows requests down, so memory gets its own pass
+    peak = 0
+    gc.collect()
+    for n in range(min(requests, MEMORY_REQUESTS)):
+        user = next_user(n)
+        tracemalloc.start()
+        try:
+            _request(client, scenario, user, rng)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        # One thread in one process: requests per second per core
+        'per_second': round(len(latencies) / sum(latencies), 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'mean_queries': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(requests=DEFAULT_REQUESTS, seed=DEFAULT_SEED, names=None, rows=None):
+    """Run every scenario (or those in ``names``). Returns a JSON-serialisable report."""
+    scenarios = [scenario for scenario in SCENARIOS if names is None or scenario.name in names]
+    results = {}
+    with override_settings(TASK_BACKEND='eager'):
+        for scenario in scenarios:
+            results[scenario.name] = run_scenario(scenario, requests, seed)
+    return {
+        'created_at': timezone.now().isoformat(),
+        'seed': seed,
+        'rows': rows or {},
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Metrics of ``current`` that grew by more than ``threshold`` over
+    ``baseline``, as (scenario, metric, before, after) tuples.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append((name, metric, old, new))
+    return regressions
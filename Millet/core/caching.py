@@ -0,0 +1,174 @@
+"""
+Caching for the public and semi-public pages (home, catalog, product detail).
+
+Three layers, cheapest first:
+
+- Conditional GET. Pages send an ETag built from what they show (product
+  ``updated_at``, the catalog version, the navbar's cart badge, the viewer)
+  with ``Cache-Control: no-cache``; the ETag is computed before the view, so
+  a browser revalidating an unchanged page gets a 304 without any rendering.
+- Whole responses for anonymous visitors (``cache_anonymous_page``), and
+  catalog query results, through ``get_or_compute``.
+- Template fragments (``{% cache %}``) keyed on ``product.updated_at``, so a
+  changed product re-renders only its own card.
+
+Catalog entries carry a version number that changes whenever a product is
+saved, deleted, imported or reserved by checkout (see farmer.signals), which
+orphans the old entries instead of having to find and delete them. Other
+caches (the consumer dashboard, adoption lists, advisory rules) version
+their keys the same way, through ``cache_version`` and ``bump_version``.
+
+``get_or_compute`` protects against stampedes: an entry outlives its
+timeout by ``STALE_GRACE`` seconds, and once expired a single caller (the
+one that takes the lock) recomputes it while the others keep serving the
+stale value. With nothing to serve, the others wait up to ``LOCK_WAIT``
+seconds for that result before computing it themselves.
+"""
+import functools
+import hashlib
+import time
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+STALE_GRACE = 60
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+PAGE_CACHE_TIMEOUT = 300
+
+CATALOG_VERSION_KEY = 'catalog-version'
+LOCK_KEY = 'single-flight:{}'
+PAGE_KEY = 'anonymous-page:{}'
+
+
+def get_or_compute(key, compute, timeout):
+    """
+    ``cache.get(key)``, computing and storing ``compute()`` on a miss, with
+    one caller at a time recomputing an entry. A ``compute()`` result of
+    None is returned but not stored.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        expires, value = entry
+        if expires > time.time():
+            return value
+        if not cache.add(LOCK_KEY.format(key), 1, LOCK_TIMEOUT):
+            # Someone is already refreshing it
+            return value
+    elif not cache.add(LOCK_KEY.format(key), 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+        # The lock holder is slow or gone: compute without the lock
+        return _store(key, compute(), timeout)
+    try:
+        return _store(key, compute(), timeout)
+    finally:
+        cache.delete(LOCK_KEY.format(key))
+
+
+def _store(key, value, timeout):
+    if value is not None:
+        cache.set(key, (time.time() + timeout, value), timeout + STALE_GRACE)
+    return value
+
+
+def cache_version(key):
+    """The version number stored under ``key``, starting one if there is none."""
+    version = cache.get(key)
+    if version is None:
+        # A fresh, unique version so entries written before an eviction of the
+        # version key can never be served again
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    """Move ``key`` to a new version, orphaning everything cached under the old one."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version stored: the next read starts a new one anyway
+        pass
+
+
+def catalog_version():
+    return cache_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def has_pending_messages(request):
+    # len() does not mark the messages as read
+    return bool(len(messages.get_messages(request)))
+
+
+def page_etag(request, *parts):
+    """
+    A weak ETag for a page showing ``parts`` to this viewer, or None when the
+    page must be rendered anyway (a message is waiting to be shown).
+
+    Pages carry the viewer's navbar and CSRF token, so the user and the CSRF
+    secret are part of the tag; a 304 never hands one user's page to another.
+    """
+    if has_pending_messages(request):
+        return None
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    parts = (user_id, request.META.get('CSRF_COOKIE', ''), *parts)
+    return 'W/' + quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def cache_anonymous_page(timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Serve GET requests from anonymous visitors from a cached copy of the
+    page, answering If-None-Match with a 304. Logged-in users, and visitors
+    with a message waiting, get the view as usual.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or request.user.is_authenticated
+                    or has_pending_messages(request)):
+                return view_func(request, *args, **kwargs)
+
+            uncacheable = None
+
+            def render():
+                nonlocal uncacheable
+                response = view_func(request, *args, **kwargs)
+                # A page holding a CSRF token belongs to one visitor
+                if (response.status_code != 200 or response.streaming or response.cookies
+                        or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+                    uncacheable = response
+                    return None
+                if hasattr(response, 'render'):
+                    response.render()
+                etag = quote_etag(hashlib.md5(response.content, usedforsecurity=False).hexdigest())
+                return {'content': response.content, 'content_type': response['Content-Type'], 'etag': etag}
+
+            path = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+            page = get_or_compute(PAGE_KEY.format(path), render, timeout)
+            if page is None:
+                return uncacheable
+            response = get_conditional_response(request, etag=page['etag'])
+            if response is None:
+                response = HttpResponse(page['content'], content_type=page['content_type'])
+            response['ETag'] = page['etag']
+            patch_cache_control(response, public=True, no_cache=True)
+            # Logged-in users get a different page from the same URL
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
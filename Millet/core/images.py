@@ -0,0 +1,201 @@
+"""
+Resized variants of uploaded images (product photos and profile pictures).
+
+Each source image gets a variant per size in ``VARIANTS`` and per format in
+``FORMATS``, stored at a fixed path (``variants/card/products/ragi.jpg.webp``)
+and recorded in ``ImageVariant``. Uploads queue their variants as a
+background task (core.tasks) on the 'images' queue, so the request does not
+wait for them; Pillow releases the GIL while decoding, resizing and
+encoding, so several images are processed in parallel.
+
+Templates ask for a size through ``{% variant_url image 'card' %}``
+(core.templatetags.images). Known variants are answered from the cache with
+no query. Any other variant gets the URL of ``core.views.image_variant``,
+which generates it on that first request and redirects to the stored file.
+"""
+import io
+import logging
+import posixpath
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from accounts.models import User
+from farmer.models import Product
+from .models import ImageVariant
+
+Variant = namedtuple('Variant', 'width height crop')
+
+VARIANTS = {
+    'thumbnail': Variant(150, 150, True),
+    'card': Variant(400, 300, True),
+    'detail': Variant(1200, 1200, False),
+}
+# format name -> (Pillow format, file extension, save options)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+DEFAULT_FORMAT = 'jpeg'
+# Only files under these upload directories get variants
+SOURCE_DIRS = ('products/', 'profile_pics/')
+VARIANT_DIR = 'variants'
+# Images processed at once by generate_all_variants
+WORKERS = 4
+CACHE_PREFIX = 'image-variant'
+
+logger = logging.getLogger(__name__)
+
+
+def is_source(name):
+    """True for a storage name that may have variants (no traversal outside the upload dirs)."""
+    return bool(name) and posixpath.normpath(name) == name and name.startswith(SOURCE_DIRS)
+
+
+def variant_path(source, size, format):
+    return f'{VARIANT_DIR}/{size}/{source}.{FORMATS[format][1]}'
+
+
+def _cache_key(source, size, format):
+    return f'{CACHE_PREFIX}:{size}:{format}:{source}'
+
+
+def variant_url(source, size, format=DEFAULT_FORMAT):
+    """
+    URL of a variant for templates: the stored file if it is known to exist,
+    otherwise the view that generates it. Never touches the database.
+    """
+    if not is_source(source) or size not in VARIANTS or format not in FORMATS:
+        return default_storage.url(source) if source else ''
+    url = cache.get(_cache_key(source, size, format))
+    if url is None:
+        url = reverse('image_variant', args=[size, format, source])
+    return url
+
+
+def _resize(image, spec):
+    if spec.crop:
+        # Crop to the aspect ratio, but never enlarge a small source
+        scale = min(1.0, image.width / spec.width, image.height / spec.height)
+        box = (max(1, round(spec.width * scale)), max(1, round(spec.height * scale)))
+        return ImageOps.fit(image, box, Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((spec.width, spec.height), Image.LANCZOS)
+    return image
+
+
+def _encode(image, format):
+    pil_format, _, options = FORMATS[format]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        # JPEG has no alpha: flatten transparent areas onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _open(source, box):
+    with default_storage.open(source, 'rb') as handle:
+        image = Image.open(handle)
+        # JPEGs decode straight at a reduced scale that still covers ``box``
+        image.draft('RGB', box)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def ensure_variants(source, wanted=None):
+    """
+    Generate the missing variants of ``source`` and record them.
+
+    ``wanted`` is an iterable of (size, format) pairs and defaults to every
+    variant. The source is decoded once for all of them. Returns a dict of
+    (size, format) -> ``ImageVariant`` covering ``wanted``.
+    """
+    if wanted is None:
+        wanted = [(size, format) for size in VARIANTS for format in FORMATS]
+    wanted = list(dict.fromkeys(wanted))
+    existing = {
+        (variant.size, variant.format): variant
+        for variant in ImageVariant.objects.filter(source=source)
+    }
+    missing = [key for key in wanted if key not in existing]
+    if missing:
+        # Square, as EXIF rotation may still swap the axes
+        side = max(max(VARIANTS[size].width, VARIANTS[size].height) for size, _ in missing)
+        image = _open(source, (side, side))
+        resized = {}
+        for size, format in missing:
+            if size not in resized:
+                resized[size] = _resize(image, VARIANTS[size])
+            data = _encode(resized[size], format)
+            path = variant_path(source, size, format)
+            if default_storage.exists(path):
+                # Left by an earlier run that was never recorded
+                default_storage.delete(path)
+            stored = default_storage.save(path, ContentFile(data))
+            variant, created = ImageVariant.objects.get_or_create(
+                source=source, size=size, format=format,
+                defaults={
+                    'path': stored, 'width': resized[size].width, 'height': resized[size].height,
+                    'file_size': len(data),
+                },
+            )
+            if not created and variant.path != stored:
+                # Another worker recorded this variant first
+                default_storage.delete(stored)
+            existing[size, format] = variant
+    for key in wanted:
+        cache.set(_cache_key(source, *key), default_storage.url(existing[key].path), None)
+    return {key: existing[key] for key in wanted}
+
+
+def delete_variants(sources):
+    """Remove the stored variants of the given source names."""
+    variants = list(ImageVariant.objects.filter(source__in=sources))
+    for variant in variants:
+        default_storage.delete(variant.path)
+        cache.delete(_cache_key(variant.source, variant.size, variant.format))
+    ImageVariant.objects.filter(pk__in=[variant.pk for variant in variants]).delete()
+    return len(variants)
+
+
+def _run(function, *args):
+    try:
+        return function(*args)
+    except Exception:
+        logger.exception('Image variant job failed for %s', args)
+    finally:
+        close_old_connections()
+
+
+def stored_sources():
+    """Every uploaded image name currently referenced by a product or a user."""
+    names = set(Product.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+    names.update(User.objects.exclude(profile_picture='').exclude(profile_picture=None)
+                 .values_list('profile_picture', flat=True))
+    return {name for name in names if is_source(name)}
+
+
+def generate_all_variants(workers=WORKERS):
+    """Make sure every stored image has all its variants. Returns (sources, failures)."""
+    sources = sorted(stored_sources())
+    with ThreadPoolExecutor(max_workers=max(1, workers or 1), thread_name_prefix='image-variants') as pool:
+        results = list(pool.map(lambda source: _run(ensure_variants, source), sources))
+    return len(sources), sum(1 for result in results if result is None)
+
+
+def prune_variants():
+    """Delete variants whose source image is no longer referenced."""
+    sources = set(ImageVariant.objects.values_list('source', flat=True).distinct())
+    return delete_variants(sources - stored_sources())
@@ -0,0 +1,211 @@
+"""
+Per-view request metrics.
+
+``core.middleware.InstrumentationMiddleware`` times every request and counts
+its SQL through ``connection.execute_wrapper``. Results are kept per URL
+name in memory, per process:
+
+* cumulative histograms of latency and query count (fixed buckets, so the
+  Prometheus endpoint can export them as they are);
+* a ring buffer of the last ``RING_SIZE`` requests, for percentiles;
+* N+1 suspects: requests that ran the same SQL ``DUPLICATE_THRESHOLD`` or
+  more times, with the statement;
+* cProfile captures for the URL names sampled in
+  ``settings.INSTRUMENTATION_PROFILE`` ({url_name: sampling rate}).
+
+Recording a request is a few dict updates under a lock; nothing is written to
+the database.
+"""
+import bisect
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+from collections import Counter, deque
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+RING_SIZE = 256
+DUPLICATE_THRESHOLD = 3
+SUSPECTS_KEPT = 50
+PROFILES_KEPT = 10
+PROFILE_LINES = 40
+
+# "IN (%s, %s, %s)" and "IN (%s)" are the same statement with another list
+PLACEHOLDER_LIST_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def normalize_sql(sql):
+    return PLACEHOLDER_LIST_RE.sub('%s, ...', sql)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable counting the statements of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.statements[normalize_sql(sql)] += 1
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; counts are per bucket, not cumulative
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class ViewStats:
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.errors = 0
+        self.duplicate_requests = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.recent = deque(maxlen=RING_SIZE)
+
+    def summary(self):
+        recent = list(self.recent)
+        latencies = sorted(sample[0] for sample in recent)
+        queries = [sample[1] for sample in recent]
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'errors': self.errors,
+            'duplicate_requests': self.duplicate_requests,
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p95_ms': _percentile(latencies, 95) * 1000,
+            'mean_queries': sum(queries) / len(queries) if queries else 0,
+            'max_queries': max(queries, default=0),
+        }
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+            self.suspects = deque(maxlen=SUSPECTS_KEPT)
+            self.profiles = deque(maxlen=PROFILES_KEPT)
+
+    def record(self, name, seconds, status, recorder):
+        duplicates = recorder.duplicates()
+        with self._lock:
+            stats = self.views.get(name)
+            if stats is None:
+                stats = self.views[name] = ViewStats(name)
+            stats.requests += 1
+            if status >= 500:
+                stats.errors += 1
+            stats.latency.observe(seconds)
+            stats.queries.observe(recorder.count)
+            stats.recent.append((seconds, recorder.count, len(duplicates)))
+            if duplicates:
+                stats.duplicate_requests += 1
+                sql, count = duplicates[0]
+                self.suspects.append({'view': name, 'sql': sql, 'count': count, 'at': time.time()})
+
+    def add_profile(self, name, profile):
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        with self._lock:
+            self.profiles.append({'view': name, 'at': time.time(), 'stats': output.getvalue()})
+
+    def snapshot(self):
+        with self._lock:
+            views = sorted(self.views.values(), key=lambda stats: -stats.requests)
+            return {
+                'views': [stats.summary() for stats in views],
+                'suspects': list(reversed(self.suspects)),
+                'profiles': list(reversed(self.profiles)),
+            }
+
+    def prometheus(self):
+        """All view metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            views = sorted(self.views.values(), key=lambda stats: stats.name)
+            family('shreeanna_view_latency_seconds', 'histogram', 'Time spent handling requests, by URL name.')
+            for stats in views:
+                _histogram_lines(lines, 'shreeanna_view_latency_seconds', stats.name, stats.latency)
+            family('shreeanna_view_queries', 'histogram', 'SQL queries per request, by URL name.')
+            for stats in views:
+                _histogram_lines(lines, 'shreeanna_view_queries', stats.name, stats.queries)
+            family('shreeanna_view_errors_total', 'counter', 'Requests answered with a 5xx status.')
+            for stats in views:
+                lines.append(f'shreeanna_view_errors_total{{view="{_label(stats.name)}"}} {stats.errors}')
+            family('shreeanna_view_duplicate_query_requests_total', 'counter',
+                   'Requests that repeated one SQL statement (likely N+1).')
+            for stats in views:
+                lines.append(
+                    f'shreeanna_view_duplicate_query_requests_total{{view="{_label(stats.name)}"}} '
+                    f'{stats.duplicate_requests}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(lines, metric, view, histogram):
+    view = _label(view)
+    for bound, count in histogram.cumulative():
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        lines.append(f'{metric}_bucket{{view="{view}",le="{le}"}} {count}')
+    lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum}')
+    lines.append(f'{metric}_count{{view="{view}"}} {sum(histogram.counts)}')
+
+
+def start_profile():
+    """A running profiler, or None if another one is already active in this thread."""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+registry = Registry()
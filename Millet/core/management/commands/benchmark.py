@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot views against seeded synthetic data in a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=benchmarks.DEFAULT_SEED)
+        parser.add_argument('--requests', type=int, default=benchmarks.DEFAULT_REQUESTS,
+                            help='Timed requests per scenario.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            choices=[scenario.name for scenario in benchmarks.SCENARIOS],
+                            help='Only run this scenario (repeatable).')
+        for name, default in benchmarks.DEFAULT_SIZES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, dest=name)
+        parser.add_argument('--output', help='Write the report as JSON to this file.')
+        parser.add_argument('--compare', help='Earlier JSON report; exit with an error on regressions.')
+        parser.add_argument('--threshold', type=float, default=benchmarks.REGRESSION_THRESHOLD,
+                            help='Relative growth of a metric that counts as a regression.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+        sizes = {name: options[name] for name in benchmarks.DEFAULT_SIZES}
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            rows = benchmarks.generate_data(options['seed'], **sizes)
+            self.stdout.write('Generated ' + ', '.join(f'{count} {name}' for name, count in rows.items()))
+            report = benchmarks.run_benchmarks(options['requests'], options['seed'], options['scenarios'], rows)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}{'peak KB':>10}")
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<20}{result['per_second']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['mean_queries']:>10.1f}{result['peak_memory_kb']:>10.0f}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved the report to {options['output']}."))
+
+        if baseline is not None:
+            regressions = benchmarks.compare(baseline, report, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {metric} went from {before} to {after}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}.')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
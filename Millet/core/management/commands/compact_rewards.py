@@ -0,0 +1,21 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from core.rewards import compact_entries, rebuild_balances
+
+
+class Command(BaseCommand):
+    help = 'Fold old reward ledger entries into per-user snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Compact entries older than this many days.')
+        parser.add_argument('--rebuild-balances', action='store_true',
+                            help='Also recompute every balance from the ledger.')
+
+    def handle(self, *args, **options):
+        removed = compact_entries(datetime.timedelta(days=options['days']))
+        self.stdout.write(f'Compacted {removed} reward entries.')
+        if options['rebuild_balances']:
+            self.stdout.write(f'Rebuilt {rebuild_balances()} balances.')
+        self.stdout.write(self.style.SUCCESS('Reward ledger compacted.'))
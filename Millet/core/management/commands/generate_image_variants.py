@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.images import WORKERS, generate_all_variants, prune_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized variants of product photos and profile pictures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=WORKERS, help='Images processed in parallel.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete variants of images that are no longer used.')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            self.stdout.write(f'Deleted {prune_variants()} unused variants.')
+        sources, failures = generate_all_variants(options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Checked variants of {sources} images ({failures} failed).'))
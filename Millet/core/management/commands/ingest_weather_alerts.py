@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from core.alerts import ingest_alerts, purge_expired_alerts, rebuild_farmer_regions
+
+
+class Command(BaseCommand):
+    help = 'Ingest weather alerts from a JSON file (a list or one object per line) and deliver them to farmers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='JSON or JSON-lines file of alerts.')
+        parser.add_argument('--purge', action='store_true', help='Delete expired inbox entries.')
+        parser.add_argument('--rebuild-regions', action='store_true', help='Rebuild the farmer region map first.')
+
+    def handle(self, *args, **options):
+        if options['rebuild_regions']:
+            count = rebuild_farmer_regions()
+            self.stdout.write(f'Rebuilt regions for {count} farmers.')
+        if options['path']:
+            with open(options['path'], encoding='utf-8') as handle:
+                text = handle.read().strip()
+            try:
+                records = json.loads(text) if text.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+            except ValueError as exc:
+                raise CommandError(f'Invalid alert file: {exc}')
+            for record in records:
+                if record.get('expires_at'):
+                    record['expires_at'] = parse_datetime(record['expires_at'])
+            alerts, delivered = ingest_alerts(records)
+            self.stdout.write(self.style.SUCCESS(f'Ingested {len(alerts)} alerts, {delivered} deliveries.'))
+        if options['purge']:
+            self.stdout.write(f'Purged {purge_expired_alerts()} expired deliveries.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.schemes import match_all_schemes
+
+
+class Command(BaseCommand):
+    help = 'Evaluate every government scheme against every user and store the matches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recompile', action='store_true',
+                            help='Rebuild each scheme\'s criteria from its eligibility text first.')
+
+    def handle(self, *args, **options):
+        count = match_all_schemes(recompile=options['recompile'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} scheme matches.'))
@@ -0,0 +1,48 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryRecorder, registry, start_profile
+
+
+class InstrumentationMiddleware:
+    """
+    Record latency and SQL of every request under its URL name (see
+    core.instrumentation), and profile the views sampled in
+    ``settings.INSTRUMENTATION_PROFILE``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._instrumentation_profile = None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            try:
+                response = self.get_response(request)
+            finally:
+                profile = request._instrumentation_profile
+                if profile is not None:
+                    profile.disable()
+        seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths are pooled so random 404s cannot grow the registry
+        name = (match.view_name or match._func_path) if match else '<unresolved>'
+        registry.record(name, seconds, response.status_code, recorder)
+        if profile is not None:
+            registry.add_profile(name, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rate = getattr(settings, 'INSTRUMENTATION_PROFILE', {}).get(request.resolver_match.url_name)
+        if rate and random.random() < rate:
+            request._instrumentation_profile = start_profile()
+        return None
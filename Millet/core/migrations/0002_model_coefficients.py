@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelCoefficients',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=150)),
+                ('data', models.BinaryField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('ai_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coefficients', to='core.aimodel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ai_model', 'segment'), name='unique_model_segment')],
+            },
+        ),
+    ]
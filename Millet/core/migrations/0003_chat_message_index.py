@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_model_coefficients'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='chat_user_recent_idx'),
+        ),
+    ]
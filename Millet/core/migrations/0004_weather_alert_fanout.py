@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _normalize(text):
+    parts = [' '.join(re.findall(r'[\w\u0900-\u0d7f]+', part.lower())) for part in (text or '').split(',')]
+    return ', '.join(part for part in parts if part)[:100]
+
+
+def build_region_map(apps, schema_editor):
+    # Same normalization as core.alerts at the time of this migration
+    WeatherAlert = apps.get_model('core', 'WeatherAlert')
+    FarmerRegion = apps.get_model('core', 'FarmerRegion')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for alert in WeatherAlert.objects.all():
+        alert.region_key = _normalize(alert.region)
+        alert.save(update_fields=['region_key'])
+    rows = []
+    for pk, location in User.objects.filter(user_type='farmer').values_list('pk', 'farm_location'):
+        parts = _normalize(location).split(', ') if _normalize(location) else []
+        keys = set(parts) | {', '.join(parts[i:]) for i in range(len(parts))}
+        rows.extend(FarmerRegion(region_key=key, farmer_id=pk) for key in keys)
+    FarmerRegion.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chat_message_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FarmerRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region_key', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='weatheralert',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatheralert',
+            name='region_key',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='weatheralert',
+            name='severity',
+            field=models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='low', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='weatheralert',
+            index=models.Index(fields=['region_key', '-created_at'], name='alert_region_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='farmeralert',
+            name='alert',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='core.weatheralert'),
+        ),
+        migrations.AddField(
+            model_name='farmeralert',
+            name='farmer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weather_alerts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='farmerregion',
+            name='farmer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_regions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='farmeralert',
+            index=models.Index(fields=['farmer', 'expires_at'], name='farmer_alert_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='farmeralert',
+            constraint=models.UniqueConstraint(fields=('farmer', 'alert'), name='unique_farmer_alert'),
+        ),
+        migrations.AddConstraint(
+            model_name='farmerregion',
+            constraint=models.UniqueConstraint(fields=('region_key', 'farmer'), name='unique_region_farmer'),
+        ),
+        migrations.RunPython(build_region_map, migrations.RunPython.noop),
+    ]
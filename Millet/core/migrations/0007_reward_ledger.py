@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """Each existing reward row becomes an accrual, keyed so it is never applied twice."""
+    User = apps.get_model('accounts', 'User')
+    RewardEntry = apps.get_model('core', 'RewardEntry')
+    RewardBalance = apps.get_model('core', 'RewardBalance')
+    sources = [
+        (apps.get_model('farmer', 'FarmerReward'), 'farmer_id', 'farmer-reward'),
+        (apps.get_model('consumer', 'ConsumerReward'), 'consumer_id', 'consumer-reward'),
+    ]
+    totals = {}
+    for model, user_field, prefix in sources:
+        entries = []
+        for reward in model.objects.order_by('pk').iterator():
+            user_id = getattr(reward, user_field)
+            totals[user_id] = totals.get(user_id, 0) + reward.points
+            entries.append(RewardEntry(
+                user_id=user_id, kind='accrual', points=reward.points, description=reward.description,
+                idempotency_key=f'{prefix}:{reward.pk}', created_at=reward.created_at,
+            ))
+        RewardEntry.objects.bulk_create(entries, batch_size=1000)
+    user_types = dict(User.objects.filter(pk__in=totals).values_list('pk', 'user_type'))
+    RewardBalance.objects.bulk_create(
+        [RewardBalance(user_id=user_id, user_type=user_types[user_id], points=points) for user_id, points in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('consumer', '0005_recommendations'),
+        ('core', '0006_image_variants'),
+        ('farmer', '0007_product_sku'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewardBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reward_balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('user_type', models.CharField(max_length=10)),
+                ('points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_type', '-points', 'user'], name='reward_leaderboard_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RewardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('accrual', 'Accrual'), ('redemption', 'Redemption'), ('snapshot', 'Snapshot')], max_length=10)),
+                ('points', models.IntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('idempotency_key', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reward_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='reward_entry_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_reward_entry_key')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
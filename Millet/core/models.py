@@ -17,30 +17,165 @@ class AIModel(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_model_type_display()})"
 
+class ModelCoefficients(models.Model):
+    """Trained parameters of one segment of an AIModel, stored as a packed float32 array."""
+    ai_model = models.ForeignKey(AIModel, on_delete=models.CASCADE, related_name='coefficients')
+    segment = models.CharField(max_length=150)
+    data = models.BinaryField()
+    samples = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ai_model', 'segment'], name='unique_model_segment'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ai_model.name} [{self.segment}]"
+
 class WeatherAlert(models.Model):
+    SEVERITY_CHOICES = (
+        ('low', 'Low'),
+        ('medium', 'Medium'),
+        ('high', 'High'),
+    )
+    
     region = models.CharField(max_length=100)
+    # Normalized form of ``region`` used to match farmers (see core.alerts)
+    region_key = models.CharField(max_length=100, blank=True)
     alert_type = models.CharField(max_length=50)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default='low')
     description = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['region_key', '-created_at'], name='alert_region_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.alert_type} alert for {self.region}"
 
+class FarmerRegion(models.Model):
+    """Region keys of each farmer's farm_location: the map alerts fan out through."""
+    region_key = models.CharField(max_length=100)
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_regions')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region_key', 'farmer'], name='unique_region_farmer'),
+        ]
+
+class FarmerAlert(models.Model):
+    """One alert delivered to one farmer's inbox."""
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weather_alerts')
+    alert = models.ForeignKey(WeatherAlert, on_delete=models.CASCADE, related_name='deliveries')
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farmer', 'alert'], name='unique_farmer_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['farmer', 'expires_at'], name='farmer_alert_active_idx'),
+        ]
+
 class GovernmentScheme(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     eligibility = models.TextField()
+    # Structured predicates compiled from ``eligibility`` (see core.schemes)
+    criteria = models.JSONField(default=dict, blank=True)
     application_url = models.URLField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return self.title
 
+class SchemeMatch(models.Model):
+    """A user who meets a scheme's eligibility criteria."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scheme_matches')
+    scheme = models.ForeignKey(GovernmentScheme, on_delete=models.CASCADE, related_name='matches')
+    
+    class Meta:
+        constraints = [
+            # Leading user column serves the dashboard lookup
+            models.UniqueConstraint(fields=['user', 'scheme'], name='unique_user_scheme'),
+        ]
+
+class RewardEntry(models.Model):
+    """One change to a user's reward points, written by core.rewards."""
+    KIND_CHOICES = (
+        ('accrual', 'Accrual'),
+        ('redemption', 'Redemption'),
+        ('snapshot', 'Snapshot'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reward_entries')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Negative for redemptions; a snapshot carries the sum of compacted entries
+    points = models.IntegerField()
+    description = models.CharField(max_length=255, blank=True)
+    idempotency_key = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_reward_entry_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='reward_entry_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.points:+d} ({self.kind})"
+
+class RewardBalance(models.Model):
+    """A user's current points: the sum of their entries, kept in step with every entry."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='reward_balance')
+    user_type = models.CharField(max_length=10)
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Leaderboards walk this index from the top instead of sorting sums
+            models.Index(fields=['user_type', '-points', 'user'], name='reward_leaderboard_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.points} points"
+
+class ImageVariant(models.Model):
+    """A resized copy of an uploaded image, stored next to it (see core.images)."""
+    source = models.CharField(max_length=255)
+    size = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'size', 'format'], name='unique_image_variant'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source} ({self.size}, {self.format})"
+
 class ChatMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages')
     message = models.TextField()
     is_user_message = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='chat_user_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"Message from {'User' if self.is_user_message else 'AI'}: {self.message[:50]}..."
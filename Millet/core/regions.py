@@ -0,0 +1,29 @@
+"""
+Normalized farm locations and regions, shared by weather alerts, scheme
+matching and price segments.
+
+"Mandya , KARNATAKA." normalizes to "mandya, karnataka": lower case, words
+only, one comma and space between parts.
+"""
+import re
+
+WORD_RE = re.compile(r'[\w\u0900-\u0d7f]+')
+
+
+def normalize_region(text):
+    parts = [' '.join(WORD_RE.findall(part.lower())) for part in (text or '').split(',')]
+    return ', '.join(part for part in parts if part)[:100]
+
+
+def region_parts(location):
+    """The normalized parts of a location, most specific first."""
+    normalized = normalize_region(location)
+    return normalized.split(', ') if normalized else []
+
+
+def region_keys(location):
+    """Every key an alert may use to reach this location: each part and each suffix."""
+    parts = region_parts(location)
+    keys = set(parts)
+    keys.update(', '.join(parts[i:]) for i in range(len(parts)))
+    return keys
@@ -0,0 +1,170 @@
+"""
+Reward points ledger for farmers and consumers.
+
+Every change to a user's points is a ``RewardEntry``: an accrual, a
+redemption (negative points) or a snapshot left by compaction. Each entry is
+written in the same transaction as a guarded ``UPDATE`` of the user's
+``RewardBalance``, so reading a balance is a primary-key lookup and a
+redemption can never take a balance below zero. A farmer's balance is also
+copied into ``FarmerStats.reward_points`` in the same transaction, for the
+dashboard. An ``idempotency_key`` makes
+retries safe: posting the same key for a user again returns the first entry
+instead of applying it twice.
+
+Leaderboards read ``RewardBalance`` through its (user_type, -points) index,
+which the database keeps sorted as balances change. ``compact_entries``
+folds entries older than ``COMPACT_AFTER`` into one snapshot per user; the
+keys of compacted entries are forgotten, so only retries within that window
+are recognised.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from accounts.models import User
+from farmer.models import FarmerStats
+from farmer.stats import add_reward_points
+from .models import RewardBalance, RewardEntry
+
+COMPACT_AFTER = datetime.timedelta(days=365)
+COMPACT_CHUNK = 1000
+LEADERBOARD_SIZE = 10
+RECENT_ENTRIES = 10
+
+# Sent with ``user_id`` after an entry changes a user's balance
+balance_changed = Signal()
+
+
+class RewardError(Exception):
+    pass
+
+
+class InsufficientPointsError(RewardError):
+    def __init__(self, balance, points):
+        self.balance = balance
+        super().__init__(f"Only {balance} points available, {points} requested.")
+
+
+def _post(user, kind, points, description, key):
+    RewardBalance.objects.bulk_create(
+        [RewardBalance(user_id=user.pk, user_type=user.user_type)], ignore_conflicts=True,
+    )
+    balances = RewardBalance.objects.filter(pk=user.pk)
+    if points < 0:
+        # Guarded like stock reservation: no row matches if the points are not there
+        balances = balances.filter(points__gte=-points)
+    if not balances.update(points=F('points') + points):
+        raise InsufficientPointsError(get_balance(user), -points)
+    if user.user_type == 'farmer':
+        add_reward_points(user.pk, points)
+    return RewardEntry.objects.create(
+        user_id=user.pk, kind=kind, points=points, description=description[:255], idempotency_key=key or None,
+    )
+
+
+def _post_once(user, kind, points, description, key):
+    if key:
+        existing = RewardEntry.objects.filter(user_id=user.pk, idempotency_key=key).first()
+        if existing is not None:
+            return existing
+    try:
+        with transaction.atomic():
+            entry = _post(user, kind, points, description, key)
+    except IntegrityError:
+        # A concurrent retry with the same key committed first; ours rolled back
+        if key:
+            existing = RewardEntry.objects.filter(user_id=user.pk, idempotency_key=key).first()
+            if existing is not None:
+                return existing
+        raise
+    balance_changed.send(sender=RewardEntry, user_id=user.pk)
+    return entry
+
+
+def accrue(user, points, description='', key=None):
+    """Add ``points`` to ``user``'s balance. Returns the entry."""
+    if points <= 0:
+        raise RewardError("Accrued points must be positive.")
+    return _post_once(user, 'accrual', points, description, key)
+
+
+def redeem(user, points, description='', key=None):
+    """
+    Spend ``points`` of ``user``'s balance. Returns the entry, or raises
+    ``InsufficientPointsError`` (leaving the balance untouched).
+    """
+    if points <= 0:
+        raise RewardError("Redeemed points must be positive.")
+    return _post_once(user, 'redemption', -points, description, key)
+
+
+def get_balance(user):
+    return RewardBalance.objects.filter(pk=user.pk).values_list('points', flat=True).first() or 0
+
+
+def get_recent_entries(user, limit=RECENT_ENTRIES):
+    return list(RewardEntry.objects.filter(user=user).order_by('-created_at', '-id')[:limit])
+
+
+def get_leaderboard(user_type, limit=LEADERBOARD_SIZE):
+    """Top ``limit`` balances of one user type, read from the leaderboard index."""
+    return list(
+        RewardBalance.objects.filter(user_type=user_type, points__gt=0)
+        .select_related('user').order_by('-points', 'user')[:limit]
+    )
+
+
+def get_rank(user):
+    """1-based position of ``user`` on their leaderboard, or None without points."""
+    points = get_balance(user)
+    if points <= 0:
+        return None
+    return RewardBalance.objects.filter(user_type=user.user_type, points__gt=points).count() + 1
+
+
+def compact_entries(older_than=COMPACT_AFTER):
+    """
+    Replace each user's entries older than ``older_than`` with one snapshot
+    entry carrying their sum. Balances are unchanged. Returns the number of
+    entries removed.
+    """
+    cutoff = timezone.now() - older_than
+    user_ids = list(
+        RewardEntry.objects.filter(created_at__lt=cutoff).values('user')
+        .annotate(entries=Count('id')).filter(entries__gt=1).order_by('user').values_list('user', flat=True)
+    )
+    removed = 0
+    for offset in range(0, len(user_ids), COMPACT_CHUNK):
+        chunk = user_ids[offset:offset + COMPACT_CHUNK]
+        with transaction.atomic():
+            old = RewardEntry.objects.filter(user__in=chunk, created_at__lt=cutoff)
+            totals = list(old.values('user').annotate(total=Sum('points')).values_list('user', 'total'))
+            deleted, _ = old.delete()
+            RewardEntry.objects.bulk_create([
+                RewardEntry(user_id=user_id, kind='snapshot', points=points,
+                            description='Balance carried forward', created_at=cutoff)
+                for user_id, points in totals
+            ])
+        removed += deleted - len(totals)
+    return removed
+
+
+def rebuild_balances():
+    """Recompute every balance from the entries. Returns the number of balances."""
+    with transaction.atomic():
+        totals = dict(RewardEntry.objects.values('user').annotate(total=Sum('points')).values_list('user', 'total'))
+        user_types = dict(User.objects.filter(pk__in=totals).values_list('pk', 'user_type'))
+        RewardBalance.objects.all().delete()
+        RewardBalance.objects.bulk_create(
+            [RewardBalance(user_id=user_id, user_type=user_types[user_id], points=points)
+             for user_id, points in totals.items()],
+            batch_size=COMPACT_CHUNK,
+        )
+        FarmerStats.objects.update(reward_points=Coalesce(
+            Subquery(RewardBalance.objects.filter(user=OuterRef('farmer_id')).values('points')[:1]), 0,
+        ))
+    return len(totals)
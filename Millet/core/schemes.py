@@ -0,0 +1,195 @@
+"""
+Government scheme eligibility matching.
+
+``compile_eligibility`` turns a scheme's free-text eligibility into
+structured criteria over ``User`` fields:
+
+    {'user_types': ['farmer'], 'min_farm_size': None, 'max_farm_size': 4.94,
+     'regions': ['odisha']}
+
+Farm sizes are in acres (hectares in the text are converted). Matches are
+stored in ``SchemeMatch``, so a dashboard reads a user's schemes with one
+indexed query. ``match_all_schemes`` evaluates every scheme against every
+user as NumPy masks over column arrays of users; ``match_scheme`` recomputes
+one scheme's column after it changes and ``match_user`` one user's row.
+"""
+import re
+
+from django.db import transaction
+
+from accounts.models import User
+from .regions import normalize_region, region_parts
+from .models import GovernmentScheme, SchemeMatch
+
+DASHBOARD_SCHEMES = 5
+BATCH_SIZE = 5000
+ACRES_PER_HECTARE = 2.471
+# "Small and marginal farmers" hold up to 2 hectares
+SMALL_FARMER_ACRES = 2 * ACRES_PER_HECTARE
+
+STATES = [
+    'andhra pradesh', 'arunachal pradesh', 'assam', 'bihar', 'chhattisgarh', 'goa', 'gujarat', 'haryana',
+    'himachal pradesh', 'jharkhand', 'karnataka', 'kerala', 'madhya pradesh', 'maharashtra', 'manipur',
+    'meghalaya', 'mizoram', 'nagaland', 'odisha', 'punjab', 'rajasthan', 'sikkim', 'tamil nadu', 'telangana',
+    'tripura', 'uttar pradesh', 'uttarakhand', 'west bengal', 'andaman and nicobar islands', 'chandigarh',
+    'dadra and nagar haveli and daman and diu', 'delhi', 'jammu and kashmir', 'ladakh', 'lakshadweep',
+    'puducherry',
+]
+STATE_ALIASES = {'orissa': 'odisha', 'pondicherry': 'puducherry', 'new delhi': 'delhi', 'j&k': 'jammu and kashmir'}
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+UNIT = r'\s*(hectares?|ha|acres?)\b'
+MAX_SIZE_RE = re.compile(r'(?:up ?to|below|less than|under|not more than|maximum of|at most)\s*' + NUMBER + UNIT)
+MIN_SIZE_RE = re.compile(r'(?:at least|above|more than|over|minimum of|not less than)\s*' + NUMBER + UNIT)
+RANGE_RE = re.compile(NUMBER + r'\s*(?:-|to)\s*' + NUMBER + UNIT)
+SMALL_FARMER_RE = re.compile(r'\b(?:small|marginal)\b')
+CONSUMER_RE = re.compile(r'\b(?:consumers?|citizens?|everyone|all residents)\b')
+
+
+def _acres(value, unit):
+    value = float(value)
+    return value * ACRES_PER_HECTARE if unit.startswith('h') else value
+
+
+def compile_eligibility(text):
+    """Structured criteria for a free-text eligibility statement."""
+    text = (text or '').lower()
+    min_size = max_size = None
+    for match in RANGE_RE.finditer(text):
+        min_size, max_size = _acres(match.group(1), match.group(3)), _acres(match.group(2), match.group(3))
+    for match in MAX_SIZE_RE.finditer(text):
+        max_size = _acres(*match.groups())
+    for match in MIN_SIZE_RE.finditer(text):
+        min_size = _acres(*match.groups())
+    if max_size is None and SMALL_FARMER_RE.search(text):
+        max_size = SMALL_FARMER_ACRES
+
+    words = f' {normalize_region(text.replace(",", " "))} '
+    regions = {state for state in STATES if f' {state} ' in words}
+    regions.update(state for alias, state in STATE_ALIASES.items() if f' {alias} ' in f' {text} ')
+
+    return {
+        'user_types': ['farmer', 'consumer'] if CONSUMER_RE.search(text) else ['farmer'],
+        'min_farm_size': round(min_size, 3) if min_size is not None else None,
+        'max_farm_size': round(max_size, 3) if max_size is not None else None,
+        'regions': sorted(regions),
+    }
+
+
+def state_of(location):
+    """The state named in a farm location, or '' when none is recognised."""
+    for part in reversed(region_parts(location)):
+        part = STATE_ALIASES.get(part, part)
+        if part in STATES:
+            return part
+    return ''
+
+
+def matches(criteria, user_type, farm_size, state):
+    """Evaluate criteria for one user (the scalar form of ``_mask``)."""
+    if user_type not in criteria.get('user_types', ['farmer']):
+        return False
+    low, high = criteria.get('min_farm_size'), criteria.get('max_farm_size')
+    if (low is not None or high is not None) and farm_size is None:
+        return False
+    if low is not None and farm_size < low:
+        return False
+    if high is not None and farm_size > high:
+        return False
+    regions = criteria.get('regions')
+    return not regions or state in regions
+
+
+def _user_columns(user_types):
+    import numpy as np
+
+    rows = list(
+        User.objects.filter(user_type__in=user_types).order_by('pk')
+        .values_list('pk', 'user_type', 'farm_size', 'farm_location')
+    )
+    return {
+        'ids': np.array([row[0] for row in rows], dtype=np.int64),
+        'types': np.array([row[1] for row in rows], dtype=object),
+        'sizes': np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=float),
+        'states': np.array([state_of(row[3]) for row in rows], dtype=object),
+    }
+
+
+def _mask(criteria, columns):
+    """Boolean mask of the users in ``columns`` that meet ``criteria``."""
+    import numpy as np
+
+    mask = np.isin(columns['types'], criteria.get('user_types', ['farmer']))
+    sizes = columns['sizes']
+    low, high = criteria.get('min_farm_size'), criteria.get('max_farm_size')
+    # Comparisons with NaN are False, so unknown sizes fail any size bound
+    if low is not None:
+        mask &= sizes >= low
+    if high is not None:
+        mask &= sizes <= high
+    if criteria.get('regions'):
+        mask &= np.isin(columns['states'], criteria['regions'])
+    return mask
+
+
+def _store(scheme_ids, columns, masks):
+    with transaction.atomic():
+        SchemeMatch.objects.filter(scheme__in=scheme_ids).delete()
+        rows = (
+            SchemeMatch(scheme_id=scheme_id, user_id=int(user_id))
+            for scheme_id, mask in zip(scheme_ids, masks)
+            for user_id in columns['ids'][mask]
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                SchemeMatch.objects.bulk_create(batch)
+                batch = []
+        SchemeMatch.objects.bulk_create(batch)
+
+
+def match_all_schemes(recompile=False):
+    """
+    Evaluate every scheme against every user and replace all stored matches.
+
+    With ``recompile`` the criteria are first rebuilt from the eligibility
+    text (needed for schemes saved before criteria existed).
+    """
+    schemes = list(GovernmentScheme.objects.only('id', 'eligibility', 'criteria'))
+    if recompile:
+        for scheme in schemes:
+            scheme.criteria = compile_eligibility(scheme.eligibility)
+        GovernmentScheme.objects.bulk_update(schemes, ['criteria'], batch_size=500)
+    user_types = {user_type for scheme in schemes for user_type in scheme.criteria.get('user_types', ['farmer'])}
+    columns = _user_columns(user_types or ['farmer'])
+    masks = [_mask(scheme.criteria, columns) for scheme in schemes]
+    SchemeMatch.objects.exclude(scheme__in=[scheme.pk for scheme in schemes]).delete()
+    _store([scheme.pk for scheme in schemes], columns, masks)
+    return int(sum(mask.sum() for mask in masks))
+
+
+def match_scheme(scheme):
+    """Recompute one scheme's matches (its column) after it changed."""
+    columns = _user_columns(scheme.criteria.get('user_types', ['farmer']))
+    mask = _mask(scheme.criteria, columns)
+    _store([scheme.pk], columns, [mask])
+    return int(mask.sum())
+
+
+def match_user(user):
+    """Recompute one user's matches (their row) after their profile changed."""
+    state = state_of(user.farm_location)
+    matched = [
+        SchemeMatch(scheme_id=pk, user_id=user.pk)
+        for pk, criteria in GovernmentScheme.objects.values_list('pk', 'criteria')
+        if matches(criteria, user.user_type, user.farm_size, state)
+    ]
+    with transaction.atomic():
+        SchemeMatch.objects.filter(user=user).delete()
+        SchemeMatch.objects.bulk_create(matched)
+    return len(matched)
+
+
+def get_matched_schemes(user, limit=DASHBOARD_SCHEMES):
+    return list(GovernmentScheme.objects.filter(matches__user=user).order_by('-created_at', '-id')[:limit])
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from farmer.models import Product
+from . import tasks
+from .alerts import prepare_alert
+from .images import is_source
+from .models import GovernmentScheme, WeatherAlert
+from .schemes import compile_eligibility
+
+REGION_FIELDS = {'farm_location', 'user_type'}
+ELIGIBILITY_FIELDS = REGION_FIELDS | {'farm_size'}
+IMAGE_FIELDS = {Product: 'image', User: 'profile_picture'}
+
+
+@receiver(pre_save, sender=WeatherAlert)
+def normalize_alert(sender, instance, raw=False, **kwargs):
+    if not raw:
+        prepare_alert(instance)
+
+
+@receiver(post_save, sender=WeatherAlert)
+def deliver_alert(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tasks.deliver_alert.delay(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_farmer_regions(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins save last_login only; skip saves that cannot move the farm
+    if raw or (update_fields is not None and not REGION_FIELDS & set(update_fields)):
+        return
+    # After commit, so registration does not wait on the region map
+    tasks.refresh_farmer_regions.delay([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def update_scheme_matches(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not ELIGIBILITY_FIELDS & set(update_fields)):
+        return
+    tasks.match_user.delay(instance.pk)
+
+
+@receiver(pre_save, sender=GovernmentScheme)
+def compile_scheme(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.criteria = compile_eligibility(instance.eligibility)
+
+
+@receiver(post_save, sender=GovernmentScheme)
+def rematch_scheme(sender, instance, raw=False, **kwargs):
+    # Only this scheme's column of the match table changes
+    if not raw:
+        tasks.rematch_scheme.delay(instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=User)
+def note_image_upload(sender, instance, raw=False, **kwargs):
+    # The upload is written to storage later in save(); until then it is uncommitted
+    image = getattr(instance, IMAGE_FIELDS[sender])
+    instance._image_uploaded = not raw and bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=User)
+def queue_image_variants(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        source = getattr(instance, IMAGE_FIELDS[sender]).name
+        if is_source(source):
+            tasks.generate_image_variants.delay(source)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=User)
+def remove_image_variants(sender, instance, **kwargs):
+    source = getattr(instance, IMAGE_FIELDS[sender]).name
+    if is_source(source):
+        tasks.delete_image_variants.delay([source])
@@ -0,0 +1,53 @@
+from accounts.models import User
+from core.background import task
+
+from . import alerts, images, rewards, schemes
+from .models import GovernmentScheme, WeatherAlert
+
+
+@task(queue='images', max_retries=2)
+def generate_image_variants(source):
+    images.ensure_variants(source)
+
+
+@task(queue='images')
+def delete_image_variants(sources):
+    return images.delete_variants(sources)
+
+
+@task(max_retries=3)
+def deliver_alert(alert_id):
+    alert = WeatherAlert.objects.filter(pk=alert_id).first()
+    return alerts.fan_out(alert) if alert else 0
+
+
+@task(max_retries=3)
+def refresh_farmer_regions(farmer_ids):
+    return alerts.refresh_farmer_regions(farmer_ids)
+
+
+@task()
+def purge_expired_alerts():
+    return alerts.purge_expired_alerts()
+
+
+@task(queue='bulk', max_retries=2)
+def rematch_scheme(scheme_id):
+    scheme = GovernmentScheme.objects.filter(pk=scheme_id).first()
+    return schemes.match_scheme(scheme) if scheme else 0
+
+
+@task(max_retries=2)
+def match_user(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    return schemes.match_user(user) if user else 0
+
+
+@task(queue='bulk')
+def match_all_schemes(recompile=False):
+    return schemes.match_all_schemes(recompile=recompile)
+
+
+@task(queue='bulk')
+def compact_reward_entries():
+    return rewards.compact_entries()
@@ -0,0 +1,14 @@
+from django import template
+
+from core.images import DEFAULT_FORMAT, variant_url as _variant_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def variant_url(image, size, format=DEFAULT_FORMAT):
+    """
+    URL of ``image`` (an ImageField value or a storage name) resized to
+    ``size``, e.g. ``{% variant_url product.image 'card' 'webp' %}``.
+    """
+    return _variant_url(getattr(image, 'name', image) or '', size, format)
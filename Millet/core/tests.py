@@ -1,3 +1,463 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from consumer.models import ConsumerReward
+from farmer.models import FarmerReward, FarmerStats, Product
+from farmer.stats import rebuild_farmer_stats
+from PIL import Image
+from . import benchmarks, caching, rewards
+from .background import rate_interval, task
+from .alerts import fan_out, get_active_alerts, ingest_alerts, purge_expired_alerts
+from .images import variant_url
+from .instrumentation import QueryRecorder, registry
+from .models import (
+    FarmerAlert, FarmerRegion, GovernmentScheme, ImageVariant, RewardBalance, RewardEntry, SchemeMatch, WeatherAlert,
+)
+from .regions import normalize_region, region_keys
+from .schemes import compile_eligibility, get_matched_schemes, match_all_schemes
+
+
+@override_settings(TASK_BACKEND='eager')
+class WeatherAlertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = lambda name, location: User.objects.create_user(
+            username=name, password='pass12345', user_type='farmer', farm_location=location)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.mandya = farmer('mandya', 'Mandya,  KARNATAKA')
+            cls.tumkur = farmer('tumkur', 'Tumkur, Karnataka')
+            cls.jaipur = farmer('jaipur', 'Jaipur, Rajasthan')
+
+    def test_region_keys(self):
+        self.assertEqual(normalize_region(' Mandya ,KARNATAKA. '), 'mandya, karnataka')
+        self.assertEqual(region_keys('Mandya, Karnataka'), {'mandya', 'karnataka', 'mandya, karnataka'})
+        self.assertEqual(set(FarmerRegion.objects.filter(farmer=self.mandya).values_list('region_key', flat=True)),
+                         {'mandya', 'karnataka', 'mandya, karnataka'})
+
+    def test_fan_out_skips_delivered_farmers(self):
+        alerts, delivered = ingest_alerts([
+            {'region': 'Karnataka', 'alert_type': 'Heavy Rain', 'description': 'Heavy rain expected.', 'severity': 'high'},
+            {'region': 'mandya', 'alert_type': 'Heat', 'description': 'Hot afternoons.'},
+        ])
+        self.assertEqual(delivered, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(fan_out(alerts[0]), 0)  # already delivered
+        self.assertEqual([a.alert_type for a in get_active_alerts(self.mandya)], ['Heat', 'Heavy Rain'])
+        self.assertEqual(get_active_alerts(self.jaipur), [])
+
+    def test_saved_alert_and_new_farmer_get_delivered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WeatherAlert.objects.create(region='Rajasthan', alert_type='Dust Storm', description='Strong winds.')
+        self.assertEqual(FarmerAlert.objects.filter(farmer=self.jaipur).count(), 1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            late = User.objects.create_user(username='late', password='x', user_type='farmer',
+                                            farm_location='Ajmer, Rajasthan')
+        # Nothing runs inside the registration transaction
+        self.assertFalse(FarmerRegion.objects.filter(farmer=late).exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(get_active_alerts(late)), 1)
+        # Moving the farm changes which alerts arrive next
+        late.farm_location = 'Mysore, Karnataka'
+        with self.captureOnCommitCallbacks(execute=True):
+            late.save()
+        self.assertEqual(list(FarmerRegion.objects.filter(farmer=late, region_key='karnataka').values_list('farmer', flat=True)), [late.pk])
+
+    def test_expired_alerts_are_hidden_and_purged(self):
+        past = timezone.now() - datetime.timedelta(days=3)
+        ingest_alerts([{'region': 'Karnataka', 'alert_type': 'Frost', 'description': 'x',
+                        'expires_at': past + datetime.timedelta(hours=1)}])
+        self.assertEqual(get_active_alerts(self.tumkur), [])
+        self.assertEqual(purge_expired_alerts(), 2)
+
+    def test_dashboard_shows_alerts(self):
+        ingest_alerts([{'region': 'Karnataka', 'alert_type': 'Heavy Rain', 'description': 'Heavy rain expected.'}])
+        self.client.force_login(self.tumkur)
+        response = self.client.get(reverse('farmer_dashboard'))
+        self.assertContains(response, 'Heavy rain expected.')
+
+
+@override_settings(TASK_BACKEND='eager')
+class SchemeMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farmer = lambda name, location, size: User.objects.create_user(
+            username=name, password='pass12345', user_type='farmer', farm_location=location, farm_size=size)
+        cls.small = farmer('small', 'Koraput, Odisha', 3)
+        cls.large = farmer('large', 'Mandya, Karnataka', 20)
+        cls.unknown = farmer('unknown', 'Jaipur, Rajasthan', None)
+        cls.consumer = User.objects.create_user(username='consumer', password='x', user_type='consumer')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.all_farmers = GovernmentScheme.objects.create(
+                title='PM-KISAN', description='Income support.', eligibility='All landholding farmer families.')
+            cls.marginal = GovernmentScheme.objects.create(
+                title='Odisha Millet Mission', description='Input support.',
+                eligibility='Small and marginal farmers in Odisha.')
+            cls.big = GovernmentScheme.objects.create(
+                title='Mechanisation', description='Tractor subsidy.', eligibility='Farmers with at least 5 hectares.')
+
+    def test_compile_eligibility(self):
+        self.assertEqual(compile_eligibility('Farmers holding up to 2 hectares in Tamil Nadu or Orissa'), {
+            'user_types': ['farmer'], 'min_farm_size': None, 'max_farm_size': 4.942, 'regions': ['odisha', 'tamil nadu'],
+        })
+        self.assertEqual(compile_eligibility('Farmers with 2-10 acres')['min_farm_size'], 2.0)
+        self.assertEqual(compile_eligibility('Open to all citizens')['user_types'], ['farmer', 'consumer'])
+
+    def test_matches_are_precomputed(self):
+        self.assertEqual(get_matched_schemes(self.small), [self.marginal, self.all_farmers])
+        self.assertEqual(get_matched_schemes(self.large), [self.big, self.all_farmers])
+        self.assertEqual(get_matched_schemes(self.unknown), [self.all_farmers])
+        self.assertEqual(get_matched_schemes(self.consumer), [])
+        with self.assertNumQueries(1):
+            get_matched_schemes(self.small)
+        # The full vectorised job agrees with the incremental updates
+        before = set(SchemeMatch.objects.values_list('user', 'scheme'))
+        self.assertEqual(match_all_schemes(recompile=True), len(before))
+        self.assertEqual(set(SchemeMatch.objects.values_list('user', 'scheme')), before)
+
+    def test_changes_rematch_one_column_or_row(self):
+        self.marginal.eligibility = 'Farmers in Odisha or Karnataka.'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marginal.save()
+        self.assertIn(self.marginal, get_matched_schemes(self.large))
+        self.assertEqual(SchemeMatch.objects.filter(scheme=self.big).count(), 1)
+        self.unknown.farm_size = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unknown.save()
+        self.assertIn(self.big, get_matched_schemes(self.unknown))
+
+
+class RewardLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmers = [User.objects.create_user(username=f'farmer{i}', password='x', user_type='farmer') for i in range(3)]
+        cls.consumer = User.objects.create_user(username='buyer', password='x', user_type='consumer')
+
+    def test_accrual_and_redemption_are_idempotent(self):
+        farmer = self.farmers[0]
+        first = rewards.accrue(farmer, 50, 'Verified listing', key='listing')
+        self.assertEqual(rewards.accrue(farmer, 50, 'Verified listing', key='listing'), first)
+        rewards.redeem(farmer, 20, 'Seed voucher', key='voucher-1')
+        rewards.redeem(farmer, 20, 'Seed voucher', key='voucher-1')
+        self.assertEqual(rewards.get_balance(farmer), 30)
+        with self.assertRaises(rewards.InsufficientPointsError):
+            rewards.redeem(farmer, 31, key='voucher-2')
+        self.assertEqual(rewards.get_balance(farmer), 30)
+        self.assertEqual(list(RewardEntry.objects.filter(user=farmer).values_list('points', flat=True).order_by('pk')), [50, -20])
+        with self.assertNumQueries(1):
+            self.assertEqual(rewards.get_balance(farmer), 30)
+
+    def test_farmer_stats_follow_the_balance(self):
+        farmer = self.farmers[2]
+        rewards.accrue(farmer, 40, key='harvest')
+        rewards.redeem(farmer, 15, key='voucher')
+        with self.assertRaises(rewards.InsufficientPointsError):
+            rewards.redeem(farmer, 100)
+        self.assertEqual(FarmerStats.objects.get(farmer=farmer).reward_points, 25)
+        FarmerStats.objects.filter(farmer=farmer).update(reward_points=0)
+        rebuild_farmer_stats()
+        self.assertEqual(FarmerStats.objects.get(farmer=farmer).reward_points, 25)
+
+    def test_reward_rows_feed_the_ledger(self):
+        FarmerReward.objects.create(farmer=self.farmers[1], points=25, description='Training attended')
+        ConsumerReward.objects.create(consumer=self.consumer, points=10, description='Signup')
+        self.assertEqual(rewards.get_balance(self.farmers[1]), 25)
+        self.assertEqual(RewardBalance.objects.get(user=self.consumer).user_type, 'consumer')
+
+    def test_leaderboard_and_rank(self):
+        for farmer, points in zip(self.farmers, [10, 40, 25]):
+            rewards.accrue(farmer, points)
+        rewards.accrue(self.consumer, 100)
+        with self.assertNumQueries(1):
+            board = rewards.get_leaderboard('farmer')
+        self.assertEqual([(b.user, b.points) for b in board], [(self.farmers[1], 40), (self.farmers[2], 25), (self.farmers[0], 10)])
+        self.assertEqual(rewards.get_rank(self.farmers[2]), 2)
+        self.assertEqual(rewards.get_rank(self.consumer), 1)
+
+        self.client.force_login(self.farmers[2])
+        response = self.client.get(reverse('farmer_rewards'))
+        self.assertEqual((response.context['reward_points'], response.context['rank']), (25, 2))
+
+    def test_compaction_keeps_balances(self):
+        farmer = self.farmers[0]
+        for points in (5, 10, 15):
+            rewards.accrue(farmer, points)
+        rewards.redeem(farmer, 8)
+        RewardEntry.objects.update(created_at=timezone.now() - datetime.timedelta(days=400))
+        rewards.accrue(farmer, 1)
+        self.assertEqual(rewards.compact_entries(), 3)
+        self.assertEqual(
+            sorted(RewardEntry.objects.filter(user=farmer).values_list('kind', 'points')),
+            [('accrual', 1), ('snapshot', 22)],
+        )
+        self.assertEqual(rewards.get_balance(farmer), 23)
+        rewards.rebuild_balances()
+        self.assertEqual(rewards.get_balance(farmer), 23)
+
+
+def image_bytes(size=(800, 600), mode='RGBA', format='PNG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 120, 40, 255)[:len(mode)]).save(buffer, format)
+    return buffer.getvalue()
+
+
+@override_settings(TASK_BACKEND='eager')
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='grower', password='pass12345', user_type='farmer')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def test_upload_generates_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                farmer=self.farmer, name='Ragi', description='Finger millet', price=80, category='grains',
+                image=SimpleUploadedFile('ragi.png', image_bytes(), content_type='image/png'))
+        variants = {(v.size, v.format): v for v in ImageVariant.objects.filter(source=product.image.name)}
+        self.assertEqual(len(variants), 6)
+        self.assertEqual((variants['card', 'jpeg'].width, variants['card', 'jpeg'].height), (400, 300))
+        self.assertEqual((variants['thumbnail', 'webp'].width, variants['thumbnail', 'webp'].height), (150, 150))
+        # Never enlarged past the source
+        self.assertEqual((variants['detail', 'jpeg'].width, variants['detail', 'jpeg'].height), (800, 600))
+        with default_storage.open(variants['card', 'webp'].path) as handle:
+            self.assertEqual(Image.open(handle).format, 'WEBP')
+
+        with self.assertNumQueries(0):
+            html = Template("{% load images %}{% variant_url product.image 'card' 'webp' %}").render(
+                Context({'product': product}))
+        self.assertEqual(html, default_storage.url(variants['card', 'webp'].path))
+
+        # Unrelated saves do not regenerate anything
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock_quantity = 5
+            product.save()
+        self.assertEqual(ImageVariant.objects.count(), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse(ImageVariant.objects.exists())
+        self.assertFalse(default_storage.exists(variants['card', 'webp'].path))
+
+    def test_missing_variant_is_generated_on_first_request(self):
+        source = default_storage.save('products/jowar.jpg', ContentFile(image_bytes((300, 900), 'RGB', 'JPEG')))
+        url = variant_url(source, 'card')
+        self.assertEqual(url, reverse('image_variant', args=['card', 'jpeg', source]))
+
+        response = self.client.get(url)
+        variant = ImageVariant.objects.get(source=source)
+        self.assertRedirects(response, default_storage.url(variant.path), fetch_redirect_response=False)
+        self.assertEqual((variant.size, variant.format), ('card', 'jpeg'))
+        # A 300px wide source gives a smaller card with the same 4:3 shape
+        self.assertEqual((variant.width, variant.height), (300, 225))
+        self.assertEqual(variant_url(source, 'card'), default_storage.url(variant.path))
+
+        # Served from the table on later requests
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.assertEqual(ImageVariant.objects.count(), 1)
+
+    def test_rejects_unknown_variants_and_paths(self):
+        default_storage.save('products/bajra.png', ContentFile(image_bytes()))
+        for args in (['huge', 'jpeg', 'products/bajra.png'], ['card', 'gif', 'products/bajra.png'],
+                     ['card', 'jpeg', 'products/../../settings.py'], ['card', 'jpeg', 'products/missing.png']):
+            self.assertEqual(self.client.get(reverse('image_variant', args=args)).status_code, 404)
+        self.assertFalse(ImageVariant.objects.exists())
+
+
+calls = []
+finished = threading.Event()
+
+
+@task()
+def record(value):
+    calls.append(value)
+
+
+@task(max_retries=2, retry_backoff=0)
+def flaky(value):
+    calls.append(value)
+    if len(calls) < 3:
+        raise RuntimeError('temporary failure')
+    finished.set()
+
+
+class BackgroundTaskTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        finished.clear()
+
+    @override_settings(TASK_BACKEND='eager')
+    def test_delay_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            record.delay('queued')
+            self.assertEqual(calls, [])
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(calls, ['queued'])
+        # Calling a task directly just runs it
+        record('direct')
+        self.assertEqual(calls, ['queued', 'direct'])
+
+    @override_settings(TASK_BACKEND='local', TASK_QUEUES={'default': 1})
+    def test_local_backend_retries_failed_jobs(self):
+        with self.assertLogs('core.background', 'WARNING') as logs:
+            flaky.apply_async(['try'])
+            self.assertTrue(finished.wait(5))
+        self.assertEqual(calls, ['try'] * 3)
+        self.assertEqual(len(logs.records), 2)
+
+    def test_options_from_settings(self):
+        self.assertEqual(rate_interval('30/m'), 2)
+        self.assertEqual(rate_interval('10/s'), 0.1)
+        self.assertEqual(rate_interval(None), 0)
+        self.assertEqual(flaky.options['max_retries'], 2)
+        with self.settings(TASK_OPTIONS={flaky.name: {'queue': 'bulk', 'rate_limit': '5/s'}}):
+            self.assertEqual((flaky.options['queue'], flaky.options['rate_limit']), ('bulk', '5/s'))
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='ops', password='x', is_staff=True)
+
+    def setUp(self):
+        registry.reset()
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.client.get('/no-such-page/')
+        views = {view['name']: view for view in registry.snapshot()['views']}
+        self.assertEqual(views['home']['requests'], 2)
+        self.assertEqual(views['<unresolved>']['requests'], 1)
+
+    def test_repeated_statements_are_flagged(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for user_id in range(5):
+                list(User.objects.filter(pk=user_id))
+            list(User.objects.filter(pk__in=[1, 2, 3]))
+            list(User.objects.filter(pk__in=[4, 5]))
+        self.assertEqual(recorder.count, 7)
+        self.assertEqual([count for _, count in recorder.duplicates()], [5])
+        registry.record('product_list', 0.01, 200, recorder)
+        self.assertEqual(registry.snapshot()['suspects'][0]['count'], 5)
+
+    @override_settings(INSTRUMENTATION_PROFILE={'home': 1.0})
+    def test_sampled_views_are_profiled(self):
+        self.client.get(reverse('home'))
+        profiles = registry.snapshot()['profiles']
+        self.assertEqual([profile['view'] for profile in profiles], ['home'])
+        self.assertIn('cumulative', profiles[0]['stats'])
+
+    @override_settings(INSTRUMENTATION_METRICS_TOKEN='scrape')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('shreeanna_view_latency_seconds_bucket{view="home",le="+Inf"} 1', response.content.decode())
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+        self.assertContains(self.client.get(reverse('instrumentation_stats')), 'home')
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_one_caller_computes_a_missing_entry(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(caching.get_or_compute('k', compute, 60)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['page'] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_entry_is_served_while_another_caller_refreshes(self):
+        cache.set('k', (time.time() - 1, 'old'))
+        cache.add(caching.LOCK_KEY.format('k'), 1)
+        self.assertEqual(caching.get_or_compute('k', lambda: 'new', 60), 'old')
+        cache.delete(caching.LOCK_KEY.format('k'))
+        self.assertEqual(caching.get_or_compute('k', lambda: 'new', 60), 'new')
+        self.assertEqual(caching.get_or_compute('k', lambda: 'newer', 60), 'new')
+
+    def test_waiters_compute_themselves_when_the_lock_holder_is_gone(self):
+        cache.add(caching.LOCK_KEY.format('k'), 1)
+        with mock.patch.object(caching, 'LOCK_WAIT', 0.1):
+            self.assertEqual(caching.get_or_compute('k', lambda: 'page', 60), 'page')
+        self.assertIsNone(caching.get_or_compute('none', lambda: None, 60))
+        self.assertIsNone(cache.get('none'))
+
+    def test_catalog_version_changes_with_products(self):
+        version = caching.catalog_version()
+        farmer = User.objects.create_user(username='grower', password='x', user_type='farmer')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(farmer=farmer, name='Ragi', description='x', price=40, category='grain')
+        self.assertNotEqual(caching.catalog_version(), version)
+
+    def test_home_is_cached_for_anonymous_visitors(self):
+        first = self.client.get(reverse('home'))
+        self.assertIn('public', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse('home'))
+        self.assertEqual(again.content, first.content)
+        unchanged = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b'')
+
+        user = User.objects.create_user(username='buyer', password='x', user_type='consumer')
+        self.client.force_login(user)
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Logout')
+
+
+class BenchmarkTests(TestCase):
+    def test_synthetic_data_and_scenarios(self):
+        rows = benchmarks.generate_data(seed=1, farmers=3, products_per_farmer=4, consumers=5)
+        self.assertEqual((rows['farmers'], rows['products'], rows['consumers']), (3, 12, 5))
+        self.assertEqual(User.objects.filter(username__startswith='bench-').count(), 8)
+        scenario = next(scenario for scenario in benchmarks.SCENARIOS if scenario.name == 'cart')
+        result = benchmarks.run_scenario(scenario, requests=3)
+        self.assertEqual(result['requests'], 3)
+        self.assertGreater(result['mean_queries'], 0)
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_compare_flags_growth(self):
+        baseline = {'results': {'cart': {'p50_ms': 10, 'p95_ms': 20, 'mean_queries': 4, 'peak_memory_kb': 100}}}
+        current = {'results': {'cart': {'p50_ms': 11, 'p95_ms': 20, 'mean_queries': 9, 'peak_memory_kb': 100}}}
+        self.assertEqual(benchmarks.compare(baseline, current), [('cart', 'mean_queries', 4, 9)])
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('images/<slug:size>/<slug:format>/<path:source>', views.image_variant, name='image_variant'),
+]
@@ -1,3 +1,38 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect, render
+
+from .images import FORMATS, VARIANTS, ensure_variants, is_source
+from .instrumentation import DUPLICATE_THRESHOLD, registry
+
+
+def image_variant(request, size, format, source):
+    """Serve a resized image, generating it on the first request for it."""
+    if size not in VARIANTS or format not in FORMATS or not is_source(source):
+        raise Http404("Unknown image variant")
+    if not default_storage.exists(source):
+        raise Http404("Image not found")
+    variant = ensure_variants(source, [(size, format)])[size, format]
+    return redirect(default_storage.url(variant.path))
+
+
+@staff_member_required
+def instrumentation_stats(request):
+    """Per-view latency, query counts, N+1 suspects and profiles of this process."""
+    context = registry.snapshot()
+    context['duplicate_threshold'] = DUPLICATE_THRESHOLD
+    return render(request, 'core/instrumentation.html', context)
+
+
+def metrics(request):
+    """The same metrics in the Prometheus text format, for staff or the scrape token."""
+    token = getattr(settings, 'INSTRUMENTATION_METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    authorized = token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
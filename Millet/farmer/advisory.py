@@ -0,0 +1,170 @@
+"""
+Crop advisory rule engine.
+
+Active ``AdvisoryRule`` rows are compiled into a ``RuleIndex``: a dict keyed
+by each rule's (millet_type, region, soil_type, season), blanks standing for
+"any". Looking up a farmer's situation probes the combinations of its values
+and wildcards, so the cost does not grow with the size of the rule base.
+
+The compiled index is held per process and rebuilt when the rules version in
+the cache changes. Saving or deleting a rule bumps the version (see
+farmer.signals), so every process picks up edits on its next lookup.
+"""
+import threading
+from collections import defaultdict
+from itertools import product as mask_product
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from core.caching import bump_version, cache_version
+from .models import AdvisoryRule, CropAdvisory, Product
+from .pricing import ANY, millet_type, region_of
+
+RULES_VERSION_KEY = 'advisory-rules-version'
+FARMER_CHUNK = 1000
+SOIL_TYPES = ['alluvial', 'black', 'clay', 'laterite', 'loamy', 'red', 'sandy']
+
+SEASONS_BY_MONTH = {
+    1: 'rabi', 2: 'rabi', 3: 'zaid', 4: 'zaid', 5: 'zaid', 6: 'kharif',
+    7: 'kharif', 8: 'kharif', 9: 'kharif', 10: 'kharif', 11: 'rabi', 12: 'rabi',
+}
+
+
+def season_for(date=None):
+    return SEASONS_BY_MONTH[(date or timezone.localdate()).month]
+
+
+def _normalize(value):
+    value = (value or '').strip().lower()
+    return '' if value == ANY else value
+
+
+class RuleIndex:
+    """Rules grouped by their exact conditions, with lookups memoised per situation."""
+
+    def __init__(self, rules):
+        self.rules = defaultdict(list)
+        for millet, region, soil_type, season, priority, advice in rules:
+            key = (millet, _normalize(region), _normalize(soil_type), season)
+            self.rules[key].append((priority, advice))
+        self._memo = {}
+
+    def __len__(self):
+        return sum(len(rules) for rules in self.rules.values())
+
+    def lookup(self, millet, region, soil_type, season):
+        """Advice for one situation, most specific rules first, then by priority."""
+        key = (millet or '', _normalize(region), _normalize(soil_type), season or '')
+        if key not in self._memo:
+            probes = {
+                tuple(value if keep else '' for value, keep in zip(key, mask))
+                for mask in mask_product((True, False), repeat=4)
+            }
+            matches = []
+            for probe in probes:
+                specificity = sum(1 for value in probe if value)
+                for priority, advice in self.rules.get(probe, ()):
+                    matches.append((-specificity, -priority, advice))
+            self._memo[key] = list(dict.fromkeys(advice for *_, advice in sorted(matches)))
+        return self._memo[key]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def invalidate_rules():
+    bump_version(RULES_VERSION_KEY)
+
+
+def compile_rules():
+    return RuleIndex(
+        AdvisoryRule.objects.filter(is_active=True)
+        .values_list('millet_type', 'region', 'soil_type', 'season', 'priority', 'advice')
+    )
+
+
+def get_rule_index():
+    """The compiled rule index, recompiled if the rules changed since it was built."""
+    global _index, _index_version
+    version = cache_version(RULES_VERSION_KEY)
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = compile_rules()
+                _index_version = version
+    return _index
+
+
+def generate_advisories(season=None, region=None, farmers=None, soil_type=None):
+    """
+    Write this season's advisories for many farmers in one pass.
+
+    Covers every farmer (or ``farmers``, a User queryset), optionally only
+    those whose farm is in ``region``. Each farmer gets one advisory per
+    millet they sell, replacing their rows for the season. The soil type is
+    ``soil_type`` if given, else the one the farmer last reported. Work is
+    done in chunks with a fixed number of queries per chunk. Returns the
+    number of advisories written.
+    """
+    season = season or season_for()
+    region = _normalize(region)
+    index = get_rule_index()
+    if farmers is None:
+        farmers = User.objects.filter(user_type='farmer')
+    if region:
+        # Coarse filter in SQL; region_of below decides exactly
+        farmers = farmers.filter(farm_location__iendswith=region)
+    farmers = list(farmers.order_by('pk').values_list('pk', 'farm_location'))
+
+    written = 0
+    for offset in range(0, len(farmers), FARMER_CHUNK):
+        chunk = [
+            (farmer_id, _normalize(region_of(location)))
+            for farmer_id, location in farmers[offset:offset + FARMER_CHUNK]
+        ]
+        chunk = [(farmer_id, farm_region) for farmer_id, farm_region in chunk if not region or farm_region == region]
+        ids = [farmer_id for farmer_id, _ in chunk]
+
+        millets = defaultdict(set)
+        for farmer_id, name, description in Product.objects.filter(farmer__in=ids).values_list(
+                'farmer', 'name', 'description'):
+            millets[farmer_id].add(millet_type(name, description))
+        soils = {}
+        if soil_type is None:
+            reported = (
+                CropAdvisory.objects.filter(farmer__in=ids).exclude(soil_type='')
+                .order_by('farmer', '-created_at', '-pk').values_list('farmer', 'soil_type')
+            )
+            for farmer_id, soil in reported:
+                soils.setdefault(farmer_id, soil)
+
+        advisories = []
+        for farmer_id, farm_region in chunk:
+            soil = soil_type if soil_type is not None else soils.get(farmer_id, '')
+            for millet in sorted(millets[farmer_id] or {'other'}):
+                advice = index.lookup(millet, farm_region, soil, season)
+                if advice:
+                    advisories.append(CropAdvisory(
+                        farmer_id=farmer_id, millet_type=millet, region=farm_region, soil_type=soil,
+                        season=season, advisory_text='\n'.join(advice),
+                    ))
+        with transaction.atomic():
+            CropAdvisory.objects.filter(farmer__in=ids, season=season).delete()
+            CropAdvisory.objects.bulk_create(advisories, batch_size=1000)
+        written += len(advisories)
+    return written
+
+
+def get_advisories(farmer, season=None):
+    """The farmer's advisories for ``season``, generated on the spot if they have none yet."""
+    season = season or season_for()
+    advisories = list(CropAdvisory.objects.filter(farmer=farmer, season=season).order_by('millet_type'))
+    if not advisories:
+        # New farmers get advice straight away instead of waiting for the batch run
+        generate_advisories(season, farmers=User.objects.filter(pk=farmer.pk))
+        advisories = list(CropAdvisory.objects.filter(farmer=farmer, season=season).order_by('millet_type'))
+    return advisories
@@ -0,0 +1,227 @@
+"""
+Streaming product import and export.
+
+Uploads are read row by row (``csv.DictReader`` or one JSON object per line)
+and saved in chunks of ``CHUNK_SIZE``. Rows with a ``sku`` are upserted on
+the (farmer, sku) constraint through ``bulk_create(update_conflicts=True)``,
+and rows without one are inserted. Memory holds one chunk plus at most
+``MAX_REPORTED_ERRORS`` error messages, whatever the size of the file.
+
+Each chunk commits on its own, so a bad row never discards the rows around
+it. The row is skipped and reported with its line number instead, and a
+chunk the database refuses is rolled back and reported with its range of
+lines. Updates
+only change the columns present in the file; new products take the model
+defaults for the others.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, transaction
+
+from core.caching import invalidate_catalog
+from .models import Product
+from .search import get_search_backend
+from .stats import refresh_product_counts
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+EXPORT_FIELDS = ['sku', 'name', 'description', 'price', 'stock_quantity', 'category', 'is_organic', 'is_available']
+REQUIRED_FIELDS = {'name', 'price', 'category'}
+# One JSON object per line; a plain .json array would have to be read whole
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+UPDATE_FIELDS = ['name', 'description', 'price', 'stock_quantity', 'category', 'is_organic', 'is_available']
+BOOLEAN_WORDS = {'yes': True, 'y': True, 'no': False, 'n': False, '': None}
+CATEGORY_LABELS = {label.lower(): key for key, label in Product.CATEGORY_CHOICES}
+
+
+@dataclass
+class ImportResult:
+    saved: int = 0
+    rows: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message, rows=1):
+        self.error_count += rows
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # line_num is where the row ends, which is what editors show
+        yield reader.line_num, row
+
+
+def _jsonl_rows(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as exc:
+            yield line, exc
+            continue
+        yield line, row if isinstance(row, dict) else ValueError('each line must be a JSON object')
+
+
+def _clean(row):
+    """Validate one row against the Product field definitions; returns field values."""
+    if isinstance(row, Exception):
+        raise ValidationError(f'Invalid JSON: {row}')
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    missing = sorted(name for name in REQUIRED_FIELDS if row.get(name) in (None, ''))
+    if missing:
+        raise ValidationError(f"Missing {', '.join(missing)}")
+
+    values = {}
+    for name in EXPORT_FIELDS:
+        if name not in row:
+            continue
+        value = row[name]
+        if isinstance(value, str):
+            value = value.strip()
+            if name in ('is_organic', 'is_available') and value.lower() in BOOLEAN_WORDS:
+                value = BOOLEAN_WORDS[value.lower()]
+            elif name == 'category':
+                value = CATEGORY_LABELS.get(value.lower(), value.lower())
+        if value in (None, ''):
+            if name == 'sku':
+                values[name] = None
+            continue
+        try:
+            values[name] = Product._meta.get_field(name).clean(value, None)
+        except ValidationError as exc:
+            raise ValidationError(f"{name}: {' '.join(exc.messages)}")
+    if values['price'] <= 0:
+        raise ValidationError('price: Ensure this value is greater than 0.')
+    return values
+
+
+def _save_chunk(farmer, chunk):
+    """
+    Upsert one chunk. Rows sharing a SKU collapse to the last one, and an
+    update only touches the columns the row actually supplied.
+    """
+    by_columns, without_sku = {}, []
+    for values in chunk:
+        product = Product(farmer=farmer, **values)
+        if product.sku:
+            by_columns.setdefault(frozenset(values), {})[product.sku] = product
+        else:
+            without_sku.append(product)
+    saved, repriced = [], []
+    with transaction.atomic():
+        for columns, products in by_columns.items():
+            upserted = Product.objects.bulk_create(
+                list(products.values()),
+                update_conflicts=True,
+                unique_fields=['farmer', 'sku'],
+                # updated_at too: cached fragments and Last-Modified are keyed on it
+                update_fields=[name for name in UPDATE_FIELDS if name in columns] + ['updated_at'],
+            )
+            saved += upserted
+            if columns & {'price', 'is_available'}:
+                repriced += [product.pk for product in upserted]
+        saved += Product.objects.bulk_create(without_sku)
+        # bulk_create bypasses the post_save signals that keep search and carts
+        # current. The in-memory rows carry defaults for the columns the file
+        # left out, so search indexes the rows as stored
+        pks = [product.pk for product in saved]
+        get_search_backend().index_products(
+            Product.objects.filter(pk__in=pks).only('id', 'name', 'description', 'is_available')
+        )
+        if repriced:
+            _refresh_carts(repriced)
+        transaction.on_commit(invalidate_catalog)
+    return len(saved)
+
+
+def _refresh_carts(product_ids):
+    from consumer.models import Cart
+    from consumer.services import cart_changed, recalculate_cart_totals
+
+    carts = Cart.objects.filter(items__product__in=product_ids).distinct()
+    consumer_ids = list(carts.values_list('consumer_id', flat=True))
+    if consumer_ids:
+        recalculate_cart_totals(Cart.objects.filter(consumer__in=consumer_ids))
+        for consumer_id in consumer_ids:
+            cart_changed.send(sender=Cart, user_id=consumer_id)
+
+
+def import_products(farmer, stream, format='csv'):
+    """
+    Import products for ``farmer`` from a text stream of CSV or JSON lines.
+
+    Returns an ``ImportResult`` with the number of rows saved and the line
+    numbers and messages of rejected rows.
+    """
+    rows = _jsonl_rows(stream) if format == 'jsonl' else _csv_rows(stream)
+    result = ImportResult()
+    chunk, lines = [], []
+    for line, row in rows:
+        result.rows += 1
+        try:
+            chunk.append(_clean(row))
+        except ValidationError as exc:
+            result.add_error(line, ' '.join(exc.messages))
+            continue
+        lines.append(line)
+        if len(chunk) >= CHUNK_SIZE:
+            _import_chunk(farmer, chunk, lines, result)
+            chunk, lines = [], []
+    if chunk:
+        _import_chunk(farmer, chunk, lines, result)
+    if result.saved:
+        refresh_product_counts([farmer.pk])
+    return result
+
+
+def _import_chunk(farmer, chunk, lines, result):
+    try:
+        result.saved += _save_chunk(farmer, chunk)
+    except (IntegrityError, DataError) as exc:
+        # _save_chunk's atomic block has already rolled the chunk back
+        span = str(lines[0]) if len(lines) == 1 else f'{lines[0]}-{lines[-1]}'
+        result.add_error(span, f'Rows not saved: {exc}', rows=len(chunk))
+
+
+def import_upload(farmer, upload):
+    """Import a Django ``UploadedFile``, choosing the format from its name."""
+    format = 'jsonl' if upload.name.lower().endswith(JSON_LINES_EXTENSIONS) else 'csv'
+    # Decoded lazily: the upload is read from its temporary file as rows are consumed
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        return import_products(farmer, stream, format)
+    finally:
+        stream.detach()
+
+
+class _Echo:
+    """File-like object whose write returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(farmer, format='csv'):
+    """Lines of a product export for ``farmer``, generated as they are read."""
+    rows = (
+        Product.objects.filter(farmer=farmer).order_by('pk')
+        .values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+    )
+    if format == 'jsonl':
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,39 @@
+from django import forms
+from .bulk import JSON_LINES_EXTENSIONS
+from .models import Product
+
+class ProductForm(forms.ModelForm):
+    class Meta:
+        model = Product
+        fields = ['name', 'sku', 'description', 'price', 'stock_quantity', 'category', 'image', 'is_organic', 'is_available']
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 3}),
+        }
+
+    def __init__(self, *args, farmer=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.farmer = farmer
+
+    def clean_price(self):
+        price = self.cleaned_data['price']
+        if price <= 0:
+            raise forms.ValidationError("Price must be greater than zero.")
+        return price
+
+    def clean_sku(self):
+        sku = self.cleaned_data.get('sku') or None
+        if sku and Product.objects.filter(farmer=self.farmer, sku=sku).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("You already have a product with this SKU.")
+        return sku
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSON lines (.jsonl)")
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        name = upload.name.lower()
+        if name.endswith('.json'):
+            raise forms.ValidationError("JSON arrays are not supported; upload JSON lines (.jsonl), one product per line.")
+        if not name.endswith(('.csv', *JSON_LINES_EXTENSIONS)):
+            raise forms.ValidationError("Upload a .csv or .jsonl file.")
+        return upload
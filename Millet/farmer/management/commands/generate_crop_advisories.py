@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from farmer.advisory import generate_advisories, season_for
+from farmer.models import AdvisoryRule
+
+
+class Command(BaseCommand):
+    help = 'Generate crop advisories for every farmer (or one region) from the advisory rules.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--region', help='Only farmers whose farm location ends with this region.')
+        parser.add_argument('--season', choices=[key for key, label in AdvisoryRule.SEASON_CHOICES],
+                            help='Defaults to the current season.')
+
+    def handle(self, *args, **options):
+        season = options['season'] or season_for()
+        count = generate_advisories(season, region=options['region'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} {season} advisories.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from farmer.stats import rebuild_farmer_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every farmer dashboard stats row from orders and products.'
+
+    def handle(self, *args, **options):
+        count = rebuild_farmer_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} farmers.'))
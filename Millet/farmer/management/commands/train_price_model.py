@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from farmer.pricing import train_price_model
+
+
+class Command(BaseCommand):
+    help = 'Train a new version of the millet price forecasting model from order and listing prices.'
+
+    def handle(self, *args, **options):
+        ai_model = train_price_model()
+        if ai_model is None:
+            self.stdout.write('No prices to train on.')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Trained {ai_model}: {ai_model.description}'))
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        # Other databases use the in-memory search backend
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS farmer_product_search USING fts5("
+            "name, description, prefix = '2 3', "
+            "tokenize = \"unicode61 remove_diacritics 0 categories 'L* N* Co M*'\")"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS farmer_product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer', '0002_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
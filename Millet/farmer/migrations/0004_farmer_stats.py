@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('farmer', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerStats',
+            fields=[
+                ('farmer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='farmer_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('products_count', models.PositiveIntegerField(default=0)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reward_points', models.PositiveIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
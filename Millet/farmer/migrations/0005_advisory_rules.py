@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer', '0004_farmer_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvisoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('millet_type', models.CharField(blank=True, choices=[('pearl', 'Pearl Millet (Bajra)'), ('finger', 'Finger Millet (Ragi)'), ('foxtail', 'Foxtail Millet'), ('proso', 'Proso Millet'), ('kodo', 'Kodo Millet'), ('barnyard', 'Barnyard Millet'), ('little', 'Little Millet'), ('sorghum', 'Sorghum (Jowar)'), ('other', 'Other Millet')], max_length=20)),
+                ('region', models.CharField(blank=True, max_length=100)),
+                ('soil_type', models.CharField(blank=True, max_length=100)),
+                ('season', models.CharField(blank=True, choices=[('kharif', 'Kharif (Jun-Oct)'), ('rabi', 'Rabi (Nov-Feb)'), ('zaid', 'Zaid (Mar-May)')], max_length=50)),
+                ('advice', models.TextField()),
+                ('priority', models.IntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cropadvisory',
+            index=models.Index(fields=['farmer', 'season'], name='advisory_farmer_season_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# A starter rule base; agronomists extend it from the admin.
+# (millet_type, region, soil_type, season, priority, advice)
+DEFAULT_RULES = [
+    ('', '', '', 'kharif', 0, 'Sow with the onset of the monsoon and keep fields free of weeds for the first 30 days.'),
+    ('', '', '', 'rabi', 0, 'Irrigate at tillering and flowering; millets need far less water than wheat, so avoid waterlogging.'),
+    ('', '', '', 'zaid', 0, 'Summer crops need light, frequent irrigation; mulch to save soil moisture.'),
+    ('', '', 'sandy', '', 5, 'Sandy soils lose nutrients quickly: split nitrogen into two doses and add farmyard manure.'),
+    ('', '', 'black', '', 5, 'Black cotton soils hold water: make ridges and furrows so roots do not stay wet.'),
+    ('', '', 'red', '', 5, 'Red soils are often low in phosphorus: apply it as a basal dose at sowing.'),
+    ('pearl', '', '', 'kharif', 10, 'Pearl millet (bajra): sow 4-5 kg seed per hectare at 45 cm row spacing; watch for downy mildew.'),
+    ('finger', '', '', 'kharif', 10, 'Finger millet (ragi): transplant 3-4 week old seedlings at 20 x 10 cm; treat seed against blast.'),
+    ('finger', '', '', 'rabi', 10, 'Finger millet (ragi): rabi crops need 4-5 irrigations; protect ear heads from birds at maturity.'),
+    ('foxtail', '', '', 'kharif', 10, 'Foxtail millet: sow 8-10 kg seed per hectare in lines 25 cm apart; it matures in 80-90 days.'),
+    ('kodo', '', '', 'kharif', 10, 'Kodo millet: tolerant of poor soils; harvest promptly when grains harden to avoid shattering.'),
+    ('little', '', '', 'kharif', 10, 'Little millet: thin to 10 cm between plants 15 days after sowing.'),
+    ('barnyard', '', '', 'kharif', 10, 'Barnyard millet: suits late sowing and short seasons; one weeding at 20 days is usually enough.'),
+    ('proso', '', '', 'zaid', 10, 'Proso millet: a quick 60-70 day summer crop; sow after the main rabi harvest.'),
+    ('sorghum', '', '', 'kharif', 10, 'Sorghum (jowar): control shoot fly by sowing early and at a uniform time across the village.'),
+    ('sorghum', '', '', 'rabi', 10, 'Rabi sorghum: grow on residual moisture in deep black soils; apply a protective irrigation at flowering.'),
+]
+
+
+def add_rules(apps, schema_editor):
+    AdvisoryRule = apps.get_model('farmer', 'AdvisoryRule')
+    AdvisoryRule.objects.bulk_create([
+        AdvisoryRule(millet_type=millet, region=region, soil_type=soil, season=season, priority=priority, advice=advice)
+        for millet, region, soil, season, priority, advice in DEFAULT_RULES
+    ])
+
+
+def remove_rules(apps, schema_editor):
+    AdvisoryRule = apps.get_model('farmer', 'AdvisoryRule')
+    AdvisoryRule.objects.filter(advice__in=[rule[-1] for rule in DEFAULT_RULES]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer', '0005_advisory_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_rules, remove_rules),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer', '0007_product_sku'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='farmerstats',
+            name='reward_points',
+        ),
+    ]
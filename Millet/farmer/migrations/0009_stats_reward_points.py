@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+def copy_balances(apps, schema_editor):
+    FarmerStats = apps.get_model('farmer', 'FarmerStats')
+    RewardBalance = apps.get_model('core', 'RewardBalance')
+    balances = RewardBalance.objects.filter(user_type='farmer', points__gt=0)
+    FarmerStats.objects.bulk_create(
+        [FarmerStats(farmer_id=balance.user_id) for balance in balances], ignore_conflicts=True,
+    )
+    for balance in balances:
+        FarmerStats.objects.filter(farmer_id=balance.user_id).update(reward_points=balance.points)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer', '0008_remove_stats_reward_points'),
+        ('core', '0007_reward_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerstats',
+            name='reward_points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_balances, migrations.RunPython.noop),
+    ]
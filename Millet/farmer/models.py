@@ -12,6 +12,8 @@ class Product(models.Model):
     )
     
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
+    # Farmer's own stock-keeping code; bulk imports upsert on (farmer, sku)
+    sku = models.CharField(max_length=64, blank=True, null=True)
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -23,6 +25,19 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Each index backs one catalog sort order so keyset pages never scan
+        indexes = [
+            models.Index(fields=['is_available', '-created_at', '-id'], name='product_avail_newest_idx'),
+            models.Index(fields=['is_available', 'price', 'id'], name='product_avail_price_idx'),
+            models.Index(fields=['is_available', 'category', '-created_at', '-id'], name='product_cat_newest_idx'),
+            models.Index(fields=['is_available', 'category', 'price', 'id'], name='product_cat_price_idx'),
+            models.Index(fields=['farmer', 'is_available', '-created_at'], name='product_farmer_avail_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['farmer', 'sku'], name='unique_farmer_sku'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -47,9 +62,35 @@ class CropAdvisory(models.Model):
     advisory_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['farmer', 'season'], name='advisory_farmer_season_idx'),
+        ]
+    
     def __str__(self):
         return f"Advisory for {self.get_millet_type_display()} in {self.region}"
 
+class AdvisoryRule(models.Model):
+    """One piece of advice; blank conditions match anything (see farmer.advisory)."""
+    SEASON_CHOICES = (
+        ('kharif', 'Kharif (Jun-Oct)'),
+        ('rabi', 'Rabi (Nov-Feb)'),
+        ('zaid', 'Zaid (Mar-May)'),
+    )
+    
+    millet_type = models.CharField(max_length=20, choices=CropAdvisory.MILLET_TYPES, blank=True)
+    region = models.CharField(max_length=100, blank=True)
+    soil_type = models.CharField(max_length=100, blank=True)
+    season = models.CharField(max_length=50, choices=SEASON_CHOICES, blank=True)
+    advice = models.TextField()
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        conditions = [self.millet_type, self.region, self.soil_type, self.season]
+        return f"Rule for {' / '.join(c or '*' for c in conditions)}: {self.advice[:50]}"
+
 class FarmerReward(models.Model):
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='farmer_rewards')
     points = models.PositiveIntegerField(default=0)
@@ -58,3 +99,20 @@ class FarmerReward(models.Model):
     
     def __str__(self):
         return f"{self.farmer.username}: {self.points} points"
+
+class FarmerStats(models.Model):
+    """Dashboard counters for one farmer, maintained incrementally by farmer.stats."""
+    LOW_STOCK_THRESHOLD = 10
+    
+    farmer = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='farmer_stats')
+    products_count = models.PositiveIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    # A copy of core.RewardBalance.points, kept in step by core.rewards
+    reward_points = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Stats for {self.farmer.username}"
@@ -0,0 +1,306 @@
+"""
+Millet price forecasting.
+
+``train_price_model`` fits one small model per segment (millet type x
+category x region, plus coarser fallbacks) from order and listing prices,
+and stores each segment's coefficients as a packed float32 array under a new
+``AIModel`` version. Serving loads a version once into a single NumPy matrix
+(``load_model`` is LRU-cached per process), so forecasting every product of a
+farmer is a handful of array operations rather than a model load per product.
+
+Segment models work on log prices centred per product, so the same millet
+sold in different pack sizes shares one series:
+
+* a seasonal index per calendar month taken from the residuals of the
+  long-run trend, shrunk towards zero for months with few observations;
+* a linear trend fitted on the deseasonalised prices of the last
+  ``ROLLING_WEEKS`` weeks.
+
+Fitting is vectorised across all segments at once with ``np.bincount``.
+"""
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import AIModel, ModelCoefficients
+from core.regions import region_parts
+from .models import CropAdvisory, Product
+from .search import tokenize
+
+MODEL_NAME = 'Millet price forecaster'
+MODEL_TYPE = 'price_predictor'
+VERSIONS_KEPT = 3
+REGISTRY_SIZE = 4
+
+ROLLING_WEEKS = 26
+SEASONAL_SHRINK = 5
+MIN_SAMPLES = 8
+DEFAULT_WEEKS = 4
+MAX_WEEKS = 12
+# Forecasts never move a price by more than this factor either way
+MAX_LOG_CHANGE = 0.5
+# Width of the forecast band (about 80% under a normal residual)
+BAND_Z = 1.28
+
+ANY = '*'
+MILLET_KEYS = {key for key, label in CropAdvisory.MILLET_TYPES if key != 'other'}
+
+# Coefficient layout of one segment
+SLOPE, RESIDUAL_STD, SEASONAL = 0, 1, 2
+WIDTH = SEASONAL + 12
+
+PricePrediction = namedtuple('PricePrediction', 'product predicted low high change_percent segment')
+
+
+def millet_type(name, description=''):
+    """Canonical millet key named in a product's name (or else its description)."""
+    for text in (name, description):
+        for token in tokenize(text):
+            if token in MILLET_KEYS:
+                return token
+    return 'other'
+
+
+def region_of(location):
+    """The last comma-separated part of a farm location, usually the state."""
+    parts = region_parts(location)
+    return parts[-1] if parts else ANY
+
+
+def segment_keys(millet, category, region):
+    """Segments a product belongs to, most specific first."""
+    keys = [f'{millet}/{category}/{region}', f'{millet}/{category}/{ANY}', f'{millet}/{ANY}/{ANY}', f'{ANY}/{ANY}/{ANY}']
+    return list(dict.fromkeys(keys))
+
+
+def product_segments(product):
+    return segment_keys(
+        millet_type(product.name, product.description), product.category, region_of(product.farmer.farm_location)
+    )
+
+
+def _weeks(moment):
+    return moment.timestamp() / (7 * 24 * 3600)
+
+
+# ------------------------------------------------------------------ training
+
+def _observations():
+    """(product id, price, when, segment keys) for every sale and current listing."""
+    from consumer.models import OrderItem
+
+    fields = ('name', 'description', 'category', 'farmer__farm_location')
+    sold = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values_list('product_id', 'price', 'order__created_at', *[f'product__{field}' for field in fields])
+    )
+    listed = Product.objects.values_list('pk', 'price', 'updated_at', *fields)
+    keys = {}
+    for rows in (sold, listed):
+        for product_id, price, when, name, description, category, location in rows.iterator(chunk_size=5000):
+            if product_id not in keys:
+                keys[product_id] = segment_keys(millet_type(name, description), category, region_of(location))
+            yield product_id, float(price), when, keys[product_id]
+
+
+def _linear_fit(segments, t, z, count):
+    """Least-squares line through (t, z) for every segment, from bincount sums."""
+    import numpy as np
+
+    n = np.bincount(segments, minlength=count).astype(float)
+    sum_t = np.bincount(segments, t, minlength=count)
+    sum_z = np.bincount(segments, z, minlength=count)
+    sum_tt = np.bincount(segments, t * t, minlength=count)
+    sum_tz = np.bincount(segments, t * z, minlength=count)
+    denominator = n * sum_tt - sum_t ** 2
+    flat = denominator <= 1e-9
+    slope = np.where(flat, 0.0, (n * sum_tz - sum_t * sum_z) / np.where(flat, 1.0, denominator))
+    intercept = (sum_z - slope * sum_t) / np.maximum(n, 1)
+    return slope, intercept, n
+
+
+def fit_segments(segments, products, weeks, months, prices):
+    """
+    Fit every segment at once.
+
+    Arguments are parallel arrays, one entry per (observation, segment)
+    pair. Returns the coefficient matrix (one ``WIDTH`` row per segment code)
+    and the number of observations behind each row.
+    """
+    import numpy as np
+
+    y = np.log(prices)
+    # Centre each product's prices so pack size does not look like a trend
+    _, product_codes = np.unique(products, return_inverse=True)
+    y = y - (np.bincount(product_codes, y) / np.bincount(product_codes))[product_codes]
+
+    count = segments.max() + 1
+    samples = np.bincount(segments, minlength=count)
+    end = np.full(count, -np.inf)
+    np.maximum.at(end, segments, weeks)
+    t = weeks - end[segments]
+
+    # Seasonal index from what the long-run trend leaves unexplained
+    slope, intercept, _ = _linear_fit(segments, t, y, count)
+    detrended = y - intercept[segments] - slope[segments] * t
+    cells = segments * 12 + months
+    cell_count = np.bincount(cells, minlength=count * 12)
+    cell_mean = np.bincount(cells, detrended, minlength=count * 12) / np.maximum(cell_count, 1)
+    seasonal = (cell_mean * cell_count / (cell_count + SEASONAL_SHRINK)).reshape(count, 12)
+    z = y - seasonal[segments, months]
+
+    # Rolling regression: only the latest ROLLING_WEEKS of each segment feed the trend
+    window = t >= -ROLLING_WEEKS
+    seg, t, z = segments[window], t[window], z[window]
+    slope, intercept, n = _linear_fit(seg, t, z, count)
+    residual = z - intercept[seg] - slope[seg] * t
+    residual_std = np.sqrt(np.bincount(seg, residual ** 2, minlength=count) / np.maximum(n - 2, 1))
+
+    coefficients = np.zeros((count, WIDTH))
+    coefficients[:, SLOPE] = slope
+    coefficients[:, RESIDUAL_STD] = residual_std
+    coefficients[:, SEASONAL:] = seasonal
+    return coefficients, samples
+
+
+def train_price_model():
+    """
+    Train a new version of the price model and make it the active one.
+
+    Returns the new ``AIModel``, or None when there are no prices to learn from.
+    Only the latest ``VERSIONS_KEPT`` versions are kept.
+    """
+    import numpy as np
+
+    keys, products, weeks, months, prices = [], [], [], [], []
+    for product_id, price, when, segments in _observations():
+        if price <= 0:
+            continue
+        for key in segments:
+            keys.append(key)
+            products.append(product_id)
+            weeks.append(_weeks(when))
+            months.append(when.month - 1)
+            prices.append(price)
+    if not keys:
+        return None
+
+    names, codes = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    coefficients, samples = fit_segments(
+        codes, np.array(products), np.array(weeks), np.array(months), np.array(prices)
+    )
+    rows = [i for i in range(len(names)) if samples[i] >= MIN_SAMPLES]
+    if not rows:
+        # No segment has enough history yet
+        return None
+
+    with transaction.atomic():
+        ai_model = AIModel.objects.create(
+            name=MODEL_NAME,
+            model_type=MODEL_TYPE,
+            description=f'{len(rows)} segments from {len(set(products))} products.',
+        )
+        ModelCoefficients.objects.bulk_create(
+            [
+                ModelCoefficients(
+                    ai_model=ai_model,
+                    segment=names[i],
+                    data=coefficients[i].astype('<f4').tobytes(),
+                    samples=int(samples[i]),
+                )
+                for i in rows
+            ],
+            batch_size=1000,
+        )
+        versions = AIModel.objects.filter(name=MODEL_NAME, model_type=MODEL_TYPE).order_by('-created_at', '-pk')
+        AIModel.objects.filter(pk__in=list(versions.values_list('pk', flat=True)[VERSIONS_KEPT:])).delete()
+    return ai_model
+
+
+# ------------------------------------------------------------------- serving
+
+class PriceModel:
+    """One trained version, held in memory as a segment index and a coefficient matrix."""
+
+    def __init__(self, ai_model_id, segments, coefficients):
+        self.ai_model_id = ai_model_id
+        self.index = {segment: row for row, segment in enumerate(segments)}
+        self.coefficients = coefficients
+
+    def row_for(self, keys):
+        for key in keys:
+            if key in self.index:
+                return self.index[key], key
+        return -1, None
+
+    def predict(self, products, weeks=DEFAULT_WEEKS, today=None):
+        """Forecast the price of every product ``weeks`` ahead in one vectorised pass."""
+        import numpy as np
+
+        if not products or not len(self.coefficients):
+            # A version without segments forecasts nothing
+            return []
+        today = today or timezone.localdate()
+        month_now = today.month - 1
+        month_then = (today + datetime.timedelta(weeks=weeks)).month - 1
+
+        matches = [self.row_for(product_segments(product)) for product in products]
+        rows = np.array([row for row, _ in matches])
+        known = rows >= 0
+        coefficients = self.coefficients[np.where(known, rows, 0)]
+        prices = np.array([float(product.price) for product in products])
+
+        change = (
+            coefficients[:, SLOPE] * weeks
+            + coefficients[:, SEASONAL + month_then]
+            - coefficients[:, SEASONAL + month_now]
+        )
+        change = np.clip(np.where(known, change, 0.0), -MAX_LOG_CHANGE, MAX_LOG_CHANGE)
+        # Uncertainty grows with the horizon relative to the trend window
+        spread = np.where(known, BAND_Z * coefficients[:, RESIDUAL_STD] * np.sqrt(1 + weeks / ROLLING_WEEKS), 0.0)
+        predicted = prices * np.exp(change)
+        low = prices * np.exp(np.maximum(change - spread, -MAX_LOG_CHANGE))
+        high = prices * np.exp(np.minimum(change + spread, MAX_LOG_CHANGE))
+        percent = (np.exp(change) - 1) * 100
+
+        money = lambda value: Decimal(f'{value:.2f}')
+        return [
+            PricePrediction(product, money(predicted[i]), money(low[i]), money(high[i]),
+                            round(float(percent[i]), 1), matches[i][1])
+            for i, product in enumerate(products)
+        ]
+
+
+@lru_cache(maxsize=REGISTRY_SIZE)
+def load_model(ai_model_id):
+    import numpy as np
+
+    rows = ModelCoefficients.objects.filter(ai_model_id=ai_model_id).values_list('segment', 'data')
+    segments, arrays = [], []
+    for segment, data in rows:
+        segments.append(segment)
+        arrays.append(np.frombuffer(bytes(data), dtype='<f4'))
+    coefficients = np.vstack(arrays).astype(float) if arrays else np.zeros((0, WIDTH))
+    return PriceModel(ai_model_id, segments, coefficients)
+
+
+def get_price_model():
+    """The latest trained version, or None before the first training run."""
+    ai_model_id = (
+        AIModel.objects.filter(name=MODEL_NAME, model_type=MODEL_TYPE)
+        .order_by('-created_at', '-pk')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    return load_model(ai_model_id) if ai_model_id else None
+
+
+def predict_prices(products, weeks=DEFAULT_WEEKS):
+    model = get_price_model()
+    if model is None:
+        return []
+    return model.predict(list(products), weeks)
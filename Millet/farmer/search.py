@@ -0,0 +1,350 @@
+"""
+Full-text search over product names and descriptions.
+
+Two interchangeable backends are provided: ``FTS5SearchBackend`` keeps the
+index in a SQLite FTS5 table next to the product rows, and
+``InMemorySearchBackend`` is a pure-Python inverted index used when FTS5 is
+not available (or when ``PRODUCT_SEARCH_BACKEND = 'memory'``). Both share the
+same analyzer so regional millet names resolve to the same terms.
+"""
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import CropAdvisory, Product
+
+FTS_TABLE = 'farmer_product_search'
+
+# Name matches count for more than description matches
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_EXPANSIONS = 50
+
+# Regional names (Hindi/Telugu/Tamil transliterations and a few native-script
+# spellings) for each millet in CropAdvisory.MILLET_TYPES.
+MILLET_ALIASES = {
+    'pearl': ['bajra', 'bajri', 'sajja', 'sajjalu', 'kambu', 'cumbu', 'बाजरा', 'సజ్జలు', 'கம்பு'],
+    'finger': ['ragi', 'nachni', 'mandua', 'ragulu', 'kelvaragu', 'kezhvaragu', 'रागी', 'రాగులు', 'கேழ்வரகு'],
+    'foxtail': ['kangni', 'kakun', 'korra', 'korralu', 'thinai', 'tenai', 'navane', 'कंगनी', 'కొర్రలు', 'தினை'],
+    'proso': ['chena', 'cheena', 'barri', 'variga', 'panivaragu', 'चीना', 'వరిగలు', 'பனிவரகு'],
+    'kodo': ['kodon', 'kodra', 'arikelu', 'varagu', 'कोदो', 'అరికెలు', 'வரகு'],
+    'barnyard': ['sanwa', 'sawa', 'jhangora', 'udalu', 'kuthiraivali', 'सांवा', 'ఊదలు', 'குதிரைவாலி'],
+    'little': ['kutki', 'samalu', 'samai', 'kutaki', 'कुटकी', 'సామలు', 'சாமை'],
+    'sorghum': ['jowar', 'jwar', 'jonna', 'jonnalu', 'cholam', 'ज्वार', 'జొన్నలు', 'சோளம்'],
+}
+
+
+def _build_alias_map():
+    aliases = {}
+    for key, label in CropAdvisory.MILLET_TYPES:
+        if key == 'other':
+            continue
+        # Names in brackets in the choice labels, e.g. "Pearl Millet (Bajra)"
+        for name in re.findall(r'\((\w+)\)', label):
+            aliases[name.lower()] = key
+        for name in MILLET_ALIASES.get(key, ()):
+            aliases[name] = key
+    return aliases
+
+
+ALIASES = _build_alias_map()
+# \w alone splits Indic words on their vowel signs, so the Devanagari through
+# Malayalam blocks are matched explicitly.
+TOKEN_RE = re.compile(r'[\w\u0900-\u0d7f]+')
+
+
+def _words(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def tokenize(text):
+    """Tokens to index: every word plus the canonical key of any millet alias."""
+    tokens = []
+    for word in _words(text):
+        tokens.append(word)
+        if word in ALIASES:
+            tokens.append(ALIASES[word])
+    return tokens
+
+
+def analyze_query(text):
+    """Query terms: aliases are folded onto their canonical millet key."""
+    return [ALIASES.get(word, word) for word in _words(text)]
+
+
+def alias_completions(prefix):
+    return {key for alias, key in ALIASES.items() if alias.startswith(prefix)}
+
+
+class InMemorySearchBackend:
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        # term -> {product id: weighted term frequency}
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.titles = {}
+        self.vocabulary = []
+        self.total_length = 0.0
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def _add(self, pk, name, description):
+        weights = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        length = sum(weights.values())
+        for term, weight in weights.items():
+            if term not in self.postings:
+                insort(self.vocabulary, term)
+            self.postings[term][pk] = weight
+        self.doc_terms[pk] = list(weights)
+        self.doc_lengths[pk] = length
+        self.titles[pk] = name
+        self.total_length += length
+
+    def _remove(self, pk):
+        for term in self.doc_terms.pop(pk, ()):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(pk, None)
+            if not docs:
+                del self.postings[term]
+                self.vocabulary.pop(bisect_left(self.vocabulary, term))
+        self.total_length -= self.doc_lengths.pop(pk, 0.0)
+        self.titles.pop(pk, None)
+
+    def index_product(self, product):
+        with self._lock:
+            if not self._loaded:
+                # The first lazy load will pick this row up from the database
+                return
+            self._remove(product.pk)
+            if product.is_available:
+                self._add(product.pk, product.name, product.description)
+
+    def index_products(self, products):
+        with self._lock:
+            if not self._loaded:
+                return
+            for product in products:
+                self._remove(product.pk)
+                if product.is_available:
+                    self._add(product.pk, product.name, product.description)
+
+    def remove_product(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def rebuild(self, products=None):
+        if products is None:
+            products = Product.objects.filter(is_available=True).only('id', 'name', 'description').iterator(chunk_size=2000)
+        with self._lock:
+            self._reset()
+            count = 0
+            for product in products:
+                self._add(product.pk, product.name, product.description)
+                count += 1
+            self._loaded = True
+            return count
+
+    def _expand_prefix(self, prefix):
+        terms = set(alias_completions(prefix))
+        start = bisect_left(self.vocabulary, prefix)
+        for term in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            terms.add(term)
+        return terms
+
+    def _rank(self, required, optional=None, limit=20):
+        """BM25 over docs containing every required term (and any optional one)."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs
+        candidates = None
+        for term in required:
+            docs = set(self.postings.get(term, ()))
+            candidates = docs if candidates is None else candidates & docs
+            if not candidates:
+                return []
+        if optional is not None:
+            matched = set()
+            for term in optional:
+                matched.update(self.postings.get(term, ()))
+            candidates = matched if candidates is None else candidates & matched
+        if not candidates:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(required) | set(optional or ()):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for pk in candidates.intersection(docs):
+                tf = docs[pk]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[pk] / avg_length)
+                scores[pk] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def search(self, query, limit=50):
+        terms = analyze_query(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            return [pk for pk, _ in self._rank(terms, limit=limit)]
+
+    def suggest(self, query, limit=8):
+        words = _words(query)
+        if not words:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            required = [ALIASES.get(word, word) for word in words[:-1]]
+            ranked = self._rank(required, self._expand_prefix(words[-1]), limit=limit)
+            return [(pk, self.titles[pk]) for pk, _ in ranked]
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def create_fts_table(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, prefix = '2 3', "
+        "tokenize = \"unicode61 remove_diacritics 0 categories 'L* N* Co M*'\")"
+    )
+
+
+def _fts_phrase(term):
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+class FTS5SearchBackend:
+    """
+    Index stored in a SQLite FTS5 table keyed by product id.
+
+    Text is run through ``tokenize`` before it is stored so FTS5 sees the same
+    alias-expanded terms as the in-memory backend.
+    """
+    name = 'fts5'
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+            if product.is_available:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                    [product.pk, ' '.join(tokenize(product.name)), ' '.join(tokenize(product.description))],
+                )
+
+    def index_products(self, products):
+        """Reindex many products with two batched statements (used by bulk imports)."""
+        products = list(products)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(product.pk,) for product in products])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                [(product.pk, ' '.join(tokenize(product.name)), ' '.join(tokenize(product.description)))
+                 for product in products if product.is_available],
+            )
+
+    def remove_product(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def rebuild(self, products=None):
+        if products is None:
+            products = Product.objects.filter(is_available=True).only('id', 'name', 'description').iterator(chunk_size=2000)
+        count = 0
+        with connection.cursor() as cursor:
+            create_fts_table(cursor)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batch = []
+            for product in products:
+                batch.append((product.pk, ' '.join(tokenize(product.name)), ' '.join(tokenize(product.description))))
+                if len(batch) >= 2000:
+                    cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', batch)
+                count += len(batch)
+        return count
+
+    def _query(self, match, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s), rowid LIMIT %s',
+                [match, NAME_WEIGHT, DESCRIPTION_WEIGHT, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, query, limit=50):
+        terms = analyze_query(query)
+        if not terms:
+            return []
+        match = ' AND '.join(_fts_phrase(term) for term in terms)
+        return self._query(match, limit)
+
+    def suggest(self, query, limit=8):
+        words = _words(query)
+        if not words:
+            return []
+        prefix = words[-1]
+        options = [_fts_phrase(prefix) + '*'] + [_fts_phrase(key) for key in sorted(alias_completions(prefix))]
+        clauses = [_fts_phrase(ALIASES.get(word, word)) for word in words[:-1]]
+        clauses.append('(' + ' OR '.join(options) + ')')
+        # The index only holds analyzed text, so display names come from the table
+        ids = self._query(' AND '.join(clauses), limit)
+        titles = dict(Product.objects.filter(pk__in=ids).values_list('pk', 'name'))
+        return [(pk, titles[pk]) for pk in ids if pk in titles]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+                if choice == 'fts5' or (choice == 'auto' and fts5_available()):
+                    _backend = FTS5SearchBackend()
+                else:
+                    _backend = InMemorySearchBackend()
+    return _backend
+
+
+def search_products(query, limit=50):
+    """Product ids matching ``query``, best match first."""
+    return get_search_backend().search(query, limit=limit)
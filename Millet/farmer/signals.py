@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import rewards
+from core.caching import invalidate_catalog
+from .advisory import invalidate_rules
+from .models import AdvisoryRule, FarmerReward, Product
+from .search import get_search_backend
+from .stats import refresh_product_counts
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_product(instance)
+    refresh_product_counts([instance.farmer_id])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+    refresh_product_counts([instance.farmer_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_catalog(sender, raw=False, **kwargs):
+    # After commit, so no request caches the old rows under the new version
+    if not raw:
+        transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=FarmerReward)
+def accrue_farmer_reward(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.points:
+        rewards.accrue(instance.farmer, instance.points, instance.description, key=f'farmer-reward:{instance.pk}')
+
+
+@receiver(post_save, sender=AdvisoryRule)
+@receiver(post_delete, sender=AdvisoryRule)
+def reload_advisory_rules(sender, **kwargs):
+    # After commit, so no process recompiles from rules it cannot see yet
+    transaction.on_commit(invalidate_rules)
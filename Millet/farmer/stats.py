@@ -0,0 +1,111 @@
+"""
+Incremental maintenance of ``FarmerStats``.
+
+Every writer that changes a dashboard number calls in here with the delta,
+so reading a farmer's dashboard is a single primary-key lookup.
+``rebuild_farmer_stats`` recomputes everything from the source tables.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from accounts.models import User
+from .models import FarmerStats, Product
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def ensure_stats(farmer_ids):
+    FarmerStats.objects.bulk_create(
+        [FarmerStats(farmer_id=farmer_id) for farmer_id in set(farmer_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def get_stats(farmer):
+    stats, created = FarmerStats.objects.get_or_create(farmer=farmer)
+    return stats
+
+
+def _per_farmer(values, output_field):
+    return Case(
+        *[When(farmer_id=farmer_id, then=Value(value)) for farmer_id, value in values.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def add_reward_points(farmer_id, points):
+    """Apply a change to the farmer's reward balance (negative for redemptions)."""
+    ensure_stats([farmer_id])
+    FarmerStats.objects.filter(farmer_id=farmer_id).update(reward_points=F('reward_points') + points)
+
+
+def record_order_sales(lines):
+    """
+    Apply one order to the stats of every farmer whose products it contains.
+
+    ``lines`` yields ``(farmer_id, quantity, line_total)`` tuples. All farmers
+    are updated by one ``CASE`` statement however many there are.
+    """
+    units = defaultdict(int)
+    revenue = defaultdict(Decimal)
+    for farmer_id, quantity, line_total in lines:
+        units[farmer_id] += quantity
+        revenue[farmer_id] += line_total
+    if not units:
+        return
+    ensure_stats(units)
+    FarmerStats.objects.filter(farmer_id__in=units).update(
+        orders_count=F('orders_count') + 1,
+        units_sold=F('units_sold') + _per_farmer(units, IntegerField()),
+        revenue=F('revenue') + _per_farmer(revenue, MONEY),
+    )
+    # Sales lowered stock, which may have pushed products under the threshold
+    refresh_product_counts(units)
+
+
+def _product_count_subqueries():
+    products = Product.objects.filter(farmer=OuterRef('farmer_id')).order_by().values('farmer')
+    low_stock = products.filter(is_available=True, stock_quantity__lt=FarmerStats.LOW_STOCK_THRESHOLD)
+    return {
+        'products_count': Coalesce(Subquery(products.annotate(n=Count('id')).values('n')), 0),
+        'low_stock_count': Coalesce(Subquery(low_stock.annotate(n=Count('id')).values('n')), 0),
+    }
+
+
+def refresh_product_counts(farmer_ids):
+    """Recount products and low-stock products for the given farmers."""
+    ensure_stats(farmer_ids)
+    FarmerStats.objects.filter(farmer_id__in=set(farmer_ids)).update(**_product_count_subqueries())
+
+
+def rebuild_farmer_stats():
+    """Recompute every farmer's stats from orders, reward balances and products."""
+    from consumer.models import OrderItem
+    from core.models import RewardBalance
+
+    farmer_ids = list(User.objects.filter(user_type='farmer').values_list('pk', flat=True))
+    ensure_stats(farmer_ids)
+
+    sales = (
+        OrderItem.objects.filter(product__farmer=OuterRef('farmer_id'))
+        .exclude(order__status='cancelled')
+        .order_by()
+        .values('product__farmer')
+    )
+    return FarmerStats.objects.update(
+        orders_count=Coalesce(Subquery(sales.annotate(n=Count('order', distinct=True)).values('n')), 0),
+        units_sold=Coalesce(Subquery(sales.annotate(n=Sum('quantity')).values('n')), 0),
+        revenue=Coalesce(
+            Subquery(sales.annotate(n=Sum(F('price') * F('quantity'), output_field=MONEY)).values('n')),
+            Value(0),
+            output_field=MONEY,
+        ),
+        reward_points=Coalesce(
+            Subquery(RewardBalance.objects.filter(user=OuterRef('farmer_id')).values('points')[:1]), 0,
+        ),
+        **_product_count_subqueries(),
+    )
@@ -0,0 +1,19 @@
+from core.background import task
+
+from . import advisory, pricing, stats
+
+
+@task(queue='bulk')
+def generate_crop_advisories(season=None, region=None):
+    return advisory.generate_advisories(season=season, region=region)
+
+
+@task(queue='bulk')
+def train_price_model():
+    model = pricing.train_price_model()
+    return model.pk if model else None
+
+
+@task(queue='bulk')
+def rebuild_farmer_stats():
+    return stats.rebuild_farmer_stats()
@@ -1,3 +1,380 @@
+import datetime
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from consumer import services
+from consumer.checkout import place_order
+from consumer.models import Cart, Order, OrderItem
+from core import rewards
+from core.models import AIModel
+from . import bulk, pricing
+from .advisory import RuleIndex, generate_advisories, get_rule_index, season_for
+from .models import AdvisoryRule, CropAdvisory, FarmerReward, FarmerStats, Product
+from .search import FTS5SearchBackend, InMemorySearchBackend, analyze_query, get_search_backend, tokenize
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.ragi = Product.objects.create(farmer=cls.farmer, name='Ragi Flour', description='Stone ground finger millet flour',
+                                          price=80, category='flour')
+        cls.bajra = Product.objects.create(farmer=cls.farmer, name='Organic Bajra', description='Whole pearl millet grain',
+                                           price=60, category='grain')
+        cls.jowar = Product.objects.create(farmer=cls.farmer, name='Jowar Rotti Mix', description='Sorghum flour mix for rotis',
+                                           price=95, category='flour')
+
+    def backends(self):
+        backends = [InMemorySearchBackend()]
+        if isinstance(get_search_backend(), FTS5SearchBackend):
+            backends.append(get_search_backend())
+        return backends
+
+    def test_aliases_fold_onto_millet_type(self):
+        self.assertEqual(analyze_query('Kambu'), ['pearl'])
+        self.assertEqual(analyze_query('रागी'), ['finger'])
+        self.assertIn('sorghum', tokenize('Jowar rotti'))
+
+    def test_search_matches_regional_names(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(backend.search('nachni'), [self.ragi.pk])
+                self.assertEqual(backend.search('sajja'), [self.bajra.pk])
+                self.assertEqual(backend.search('cholam flour'), [self.jowar.pk])
+                # Name hits outrank description-only hits
+                self.assertEqual(backend.search('flour')[0], self.ragi.pk)
+
+    def test_suggest_prefix(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(backend.suggest('raG'), [(self.ragi.pk, 'Ragi Flour')])
+                self.assertEqual([pk for pk, _ in backend.suggest('kam')], [self.bajra.pk])
+                self.assertEqual(backend.suggest('flour ro'), [(self.jowar.pk, 'Jowar Rotti Mix')])
+
+    def test_index_follows_saves_and_deletes(self):
+        backend = get_search_backend()
+        self.bajra.is_available = False
+        self.bajra.save()
+        self.assertEqual(backend.search('bajra'), [])
+        self.ragi.delete()
+        self.assertEqual(backend.search('ragi'), [])
+
+    def test_rebuild_command(self):
+        Product.objects.bulk_create([Product(farmer=self.farmer, name='Korra Rice', description='Foxtail',
+                                             price=70, category='grain')])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(get_search_backend().search('thinai')), 1)
+
+    def test_suggest_endpoint(self):
+        consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        self.client.force_login(consumer)
+        started = time.perf_counter()
+        response = self.client.get(reverse('product_suggest'), {'q': 'jo'})
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertEqual(response.json()['results'], [{'id': self.jowar.pk, 'name': 'Jowar Rotti Mix'}])
+
+
+class FarmerStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.other = User.objects.create_user(username='farmer2', password='pass12345', user_type='farmer')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        cls.ragi = Product.objects.create(farmer=cls.farmer, name='Ragi', description='x', price=50,
+                                          stock_quantity=12, category='grain')
+        cls.jowar = Product.objects.create(farmer=cls.other, name='Jowar', description='x', price=40,
+                                           stock_quantity=100, category='grain')
+
+    def place_order(self, quantities):
+        services.add_many_to_cart(self.consumer, quantities)
+        return place_order(self.consumer, 'Address', '12345')
+
+    def test_orders_and_rewards_update_stats_incrementally(self):
+        self.place_order({self.ragi.pk: 3, self.jowar.pk: 1})
+        self.place_order({self.ragi.pk: 1})
+        FarmerReward.objects.create(farmer=self.farmer, points=25, description='Verified listing')
+
+        stats = FarmerStats.objects.get(farmer=self.farmer)
+        self.assertEqual(
+            (stats.products_count, stats.orders_count, stats.units_sold, stats.revenue, stats.low_stock_count),
+            (1, 2, 4, Decimal('200'), 1),
+        )
+        self.assertEqual(rewards.get_balance(self.farmer), 25)
+        incremental = list(FarmerStats.objects.order_by('pk').values())
+        call_command('rebuild_farmer_stats', stdout=StringIO())
+        rebuilt = list(FarmerStats.objects.order_by('pk').values())
+        for row in incremental + rebuilt:
+            row.pop('updated_at')
+        self.assertEqual(rebuilt, incremental)
+
+    def test_dashboard_reads_stats_row(self):
+        self.place_order({self.ragi.pk: 2})
+        self.client.force_login(self.farmer)
+        response = self.client.get(reverse('farmer_dashboard'))
+        self.assertEqual(response.context['orders_count'], 1)
+        self.assertEqual(response.context['revenue'], Decimal('100'))
+
+
+class PricePredictionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer',
+                                              farm_location='Mandya, Karnataka')
+        cls.consumer = User.objects.create_user(username='consumer1', password='pass12345', user_type='consumer')
+        cls.ragi = Product.objects.create(farmer=cls.farmer, name='Ragi Flour', description='x', price=100,
+                                          category='flour')
+        cls.snack = Product.objects.create(farmer=cls.farmer, name='Spicy Mixture', description='x', price=30,
+                                           category='snack')
+        # Ragi flour has risen about 1% a week over the last half year
+        start = datetime.datetime(2026, 4, 1, tzinfo=datetime.timezone.utc)
+        for week in range(26):
+            order = Order.objects.create(consumer=cls.consumer, total_amount=0, shipping_address='A', phone_number='1')
+            Order.objects.filter(pk=order.pk).update(created_at=start + datetime.timedelta(weeks=week))
+            OrderItem.objects.create(order=order, product=cls.ragi, quantity=1,
+                                     price=Decimal(f'{75 * 1.01 ** week:.2f}'))
+
+    def setUp(self):
+        pricing.load_model.cache_clear()
+
+    def test_region_shares_the_alert_normalizer(self):
+        self.assertEqual(pricing.region_of(' Salem ,  Tamil   NADU. '), 'tamil nadu')
+        self.assertEqual(pricing.region_of(''), pricing.ANY)
+
+    def test_fit_recovers_trend(self):
+        weeks = np.arange(52.0)
+        prices = 50 * np.exp(0.02 * weeks)
+        coefficients, samples = pricing.fit_segments(
+            np.zeros(52, dtype=int), np.zeros(52, dtype=int), weeks, (weeks // 4.35).astype(int) % 12, prices
+        )
+        self.assertEqual(samples[0], 52)
+        self.assertAlmostEqual(coefficients[0, pricing.SLOPE], 0.02, places=2)
+
+    def test_segments_fall_back_to_coarser_levels(self):
+        self.assertEqual(pricing.millet_type('Organic Bajra Flour'), 'pearl')
+        self.assertEqual(pricing.product_segments(self.ragi)[:2], ['finger/flour/karnataka', 'finger/flour/*'])
+
+    def test_train_and_predict(self):
+        call_command('train_price_model', stdout=StringIO())
+        for _ in range(4):
+            pricing.train_price_model()
+        self.assertEqual(AIModel.objects.filter(model_type='price_predictor').count(), pricing.VERSIONS_KEPT)
+
+        products = list(Product.objects.select_related('farmer').order_by('pk'))
+        with self.assertNumQueries(2):
+            ragi, snack = pricing.predict_prices(products, weeks=4)
+        self.assertEqual(ragi.segment, 'finger/flour/karnataka')
+        self.assertGreater(ragi.predicted, ragi.product.price)
+        self.assertLessEqual(ragi.low, ragi.predicted)
+        self.assertGreaterEqual(ragi.high, ragi.predicted)
+        # Only the general segment knows about snacks; it still produces a forecast
+        self.assertEqual(snack.segment, '*/*/*')
+        # The registry keeps the loaded version: later batches are one lookup query
+        with self.assertNumQueries(1):
+            pricing.predict_prices(products, weeks=4)
+
+    def test_view(self):
+        self.client.force_login(self.farmer)
+        response = self.client.get(reverse('price_prediction'))
+        self.assertEqual(response.context['predictions'], [])
+        pricing.train_price_model()
+        response = self.client.get(reverse('price_prediction'), {'weeks': '99'})
+        self.assertEqual(response.context['weeks'], pricing.MAX_WEEKS)
+        self.assertEqual(len(response.context['predictions']), 2)
+
+
+    def test_catalog_without_order_history(self):
+        OrderItem.objects.all().delete()
+        Product.objects.create(farmer=self.farmer, name='Jowar Grain', description='x', price=40, category='grain')
+        self.assertIsNone(pricing.train_price_model())
+        self.assertFalse(AIModel.objects.filter(model_type='price_predictor').exists())
+        # A version saved without segments (as older builds did) forecasts nothing
+        AIModel.objects.create(name=pricing.MODEL_NAME, model_type=pricing.MODEL_TYPE)
+        self.assertEqual(pricing.predict_prices(Product.objects.select_related('farmer')), [])
+        self.client.force_login(self.farmer)
+        response = self.client.get(reverse('price_prediction'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['predictions'], [])
+
+
+class CropAdvisoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        AdvisoryRule.objects.all().delete()
+        cls.general = AdvisoryRule.objects.create(season='kharif', advice='Weed early.')
+        cls.ragi_rule = AdvisoryRule.objects.create(millet_type='finger', season='kharif', priority=5, advice='Treat seed against blast.')
+        AdvisoryRule.objects.create(millet_type='finger', region='karnataka', season='kharif', advice='Sow by mid-July.')
+        AdvisoryRule.objects.create(soil_type='red', advice='Apply phosphorus at sowing.')
+        cls.farmers = []
+        for i, location in enumerate(['Mandya, Karnataka', 'Tumkur, Karnataka', 'Jaipur, Rajasthan']):
+            farmer = User.objects.create_user(username=f'farmer{i}', password='pass12345', user_type='farmer',
+                                              farm_location=location)
+            Product.objects.create(farmer=farmer, name='Ragi Grain', description='x', price=50, category='grain')
+            cls.farmers.append(farmer)
+
+    def test_lookup_orders_specific_rules_first(self):
+        index = RuleIndex([
+            ('', '', '', 'kharif', 0, 'general'),
+            ('finger', '', '', 'kharif', 0, 'millet'),
+            ('finger', 'karnataka', '', 'kharif', 0, 'regional'),
+            ('finger', '', '', 'rabi', 0, 'other season'),
+        ])
+        self.assertEqual(index.lookup('finger', 'Karnataka', '', 'kharif'), ['regional', 'millet', 'general'])
+        self.assertEqual(index.lookup('pearl', '*', '', 'kharif'), ['general'])
+
+    def test_index_reloads_when_rules_change(self):
+        index = get_rule_index()
+        self.assertIs(get_rule_index(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            AdvisoryRule.objects.create(millet_type='pearl', advice='Watch for downy mildew.')
+        self.assertIsNot(get_rule_index(), index)
+        self.assertEqual(len(get_rule_index()), 5)
+
+    def test_bulk_generation_for_region(self):
+        get_rule_index()
+        # Farmers, products, reported soils, then delete + insert in a savepoint
+        with self.assertNumQueries(7):
+            written = generate_advisories('kharif', region='Karnataka')
+        self.assertEqual(written, 2)
+        advisory = CropAdvisory.objects.get(farmer=self.farmers[0], season='kharif')
+        self.assertEqual(advisory.advisory_text.splitlines(), ['Sow by mid-July.', 'Treat seed against blast.', 'Weed early.'])
+        self.assertFalse(CropAdvisory.objects.filter(farmer=self.farmers[2]).exists())
+        # Regenerating replaces rather than duplicates
+        generate_advisories('kharif', region='Karnataka')
+        self.assertEqual(CropAdvisory.objects.filter(season='kharif').count(), 2)
+
+    def test_view_generates_and_keeps_soil_type(self):
+        self.client.force_login(self.farmers[2])
+        response = self.client.get(reverse('crop_advisory'))
+        self.assertEqual(len(response.context['advisories']), 1)
+        self.client.post(reverse('crop_advisory'), {'soil_type': 'red'})
+        generate_advisories(season_for())
+        advisory = CropAdvisory.objects.get(farmer=self.farmers[2], season=season_for())
+        self.assertEqual(advisory.soil_type, 'red')
+        self.assertIn('Apply phosphorus at sowing.', advisory.advisory_text)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = User.objects.create_user(username='farmer1', password='pass12345', user_type='farmer')
+        cls.existing = Product.objects.create(farmer=cls.farmer, sku='RG-1', name='Ragi', description='Old',
+                                              price=40, stock_quantity=7, category='grain')
+
+    def import_csv(self, text):
+        return bulk.import_products(self.farmer, StringIO(text))
+
+    def test_csv_upserts_and_reports_bad_rows(self):
+        result = self.import_csv(
+            'sku,name,description,price,stock_quantity,category,is_organic\n'
+            'RG-1,Ragi Grain,Fresh harvest,45.50,20,Grain,yes\n'
+            'BJ-1,Bajra,,30,5,grain,no\n'
+            'BJ-2,Bad price,,abc,5,grain,no\n'
+            'BJ-3,No category,,10,5,,no\n'
+            ',Loose Jowar,,25,3,flour,\n'
+        )
+        self.assertEqual((result.rows, result.saved, result.error_count), (5, 3, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertIn('price', result.errors[0][1])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.is_organic), ('Ragi Grain', Decimal('45.50'), True))
+        self.assertEqual(Product.objects.filter(farmer=self.farmer).count(), 3)
+        self.assertEqual(FarmerStats.objects.get(farmer=self.farmer).products_count, 3)
+        self.assertIn(Product.objects.get(sku='BJ-1').pk, get_search_backend().search('bajra'))
+
+    def test_update_keeps_columns_not_in_file(self):
+        self.import_csv('sku,name,price,category\nRG-1,Ragi,42,grain\n')
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.stock_quantity, self.existing.description), (Decimal('42'), 7, 'Old'))
+
+    def test_partial_update_reindexes_stored_rows(self):
+        kodo = Product.objects.create(farmer=self.farmer, sku='KD-1', name='Millet Mix', description='Kodo and ragi',
+                                      price=60, category='grain')
+        Product.objects.filter(pk=self.existing.pk).update(is_available=False)
+        get_search_backend().index_product(Product.objects.get(pk=self.existing.pk))
+        self.import_csv('sku,name,price,category\nRG-1,Ragi,42,grain\nKD-1,Millet Mix,65,grain\n')
+        # The delisted product stays out of search; the untouched description is still indexed
+        self.assertNotIn(self.existing.pk, get_search_backend().search('ragi'))
+        self.assertIn(kodo.pk, get_search_backend().search('kodo'))
+
+    def test_price_update_refreshes_cart_totals(self):
+        consumer = User.objects.create_user(username='buyer', password='x', user_type='consumer')
+        services.add_to_cart(consumer, self.existing, 2)
+        self.assertEqual(Cart.objects.get(consumer=consumer).subtotal, Decimal('80'))
+        self.import_csv('sku,name,price,category\nRG-1,Ragi,55,grain\n')
+        self.assertEqual(Cart.objects.get(consumer=consumer).subtotal, Decimal('110'))
+
+    def test_rejected_chunk_is_reported_by_line_range(self):
+        rows = ''.join(f'SKU-{i},Millet {i},10,grain\n' for i in range(5)).replace('Millet 3', 'Bad')
+        create = Product.objects.bulk_create
+
+        def refuse_bad(products, **kwargs):
+            if any(product.name == 'Bad' for product in products):
+                raise IntegrityError('CHECK constraint failed')
+            return create(products, **kwargs)
+
+        original = bulk.CHUNK_SIZE
+        bulk.CHUNK_SIZE = 2
+        try:
+            with mock.patch.object(Product.objects, 'bulk_create', side_effect=refuse_bad):
+                result = self.import_csv('sku,name,price,category\n' + rows)
+        finally:
+            bulk.CHUNK_SIZE = original
+        self.assertEqual((result.saved, result.error_count), (3, 2))
+        self.assertEqual(result.errors[0][0], '4-5')
+        self.assertFalse(Product.objects.filter(sku__in=['SKU-2', 'SKU-3']).exists())
+
+    def test_json_array_upload_is_rejected(self):
+        self.client.force_login(self.farmer)
+        upload = SimpleUploadedFile('products.json', b'[{"name": "Kodo", "price": 55, "category": "grain"}]')
+        response = self.client.post(reverse('import_products'), {'file': upload})
+        self.assertFormError(response.context['import_form'], 'file',
+                             'JSON arrays are not supported; upload JSON lines (.jsonl), one product per line.')
+
+    def test_chunks_bound_the_work(self):
+        rows = ''.join(f'SKU-{i},Millet {i},,10,1,grain\n' for i in range(2500))
+        original = bulk.CHUNK_SIZE
+        bulk.CHUNK_SIZE = 1000
+        try:
+            result = self.import_csv('sku,name,description,price,stock_quantity,category\n' + rows)
+        finally:
+            bulk.CHUNK_SIZE = original
+        self.assertEqual(result.saved, 2500)
+        self.assertEqual(Product.objects.filter(farmer=self.farmer).count(), 2501)
+
+    def test_jsonl_upload_and_streaming_export(self):
+        self.client.force_login(self.farmer)
+        upload = SimpleUploadedFile('products.jsonl', (
+            '{"sku": "KD-1", "name": "Kodo", "price": 55, "category": "grain", "is_organic": true}\n'
+            'not json\n'
+        ).encode())
+        response = self.client.post(reverse('import_products'), {'file': upload})
+        self.assertEqual(response.context['result'].saved, 1)
+        self.assertEqual(response.context['result'].errors[0][0], 2)
+
+        response = self.client.get(reverse('export_products'))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(bulk.EXPORT_FIELDS))
+        self.assertEqual(len(lines), 3)
+        round_trip = bulk.import_products(self.farmer, StringIO('\n'.join(lines)))
+        self.assertEqual((round_trip.saved, Product.objects.filter(farmer=self.farmer).count()), (2, 2))
 
-# Create your tests here.
+    def test_add_product_form_saves(self):
+        self.client.force_login(self.farmer)
+        response = self.client.post(reverse('add_product'), {
+            'name': 'Foxtail Rice', 'sku': 'FX-1', 'description': 'Polished', 'price': '70', 'stock_quantity': 9,
+            'category': 'grain', 'is_available': 'on',
+        })
+        self.assertRedirects(response, reverse('farmer_dashboard'), fetch_redirect_response=False)
+        self.assertTrue(Product.objects.filter(farmer=self.farmer, sku='FX-1').exists())
@@ -1,74 +1,123 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from .models import Product, CropAdvisory, FarmerReward
+from .advisory import SOIL_TYPES, generate_advisories, get_advisories, season_for
+from .bulk import export_rows, import_upload
+from .forms import ProductForm, ProductImportForm
+from .pricing import DEFAULT_WEEKS, MAX_WEEKS, predict_prices
+from .stats import get_stats
+from accounts.decorators import farmer_required
 from accounts.models import User
+from core import rewards
+from core.alerts import get_active_alerts
+from core.schemes import get_matched_schemes
 from django.db.models import Sum, Count
 
-@login_required
+@farmer_required
 def dashboard(request):
-    # Ensure user is a farmer
-    if not request.user.is_farmer:
-        messages.error(request, "Access denied. You are not registered as a farmer.")
-        return redirect('home')
-    
     # Get farmer's products
     products = Product.objects.filter(farmer=request.user)
     
-    # Get stats
-    products_count = products.count()
+    # All counters come from the precomputed stats row
+    stats = get_stats(request.user)
     
     # Placeholder data for demonstration
     context = {
         'products': products,
-        'products_count': products_count,
-        'orders_count': 0,  # Will be implemented when orders are created
-        'revenue': 0,  # Will be implemented when orders are created
-        'reward_points': 0,  # Will be implemented when rewards are created
-        'weather_alerts': [],  # Will be implemented with weather API
-        'schemes': [],  # Will be implemented with government schemes data
+        'products_count': stats.products_count,
+        'orders_count': stats.orders_count,
+        'revenue': stats.revenue,
+        'reward_points': stats.reward_points,
+        'units_sold': stats.units_sold,
+        'low_stock_count': stats.low_stock_count,
+        'weather_alerts': get_active_alerts(request.user),
+        'schemes': get_matched_schemes(request.user),
         'recent_orders': [],  # Will be implemented when orders are created
     }
     
     return render(request, 'farmer/dashboard.html', context)
 
-@login_required
+@farmer_required
 def add_product(request):
-    # Ensure user is a farmer
-    if not request.user.is_farmer:
-        messages.error(request, "Access denied. You are not registered as a farmer.")
-        return redirect('home')
-    
     if request.method == 'POST':
-        # Process form submission (will be implemented)
-        messages.success(request, "Product added successfully!")
-        return redirect('farmer_dashboard')
+        form = ProductForm(request.POST, request.FILES, farmer=request.user)
+        if form.is_valid():
+            product = form.save(commit=False)
+            product.farmer = request.user
+            product.save()
+            messages.success(request, "Product added successfully!")
+            return redirect('farmer_dashboard')
+    else:
+        form = ProductForm(farmer=request.user)
+    
+    return render(request, 'farmer/add_product.html', {'form': form, 'import_form': ProductImportForm()})
+
+@farmer_required
+@require_POST
+def import_products(request):
+    import_form = ProductImportForm(request.POST, request.FILES)
+    if not import_form.is_valid():
+        return render(request, 'farmer/add_product.html', {'form': ProductForm(farmer=request.user), 'import_form': import_form})
     
-    return render(request, 'farmer/add_product.html')
+    # Rows are parsed and saved chunk by chunk straight from the upload
+    result = import_upload(request.user, import_form.cleaned_data['file'])
+    if result.saved:
+        messages.success(request, f"Imported {result.saved} of {result.rows} products.")
+    return render(request, 'farmer/import_result.html', {'result': result})
 
-@login_required
+@farmer_required
+def export_products(request):
+    format = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    content_type = 'application/x-ndjson' if format == 'jsonl' else 'text/csv'
+    response = StreamingHttpResponse(export_rows(request.user, format), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="products.{format}"'
+    return response
+
+@farmer_required
 def price_prediction(request):
-    # Ensure user is a farmer
-    if not request.user.is_farmer:
-        messages.error(request, "Access denied. You are not registered as a farmer.")
-        return redirect('home')
+    try:
+        weeks = min(max(int(request.GET.get('weeks', DEFAULT_WEEKS)), 1), MAX_WEEKS)
+    except ValueError:
+        weeks = DEFAULT_WEEKS
     
-    return render(request, 'farmer/price_prediction.html')
+    # One batch forecast for all of the farmer's products
+    products = Product.objects.filter(farmer=request.user).select_related('farmer').order_by('name')
+    context = {
+        'predictions': predict_prices(products, weeks),
+        'weeks': weeks,
+        'week_choices': range(1, MAX_WEEKS + 1),
+    }
+    return render(request, 'farmer/price_prediction.html', context)
 
-@login_required
+@farmer_required
 def crop_advisory(request):
-    # Ensure user is a farmer
-    if not request.user.is_farmer:
-        messages.error(request, "Access denied. You are not registered as a farmer.")
-        return redirect('home')
+    season = season_for()
+    farmer = User.objects.filter(pk=request.user.pk)
+    if request.method == 'POST':
+        # Farmer reported their soil type: regenerate their advice with it
+        soil_type = request.POST.get('soil_type', '')
+        generate_advisories(season, farmers=farmer, soil_type=soil_type if soil_type in SOIL_TYPES else '')
+        messages.success(request, "Advisories updated for your soil type.")
+        return redirect('crop_advisory')
+    
+    advisories = get_advisories(request.user, season)
     
-    return render(request, 'farmer/crop_advisory.html')
+    context = {
+        'advisories': advisories,
+        'season': season,
+        'soil_type': advisories[0].soil_type if advisories else '',
+        'soil_types': SOIL_TYPES,
+    }
+    return render(request, 'farmer/crop_advisory.html', context)
 
-@login_required
+@farmer_required
 def farmer_rewards(request):
-    # Ensure user is a farmer
-    if not request.user.is_farmer:
-        messages.error(request, "Access denied. You are not registered as a farmer.")
-        return redirect('home')
-    
-    return render(request, 'farmer/rewards.html')
+    context = {
+        'reward_points': rewards.get_balance(request.user),
+        'rank': rewards.get_rank(request.user),
+        'entries': rewards.get_recent_entries(request.user),
+        'leaderboard': rewards.get_leaderboard('farmer'),
+    }
+    return render(request, 'farmer/rewards.html', context)
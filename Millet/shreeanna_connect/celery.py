@@ -0,0 +1,15 @@
+"""
+Celery application, used when ``settings.TASK_BACKEND`` is 'celery'.
+
+Start workers with ``celery -A shreeanna_connect worker -Q default,images,bulk``.
+Tasks are declared with ``core.background.task`` in each app's tasks.py.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shreeanna_connect.settings')
+
+app = Celery('shreeanna_connect')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -22,12 +22,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     # Third-party apps
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     # Custom apps
     'accounts',
     'farmer',
     'consumer',
     'core',
+    'api',
 ]
 
 # Custom user model
@@ -41,7 +43,9 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'shreeanna_connect.urls'
@@ -57,6 +61,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'consumer.context_processors.cart_summary',
             ],
         },
     },
@@ -65,10 +70,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'shreeanna_connect.wsgi.application'
 
 # Database
+# Opt-in (SQLITE_CONCURRENT=1) for servers with many concurrent writers: WAL
+# lets readers carry on during a write, and IMMEDIATE transactions take the
+# write lock up front instead of failing when a read lock must be upgraded.
+# WAL is a persistent property of the database file, and IMMEDIATE makes every
+# atomic() block writers, so neither is on by default.
+SQLITE_CONCURRENT_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+}
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Concurrent writers wait for the lock instead of failing
+            'timeout': 20,
+            **(SQLITE_CONCURRENT_OPTIONS if os.environ.get('SQLITE_CONCURRENT') else {}),
+        },
+        'TEST': {
+            # A file (not shared-cache memory) database so threaded tests get
+            # real locking semantics
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -91,6 +115,55 @@ AUTH_PASSWORD_VALIDATORS = [
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Log in with a username or a phone number
+AUTHENTICATION_BACKENDS = ['accounts.backends.PhoneOrUsernameBackend']
+
+# The first hasher hashes new passwords; hashes made with another hasher or
+# iteration count are rewritten on the user's next login. Lower the
+# iterations only with a measured need (manage.py benchmark --scenario login)
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 1_000_000))
+
+# Cache: 'locmem' (per process, the default), 'file' (shared by the processes
+# of one host) or 'redis' (needs the redis package and a server, e.g. a local
+# one at redis://127.0.0.1:6379/1). CACHE_LOCATION overrides the location.
+# Cache invalidation (the catalog, dashboard and advisory versions) only
+# reaches the process that made the change under locmem: with several
+# workers, the others keep serving pages and ETags for up to their timeout
+# (300s), so multi-process deployments should use 'file' or 'redis'.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'shreeanna'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('CACHE_LOCATION', _cache_location),
+        'TIMEOUT': 300,
+    },
+}
+
+# Sessions: 'django.contrib.sessions.backends.cached_db' reads them from the
+# cache and writes through to the database; 'signed_cookies' keeps them in
+# the browser with no server storage at all
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Transactional email (welcome messages); printed to the console unless configured
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Failed logins allowed per client IP and per username or phone number:
+# (attempts, window in seconds), counted in memory by each process
+LOGIN_THROTTLE = {'ip': (20, 300), 'user': (5, 300)}
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -114,12 +187,20 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    # The mobile app sends 'Authorization: Token <key>' (from api:token) and
+    # needs no CSRF token; the session serves the browsable API
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson when installed, the standard encoder otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Celery settings
@@ -129,3 +210,28 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+
+# Background tasks (core.background): 'celery' sends them to the broker above,
+# 'local' runs them on thread pools in the web process, 'eager' inline
+TASK_BACKEND = 'local'
+# Jobs each queue runs at once on the local backend (Celery: worker -c)
+TASK_QUEUES = {'default': 2, 'images': 2, 'bulk': 1}
+# Per-task overrides of queue, max_retries, retry_backoff and rate_limit,
+# e.g. {'core.tasks.generate_image_variants': {'rate_limit': '5/s'}}
+TASK_OPTIONS = {}
+
+# Product search: 'fts5' (SQLite full-text table), 'memory' (in-process
+# inverted index) or 'auto' to use FTS5 whenever the database supports it
+PRODUCT_SEARCH_BACKEND = 'auto'
+
+# Chatbot: answer engine class, and how often (seconds) buffered chat
+# messages are written; None leaves them buffered until flushed explicitly
+CHATBOT_ENGINE = 'consumer.chat.LocalAnswerEngine'
+CHATBOT_FLUSH_INTERVAL = 0.5
+
+# Request instrumentation (core.instrumentation): URL names to profile with
+# cProfile and the share of their requests sampled, e.g. {'product_list': 0.05}
+INSTRUMENTATION_PROFILE = {}
+# Bearer token letting a Prometheus scraper read /ops/metrics/ (staff can always)
+INSTRUMENTATION_METRICS_TOKEN = os.environ.get('INSTRUMENTATION_METRICS_TOKEN', '')
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from accounts import views as accounts_views
+from core import views as core_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,6 +11,10 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('farmer/', include('farmer.urls')),
     path('consumer/', include('consumer.urls')),
+    path('media-variants/', include('core.urls')),
+    path('api/v1/', include('api.urls')),
+    path('ops/stats/', core_views.instrumentation_stats, name='instrumentation_stats'),
+    path('ops/metrics/', core_views.metrics, name='metrics'),
 ]
 
 if settings.DEBUG: